@@ -1,7 +1,6 @@
 # aba_conteudo.py
 # Descrição: Versão completa com QTabWidget e proporções de layout ajustadas.
 
-import re
 from PySide6 import QtWidgets, QtCore, QtGui
 from PySide6.QtWidgets import (QWidget, QLabel, QTextEdit, QPushButton, QListWidget, QCheckBox,
                                QVBoxLayout, QHBoxLayout, QMessageBox, QTreeWidget,
@@ -10,6 +9,7 @@ from PySide6.QtWidgets import (QWidget, QLabel, QTextEdit, QPushButton, QListWid
 from documento import Capitulo, Tabela, Figura, Formula
 from dialogs import TabelaDialog, DialogoFigura
 from DialogoFormula import DialogoFormula
+from tokenizador_conteudo import titulos_referenciados
 
 class ArvoreConteudo(QTreeWidget):
     estruturaAlterada = QtCore.Signal()
@@ -177,7 +177,7 @@ class AbaConteudo(QWidget):
         
         self.lista_tabelas.clear()
         if self.filtro_tabelas_check.isChecked() and capitulo_selecionado:
-            titulos_usados = set(re.findall(r"\{\{Tabela:([^}]+)\}\}", conteudo_capitulo))
+            titulos_usados = titulos_referenciados(conteudo_capitulo, "Tabela")
             for tabela in self.documento.banco_tabelas:
                 if tabela.titulo in titulos_usados: self.lista_tabelas.addItem(tabela.titulo)
         else:
@@ -185,7 +185,7 @@ class AbaConteudo(QWidget):
 
         self.lista_figuras.clear()
         if self.filtro_figuras_check.isChecked() and capitulo_selecionado:
-            titulos_usados = set(re.findall(r"\{\{Figura:([^}]+)\}\}", conteudo_capitulo))
+            titulos_usados = titulos_referenciados(conteudo_capitulo, "Figura")
             for figura in self.documento.banco_figuras:
                 if figura.titulo in titulos_usados: self.lista_figuras.addItem(figura.titulo)
         else:
@@ -193,7 +193,7 @@ class AbaConteudo(QWidget):
             
         self.lista_formulas.clear()
         if self.filtro_formulas_check.isChecked() and capitulo_selecionado:
-            legendas_usadas = set(re.findall(r"\{\{Formula:([^}]+)\}\}", conteudo_capitulo))
+            legendas_usadas = titulos_referenciados(conteudo_capitulo, "Formula")
             for formula in self.documento.banco_formulas:
                 if formula.legenda in legendas_usadas:
                     self.lista_formulas.addItem(formula.legenda)
@@ -265,7 +265,7 @@ class AbaConteudo(QWidget):
     def _adicionar_tabela(self):
         dialog = TabelaDialog(parent=self)
         if dialog.exec():
-            self.documento.banco_tabelas.append(dialog.get_dados_tabela())
+            self.documento.adicionar_tabela(dialog.get_dados_tabela())
             self.atualizar_bancos_visuais()
 
     @QtCore.Slot()
@@ -274,7 +274,7 @@ class AbaConteudo(QWidget):
         if dialog.exec():
             nova_figura = dialog.get_dados_figura()
             if nova_figura and nova_figura.caminho_processado:
-                self.documento.banco_figuras.append(nova_figura)
+                self.documento.adicionar_figura(nova_figura)
                 self.atualizar_bancos_visuais()
 
     @QtCore.Slot()
@@ -282,7 +282,7 @@ class AbaConteudo(QWidget):
         dialog = DialogoFormula(parent=self)
         if dialog.exec():
             nova_formula = dialog.get_dados_formula()
-            self.documento.banco_formulas.append(nova_formula)
+            self.documento.adicionar_formula(nova_formula)
             self.atualizar_bancos_visuais()
 
     @QtCore.Slot()
@@ -328,12 +328,12 @@ class AbaConteudo(QWidget):
         linha = self.lista_tabelas.currentRow()
         if linha == -1: return
         titulo_tabela = self.lista_tabelas.item(linha).text()
-        tabela_original = next((t for t in self.documento.banco_tabelas if t.titulo == titulo_tabela), None)
+        tabela_original = self.documento.buscar_tabela(titulo_tabela)
         if not tabela_original: return
         
         dialog = TabelaDialog(tabela=tabela_original, parent=self)
         if dialog.exec():
-            tabela_original.__dict__.update(dialog.get_dados_tabela().__dict__)
+            self.documento.atualizar_tabela(tabela_original, dialog.get_dados_tabela())
             self.atualizar_bancos_visuais()
 
 
@@ -343,7 +343,7 @@ class AbaConteudo(QWidget):
         if linha == -1: return
         titulo_tabela = self.lista_tabelas.item(linha).text()
         if QMessageBox.question(self, "Confirmar", f"Remover a tabela '{titulo_tabela}' do projeto?") == QMessageBox.StandardButton.Yes:
-            self.documento.banco_tabelas = [t for t in self.documento.banco_tabelas if t.titulo != titulo_tabela]
+            self.documento.remover_tabela(titulo_tabela)
             self.atualizar_bancos_visuais()
             
     @QtCore.Slot()
@@ -351,12 +351,12 @@ class AbaConteudo(QWidget):
         linha = self.lista_figuras.currentRow()
         if linha == -1: return
         titulo_figura = self.lista_figuras.item(linha).text()
-        figura_original = next((f for f in self.documento.banco_figuras if f.titulo == titulo_figura), None)
+        figura_original = self.documento.buscar_figura(titulo_figura)
         if not figura_original: return
         
         dialog = DialogoFigura(figura=figura_original, parent=self)
         if dialog.exec():
-            figura_original.__dict__.update(dialog.get_dados_figura().__dict__)
+            self.documento.atualizar_figura(figura_original, dialog.get_dados_figura())
             self.atualizar_bancos_visuais()
     
     @QtCore.Slot()
@@ -365,7 +365,7 @@ class AbaConteudo(QWidget):
         if linha == -1: return
         titulo_figura = self.lista_figuras.item(linha).text()
         if QMessageBox.question(self, "Confirmar", f"Remover a figura '{titulo_figura}' do projeto?") == QMessageBox.StandardButton.Yes:
-            self.documento.banco_figuras = [f for f in self.documento.banco_figuras if f.titulo != titulo_figura]
+            self.documento.remover_figura(titulo_figura)
             self.atualizar_bancos_visuais()
             
     @QtCore.Slot()
@@ -373,12 +373,12 @@ class AbaConteudo(QWidget):
         linha = self.lista_formulas.currentRow()
         if linha == -1: return
         legenda_formula = self.lista_formulas.item(linha).text()
-        formula_original = next((f for f in self.documento.banco_formulas if f.legenda == legenda_formula), None)
+        formula_original = self.documento.buscar_formula(legenda_formula)
         if not formula_original: return
         
         dialog = DialogoFormula(formula=formula_original, parent=self)
         if dialog.exec():
-            formula_original.__dict__.update(dialog.get_dados_formula().__dict__)
+            self.documento.atualizar_formula(formula_original, dialog.get_dados_formula())
             self.atualizar_bancos_visuais()
     
     @QtCore.Slot()
@@ -387,7 +387,7 @@ class AbaConteudo(QWidget):
         if linha == -1: return
         legenda_formula = self.lista_formulas.item(linha).text()
         if QMessageBox.question(self, "Confirmar", f"Remover a fórmula '{legenda_formula}' do projeto?") == QMessageBox.StandardButton.Yes:
-            self.documento.banco_formulas = [f for f in self.documento.banco_formulas if f.legenda != legenda_formula]
+            self.documento.remover_formula(legenda_formula)
             self.atualizar_bancos_visuais()
     
     def _popular_arvore(self):
@@ -0,0 +1,238 @@
+# abnt_helper.py
+# Descrição: Ponto de entrada de linha de comando (sem Qt) para gerar o .docx final a partir
+# de projetos .abnf, individualmente ou em lote usando um pool de processos.
+#
+# Uso:
+#   python -m abnt_helper build projeto.abnf -o trabalho.docx
+#   python -m abnt_helper batch pasta_ou_manifesto.txt -o pasta_saida --processos 8
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from gerenciador_projeto import GerenciadorProjetos
+from gerador_docx import GeradorDOCX
+from instrumentacao_docx import caminho_relatorio
+
+EXTENSAO_PROJETO = ".abnf"
+NOME_RESUMO_LOTE = "resumo_lote.json"
+
+
+def construir_documento(caminho_entrada: str, caminho_saida: str, opcoes_gerador: dict | None = None) -> dict:
+    """
+    Carrega um projeto .abnf e gera o .docx correspondente. As opções são repassadas ao GeradorDOCX.
+    Retorna as métricas da geração.
+    """
+    inicio = time.perf_counter()
+    gerenciador = GerenciadorProjetos()
+    try:
+        documento = gerenciador.carregar_projeto(caminho_entrada)
+        diretorio_saida = os.path.dirname(os.path.abspath(caminho_saida))
+        os.makedirs(diretorio_saida, exist_ok=True)
+        GeradorDOCX(documento, **(opcoes_gerador or {})).gerar_documento(caminho_saida)
+    finally:
+        gerenciador.fechar_projeto()
+
+    resultado = {
+        "entrada": os.path.abspath(caminho_entrada),
+        "saida": os.path.abspath(caminho_saida),
+        "sucesso": True,
+        "erro": None,
+        "tempo_s": round(time.perf_counter() - inicio, 3),
+        "tamanho_bytes": os.path.getsize(caminho_saida),
+    }
+    if (opcoes_gerador or {}).get("instrumentar"):
+        resultado["relatorio_instrumentacao"] = os.path.abspath(caminho_relatorio(caminho_saida))
+    return resultado
+
+
+def _executar_job(caminho_entrada: str, caminho_saida: str, opcoes_gerador: dict | None = None) -> dict:
+    """
+    Executa um job do lote dentro de um processo do pool. Cada job usa o seu próprio
+    diretório temporário (o carregamento do .abnf extrai arquivos para lá), removido ao final.
+    """
+    inicio = time.perf_counter()
+    diretorio_job = tempfile.mkdtemp(prefix="abnf_job_")
+    tempdir_anterior = tempfile.tempdir
+    tempfile.tempdir = diretorio_job
+    try:
+        return construir_documento(caminho_entrada, caminho_saida, opcoes_gerador)
+    except Exception as e:
+        # Não deixa um .docx pela metade para trás em caso de falha.
+        if os.path.exists(caminho_saida):
+            try:
+                os.remove(caminho_saida)
+            except OSError:
+                pass
+        return {
+            "entrada": os.path.abspath(caminho_entrada),
+            "saida": os.path.abspath(caminho_saida),
+            "sucesso": False,
+            "erro": f"{type(e).__name__}: {e}",
+            "tempo_s": round(time.perf_counter() - inicio, 3),
+            "tamanho_bytes": 0,
+        }
+    finally:
+        tempfile.tempdir = tempdir_anterior
+        shutil.rmtree(diretorio_job, ignore_errors=True)
+
+
+def coletar_projetos(alvo: str, recursivo: bool = False) -> list[str]:
+    """
+    Retorna a lista de projetos .abnf a partir de um diretório ou de um arquivo de manifesto
+    (um caminho por linha; linhas vazias e iniciadas com '#' são ignoradas).
+    """
+    if os.path.isdir(alvo):
+        projetos = []
+        if recursivo:
+            for raiz, _, arquivos in os.walk(alvo):
+                projetos.extend(os.path.join(raiz, a) for a in arquivos if a.endswith(EXTENSAO_PROJETO))
+        else:
+            projetos = [os.path.join(alvo, a) for a in os.listdir(alvo) if a.endswith(EXTENSAO_PROJETO)]
+        return sorted(projetos)
+
+    base_manifesto = os.path.dirname(os.path.abspath(alvo))
+    projetos = []
+    with open(alvo, 'r', encoding='utf-8') as f:
+        for linha in f:
+            linha = linha.strip()
+            if not linha or linha.startswith('#'):
+                continue
+            # Caminhos relativos no manifesto são relativos à pasta do próprio manifesto.
+            projetos.append(linha if os.path.isabs(linha) else os.path.join(base_manifesto, linha))
+    return projetos
+
+
+def _mapear_saidas(projetos: list[str], diretorio_saida: str) -> list[tuple[str, str]]:
+    """Associa cada projeto a um .docx único dentro do diretório de saída."""
+    nomes_usados = set()
+    pares = []
+    for projeto in projetos:
+        nome_base = os.path.splitext(os.path.basename(projeto))[0]
+        nome = nome_base
+        contador = 2
+        while nome.lower() in nomes_usados:
+            nome = f"{nome_base}_{contador}"
+            contador += 1
+        nomes_usados.add(nome.lower())
+        pares.append((projeto, os.path.join(diretorio_saida, f"{nome}.docx")))
+    return pares
+
+
+def executar_lote(projetos: list[str], diretorio_saida: str, max_processos: int | None = None,
+                  opcoes_gerador: dict | None = None) -> dict:
+    """Gera todos os projetos em paralelo e devolve o resumo do lote."""
+    os.makedirs(diretorio_saida, exist_ok=True)
+    pares = _mapear_saidas(projetos, diretorio_saida)
+    max_processos = max(1, min(max_processos or os.cpu_count() or 1, len(pares) or 1))
+
+    inicio = time.perf_counter()
+    resultados = []
+    with ProcessPoolExecutor(max_workers=max_processos) as executor:
+        futuros = {executor.submit(_executar_job, entrada, saida, opcoes_gerador): entrada for entrada, saida in pares}
+        for i, futuro in enumerate(as_completed(futuros), 1):
+            try:
+                resultado = futuro.result()
+            except Exception as e:
+                # Falha do próprio processo (ex: processo morto); o job é registrado como erro.
+                resultado = {"entrada": os.path.abspath(futuros[futuro]), "saida": None, "sucesso": False,
+                             "erro": f"{type(e).__name__}: {e}", "tempo_s": None, "tamanho_bytes": 0}
+            resultados.append(resultado)
+            status = "OK" if resultado["sucesso"] else f"ERRO ({resultado['erro']})"
+            print(f"[{i}/{len(pares)}] {os.path.basename(resultado['entrada'])}: {status}")
+
+    ordem = {os.path.abspath(entrada): i for i, (entrada, _) in enumerate(pares)}
+    resultados.sort(key=lambda r: ordem.get(r["entrada"], len(ordem)))
+    sucessos = sum(1 for r in resultados if r["sucesso"])
+    return {
+        "total": len(resultados),
+        "sucessos": sucessos,
+        "falhas": len(resultados) - sucessos,
+        "processos": max_processos,
+        "tempo_total_s": round(time.perf_counter() - inicio, 3),
+        "projetos": resultados,
+    }
+
+
+def _opcoes_gerador(args) -> dict:
+    """Converte as opções da linha de comando nos argumentos do GeradorDOCX."""
+    return {
+        "atualizar_sumario_word": args.sumario_word,
+        "modo_streaming": args.streaming,
+        "usar_cache_fragmentos": args.cache_fragmentos,
+        "modo_estilos": args.modo_estilos,
+        "processos": args.processos_capitulos,
+        "instrumentar": args.instrumentar,
+    }
+
+
+def _comando_build(args) -> int:
+    saida = args.saida or os.path.splitext(args.entrada)[0] + ".docx"
+    resultado = _executar_job(args.entrada, saida, _opcoes_gerador(args))
+    if not resultado["sucesso"]:
+        print(f"ERRO ao gerar '{args.entrada}': {resultado['erro']}", file=sys.stderr)
+        return 1
+    print(f"Documento gerado em {resultado['saida']} ({resultado['tempo_s']} s, {resultado['tamanho_bytes']} bytes)")
+    return 0
+
+
+def _comando_batch(args) -> int:
+    projetos = coletar_projetos(args.alvo, recursivo=args.recursivo)
+    if not projetos:
+        print(f"Nenhum projeto {EXTENSAO_PROJETO} encontrado em '{args.alvo}'.", file=sys.stderr)
+        return 1
+
+    resumo = executar_lote(projetos, args.saida, max_processos=args.processos,
+                           opcoes_gerador=_opcoes_gerador(args))
+    caminho_resumo = args.resumo or os.path.join(args.saida, NOME_RESUMO_LOTE)
+    with open(caminho_resumo, 'w', encoding='utf-8') as f:
+        json.dump(resumo, f, ensure_ascii=False, indent=4)
+
+    print(f"{resumo['sucessos']}/{resumo['total']} projetos gerados em {resumo['tempo_total_s']} s. "
+          f"Resumo salvo em {caminho_resumo}")
+    return 0 if resumo["falhas"] == 0 else 2
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="abnt_helper", description="Gera documentos .docx a partir de projetos .abnf.")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    p_build = subparsers.add_parser("build", help="Gera o .docx de um único projeto.")
+    p_build.add_argument("entrada", help="Arquivo de projeto .abnf.")
+    p_build.add_argument("-o", "--saida", help="Arquivo .docx de saída (padrão: mesmo nome do projeto).")
+    p_build.set_defaults(func=_comando_build)
+
+    p_batch = subparsers.add_parser("batch", help="Gera vários projetos em paralelo.")
+    p_batch.add_argument("alvo", help="Diretório com projetos .abnf ou manifesto com um caminho por linha.")
+    p_batch.add_argument("-o", "--saida", required=True, help="Diretório onde os .docx serão gerados.")
+    p_batch.add_argument("-j", "--processos", type=int, default=None,
+                         help="Número máximo de projetos gerados ao mesmo tempo (padrão: número de CPUs).")
+    p_batch.add_argument("-r", "--recursivo", action="store_true", help="Procura projetos também nas subpastas.")
+    p_batch.add_argument("--resumo", help=f"Caminho do resumo JSON (padrão: <saida>/{NOME_RESUMO_LOTE}).")
+    p_batch.set_defaults(func=_comando_batch)
+
+    for p in (p_build, p_batch):
+        p.add_argument("--sumario-word", action="store_true",
+                       help="Após gerar, atualiza o sumário pelo Microsoft Word (somente Windows com pywin32).")
+        p.add_argument("--streaming", action="store_true",
+                       help="Grava o documento aos poucos, com memória limitada (recomendado para documentos muito grandes).")
+        p.add_argument("--cache-fragmentos", action="store_true",
+                       help="Reaproveita os capítulos já renderizados em exportações anteriores que não foram alterados.")
+        p.add_argument("--modo-estilos", action="store_true",
+                       help="Formata o documento por estilos nomeados, sem formatação direta nos trechos de texto (arquivo menor).")
+        p.add_argument("--processos-capitulos", type=int, default=1, metavar="N",
+                       help="Renderiza os capítulos de cada documento em N processos (0 = número de CPUs).")
+        p.add_argument("--instrumentar", action="store_true",
+                       help="Grava ao lado de cada .docx um relatório JSON com o tempo de cada fase da geração.")
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
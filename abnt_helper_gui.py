@@ -0,0 +1,22 @@
+# abnt_helper_gui.py
+# Descrição: Ponto de entrada da interface gráfica. Não importa o Qt no nível do módulo: os processos
+# da medição paralela da pré-visualização (iniciados com "spawn") reexecutam este arquivo e precisam
+# sair pelo freeze_support() ou pular o bloco principal sem carregar o PySide6 e as telas.
+#
+# Uso:
+#   python abnt_helper_gui.py
+
+import sys
+import multiprocessing
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    try:
+        from PySide6.QtWebEngineWidgets import QWebEngineView
+    except ImportError:
+        print("ERRO: A dependência 'PySide6-WebEngineWidgets' não está instalada.")
+        print("Por favor, execute: pip install PySide6-WebEngineWidgets")
+        sys.exit(1)
+
+    from main_app import executar
+    sys.exit(executar())
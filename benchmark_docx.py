@@ -0,0 +1,250 @@
+# benchmark_docx.py
+# Descrição: Benchmark da geração do .docx sobre documentos ABNT sintéticos (sem Qt e sem Word).
+# Cada cenário é executado em um processo novo, para que o pico de memória de um não contamine o
+# outro, nos dois caminhos de geração (trabalho acadêmico e artigo). O resultado por fase (tempo,
+# pico de memória, lidos do relatório de instrumentação do GeradorDOCX) e o tamanho do .docx podem
+# ser gravados como baseline e comparados depois.
+#
+# Uso:
+#   python benchmark_docx.py                          # roda os cenários padrão e mostra a tabela
+#   python benchmark_docx.py --salvar-baseline        # grava benchmark_docx_baseline.json
+#   python benchmark_docx.py --comparar --limite 0.2  # falha (código 1) se piorar mais de 20%
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from instrumentacao_docx import caminho_relatorio, pico_memoria_kib, reiniciar_pico_memoria
+
+ARQUIVO_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_docx_baseline.json")
+LIMITE_REGRESSAO = 0.20
+TIPOS = {"academico": "Trabalho de Conclusão de Curso (TCC)", "artigo": "Artigo Científico"}
+
+# Parâmetros dos documentos sintéticos de cada cenário.
+CENARIOS = {
+    "capitulos_10":        dict(capitulos=10),
+    "capitulos_100":       dict(capitulos=100),
+    "capitulos_1000":      dict(capitulos=1000, paragrafos=2),
+    "aninhamento_profundo": dict(capitulos=10, profundidade=8, filhos_por_nivel=2, paragrafos=1),
+    "tabela_10_linhas":    dict(capitulos=5, tabelas=5, linhas_tabela=10),
+    "tabela_10000_linhas": dict(capitulos=2, tabelas=1, linhas_tabela=10000),
+    "figuras_formulas":    dict(capitulos=50, figuras=300, formulas=200),
+    "referencias_5000":    dict(capitulos=5, referencias=5000),
+}
+CENARIOS_RAPIDOS = ["capitulos_10", "aninhamento_profundo", "tabela_10_linhas"]
+
+# --- Documentos sintéticos ---
+
+def _criar_imagens(diretorio: str, quantidade: int, prefixo: str, tamanho=(400, 300)) -> list:
+    caminhos = []
+    for i in range(quantidade):
+        caminho = os.path.join(diretorio, f"{prefixo}_{i}.png")
+        cor = ((i * 37) % 256, (i * 91) % 256, (i * 53) % 256)
+        Image.new('RGB', tamanho, cor).save(caminho)
+        caminhos.append(caminho)
+    return caminhos
+
+def criar_documento_sintetico(diretorio: str, tipo: str = "academico", capitulos: int = 10, paragrafos: int = 4,
+                              profundidade: int = 2, filhos_por_nivel: int = 1, tabelas: int = 0,
+                              linhas_tabela: int = 10, figuras: int = 0, formulas: int = 0, referencias: int = 20):
+    """Monta um DocumentoABNT com o tamanho pedido. As imagens são geradas no diretório informado."""
+    from documento import DocumentoABNT, Capitulo, Tabela, Figura, Autor
+    from formula import Formula
+    from referencia import Livro, Artigo, Site
+
+    doc = DocumentoABNT()
+    doc.configuracoes.tipo_trabalho = TIPOS[tipo]
+    doc.titulo = "Documento sintético para benchmark"
+    doc.autores = [Autor("Maria da Silva"), Autor("João de Souza")]
+    doc.orientador = "Prof. Dr. Fulano de Tal"
+    doc.resumo = "Resumo do trabalho. " * 60
+    doc.palavras_chave = "benchmark; docx; abnt"
+
+    for i in range(tabelas):
+        dados = [["Coluna A", "Coluna B", "Coluna C", "Coluna D"]]
+        dados += [[str(j), f"valor {j}", f"{j * 1.5:.2f}", "texto & <especial>"] for j in range(linhas_tabela)]
+        doc.adicionar_tabela(Tabela(titulo=f"Tabela {i}", fonte="Dados sintéticos", dados=dados))
+    for i, caminho in enumerate(_criar_imagens(diretorio, figuras, "figura")):
+        doc.adicionar_figura(Figura(titulo=f"Figura {i}", fonte="Autor" if i % 2 else "",
+                                    caminho_processado=caminho, largura_cm=12.0))
+    for i, caminho in enumerate(_criar_imagens(diretorio, formulas, "formula", (300, 60))):
+        doc.adicionar_formula(Formula(legenda=f"Formula {i}", caminho_processado_png=caminho, largura_cm=8.0))
+
+    # Os elementos dos bancos são distribuídos entre os capítulos, na ordem.
+    marcadores = ([f"{{{{Tabela:Tabela {i}}}}}" for i in range(tabelas)] +
+                  [f"{{{{Figura:Figura {i}}}}}" for i in range(figuras)] +
+                  [f"{{{{Formula:Formula {i}}}}}" for i in range(formulas)])
+    paragrafo = "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor. " * 6
+
+    def criar_secao(titulo, nivel):
+        secao = Capitulo(titulo=titulo, conteudo="\n".join([paragrafo] * paragrafos))
+        if nivel < profundidade:
+            for k in range(filhos_por_nivel):
+                secao.adicionar_filho(criar_secao(f"{titulo}.{k + 1}", nivel + 1))
+        return secao
+
+    for i in range(capitulos):
+        capitulo = criar_secao(f"Capítulo {i + 1}", 1)
+        proprios = marcadores[i::capitulos]
+        if proprios:
+            capitulo.conteudo += "\n" + "\n".join(proprios)
+        doc.estrutura_textual.adicionar_filho(capitulo)
+
+    tipos_referencia = [
+        lambda k: Livro(f"Autor {k}", f"Livro {k}", 2000 + k % 25, "São Paulo", "Editora"),
+        lambda k: Artigo(f"Autor {k}", f"Artigo {k}", 2000 + k % 25, "Revista", "3", 1, 20),
+        lambda k: Site(f"Autor {k}", f"Site {k}", 2000 + k % 25, f"https://exemplo.org/{k}", "1 jan. 2024"),
+    ]
+    doc.referencias = [tipos_referencia[k % 3](k) for k in range(referencias)]
+    doc.reindexar_bancos()
+    return doc
+
+# --- Execução ---
+
+def _executar_cenario(nome: str, tipo: str, opcoes_gerador: dict) -> dict:
+    """Executa um cenário (chamado em um processo novo) e devolve as medidas."""
+    from gerador_docx import GeradorDOCX
+    diretorio = tempfile.mkdtemp(prefix="bench_docx_")
+    try:
+        inicio = time.perf_counter()
+        doc = criar_documento_sintetico(diretorio, tipo, **CENARIOS[nome])
+        tempo_montagem = time.perf_counter() - inicio
+
+        caminho_saida = os.path.join(diretorio, "saida.docx")
+        reiniciar_pico_memoria()
+        inicio = time.perf_counter()
+        GeradorDOCX(doc, instrumentar=True, **opcoes_gerador).gerar_documento(caminho_saida)
+        tempo_total = time.perf_counter() - inicio
+        pico_geral = pico_memoria_kib()
+
+        # As fases vêm do relatório de instrumentação do próprio gerador (somente o primeiro nível).
+        with open(caminho_relatorio(caminho_saida), 'r', encoding='utf-8') as f:
+            relatorio = json.load(f)
+        fases = {}
+        for registro in relatorio["fases"]:
+            medida = fases.setdefault(registro["fase"], {"tempo_s": 0.0, "pico_memoria_kib": 0})
+            medida["tempo_s"] = round(medida["tempo_s"] + registro["tempo_s"], 4)
+            medida["pico_memoria_kib"] = max(medida["pico_memoria_kib"], registro.get("pico_memoria_kib") or 0)
+        # A medição é reiniciada a cada fase; o pico do documento é o maior entre elas.
+        pico_total = max([pico_geral or 0] + [m["pico_memoria_kib"] for m in fases.values()])
+        return {
+            "tempo_montagem_s": round(tempo_montagem, 4),
+            "tempo_s": round(tempo_total, 4),
+            "pico_memoria_kib": pico_total,
+            "tamanho_bytes": os.path.getsize(caminho_saida),
+            "fases": fases,
+        }
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+def executar_benchmark(cenarios: list, tipos: list, repeticoes: int = 1, opcoes_gerador: dict | None = None) -> dict:
+    """Executa os cenários e devolve, por cenário e tipo, a mediana das repetições."""
+    opcoes_gerador = opcoes_gerador or {}
+    resultados = {}
+    for nome in cenarios:
+        for tipo in tipos:
+            execucoes = []
+            for _ in range(repeticoes):
+                with ProcessPoolExecutor(max_workers=1) as executor:
+                    execucoes.append(executor.submit(_executar_cenario, nome, tipo, opcoes_gerador).result())
+            resultado = min(execucoes, key=lambda r: abs(r["tempo_s"] - statistics.median(e["tempo_s"] for e in execucoes)))
+            resultados[f"{nome}/{tipo}"] = resultado
+            print(f"{nome + '/' + tipo:<32} {resultado['tempo_s']:>9.3f} s {resultado['pico_memoria_kib'] / 1024:>9.1f} MiB "
+                  f"{resultado['tamanho_bytes'] / 1024:>10.1f} KiB")
+    return resultados
+
+def _chave_opcoes(opcoes_gerador: dict) -> str:
+    return json.dumps(opcoes_gerador, sort_keys=True)
+
+def comparar_com_baseline(resultados: dict, baseline: dict, limite: float) -> list:
+    """Retorna as regressões (métricas que pioraram mais que o limite em relação ao baseline)."""
+    regressoes = []
+    for chave, atual in resultados.items():
+        anterior = baseline.get(chave)
+        if not anterior:
+            continue
+        metricas = [("tempo_s", atual["tempo_s"], anterior["tempo_s"]),
+                    ("pico_memoria_kib", atual["pico_memoria_kib"], anterior["pico_memoria_kib"]),
+                    ("tamanho_bytes", atual["tamanho_bytes"], anterior["tamanho_bytes"])]
+        for fase, medida in atual["fases"].items():
+            medida_anterior = anterior.get("fases", {}).get(fase)
+            if medida_anterior:
+                metricas.append((f"fases.{fase}.tempo_s", medida["tempo_s"], medida_anterior["tempo_s"]))
+        for metrica, valor, valor_anterior in metricas:
+            # Tempos muito curtos oscilam demais para serem comparados.
+            if metrica.endswith("tempo_s") and valor_anterior < 0.05:
+                continue
+            if valor_anterior and valor > valor_anterior * (1 + limite):
+                regressoes.append(f"{chave} {metrica}: {valor_anterior} -> {valor} (+{(valor / valor_anterior - 1) * 100:.1f}%)")
+    return regressoes
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark da geração de .docx sobre documentos ABNT sintéticos.")
+    parser.add_argument("--cenarios", help=f"Cenários separados por vírgula (disponíveis: {', '.join(CENARIOS)}).")
+    parser.add_argument("--rapido", action="store_true", help=f"Roda apenas {', '.join(CENARIOS_RAPIDOS)}.")
+    parser.add_argument("--tipos", default="academico,artigo", help="Tipos de trabalho: academico, artigo.")
+    parser.add_argument("--repeticoes", type=int, default=1, help="Repetições por cenário (usa a mediana).")
+    parser.add_argument("--streaming", action="store_true", help="Gera com GeradorDOCX(modo_streaming=True).")
+    parser.add_argument("--modo-estilos", action="store_true", help="Gera com GeradorDOCX(modo_estilos=True).")
+    parser.add_argument("--processos-capitulos", type=int, default=1, help="GeradorDOCX(processos=N).")
+    parser.add_argument("--baseline", default=ARQUIVO_BASELINE, help="Arquivo JSON de baseline.")
+    parser.add_argument("--salvar-baseline", action="store_true", help="Grava os resultados como baseline.")
+    parser.add_argument("--comparar", action="store_true", help="Compara com o baseline e falha se houver regressão.")
+    parser.add_argument("--limite", type=float, default=LIMITE_REGRESSAO, help="Piora máxima aceita (0.2 = 20%%).")
+    parser.add_argument("--saida-json", help="Grava os resultados desta execução em um arquivo JSON.")
+    args = parser.parse_args(argv)
+
+    if args.cenarios:
+        cenarios = [c.strip() for c in args.cenarios.split(',') if c.strip()]
+    else:
+        cenarios = CENARIOS_RAPIDOS if args.rapido else list(CENARIOS)
+    desconhecidos = [c for c in cenarios if c not in CENARIOS]
+    if desconhecidos:
+        parser.error(f"cenários desconhecidos: {', '.join(desconhecidos)}")
+    tipos = [t.strip() for t in args.tipos.split(',') if t.strip()]
+    opcoes_gerador = {"modo_streaming": args.streaming, "modo_estilos": args.modo_estilos,
+                      "processos": args.processos_capitulos}
+
+    resultados = executar_benchmark(cenarios, tipos, args.repeticoes, opcoes_gerador)
+    if args.saida_json:
+        with open(args.saida_json, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=4)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baselines = json.load(f)
+    # Os baselines são separados pelas opções do gerador e pela máquina em que foram medidos.
+    chave_baseline = f"{platform.node()}|{_chave_opcoes(opcoes_gerador)}"
+
+    codigo_saida = 0
+    if args.comparar:
+        baseline = baselines.get(chave_baseline)
+        if not baseline:
+            print(f"Nenhum baseline para esta máquina/opções em {args.baseline}.", file=sys.stderr)
+            codigo_saida = 2
+        else:
+            regressoes = comparar_com_baseline(resultados, baseline, args.limite)
+            for regressao in regressoes:
+                print(f"REGRESSÃO: {regressao}", file=sys.stderr)
+            print(f"{len(regressoes)} regressão(ões) acima de {args.limite * 100:.0f}%.")
+            codigo_saida = 1 if regressoes else 0
+
+    if args.salvar_baseline:
+        baselines.setdefault(chave_baseline, {}).update(resultados)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baselines, f, ensure_ascii=False, indent=4)
+        print(f"Baseline gravado em {args.baseline}")
+    return codigo_saida
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+# cache_fragmentos.py
+# Descrição: Cache persistente dos fragmentos de XML do corpo do .docx já renderizados, um por
+# capítulo de primeiro nível. Cada fragmento é um "modelo": a numeração de tabelas, figuras e
+# equações, os ids de marcadores/formas e os rIds das imagens ficam como marcas relativas, que o
+# GeradorDOCX substitui pelos valores reais ao inserir o fragmento no documento.
+
+import os
+import re
+import json
+import hashlib
+import tempfile
+from pathlib import Path
+
+# Ex: C:\Users\SeuUsuario\AppData\Local\ABNTHelper\cache\fragmentos_docx
+DIRETORIO_CACHE_FRAGMENTOS = Path(os.getenv('LOCALAPPDATA', Path.home())) / 'ABNTHelper' / 'cache' / 'fragmentos_docx'
+LIMITE_CACHE_BYTES = 256 * 1024 * 1024
+# Alterar sempre que a renderização mudar, para invalidar os fragmentos gravados por versões anteriores.
+VERSAO_FRAGMENTOS = 1
+
+# Marcas relativas usadas dentro dos fragmentos (caracteres de uso privado do Unicode).
+#   T, F, E: número da tabela, figura ou equação, relativo ao início do capítulo
+#   M: id de marcador (bookmark); D: id de forma (wp:docPr)
+#   I, N: rId e nome do arquivo da k-ésima imagem do capítulo
+PADRAO_MARCA = re.compile('\uE000([TFEMDIN])(\\d+)\uE001')
+
+def marca_relativa(tipo: str, valor: int) -> str:
+    return f"\uE000{tipo}{valor}\uE001"
+
+def calcular_chave(dados) -> str:
+    """Gera a chave do cache a partir de uma estrutura serializável em JSON."""
+    texto = json.dumps([VERSAO_FRAGMENTOS, dados], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+class CacheFragmentosDOCX:
+    def __init__(self, diretorio=None, limite_bytes: int = LIMITE_CACHE_BYTES):
+        self.diretorio = Path(diretorio or DIRETORIO_CACHE_FRAGMENTOS)
+        self.limite_bytes = limite_bytes
+        self.acertos = 0
+        self.faltas = 0
+
+    def _caminho(self, chave: str) -> Path:
+        return self.diretorio / f"{chave}.json"
+
+    def obter(self, chave: str) -> dict | None:
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, 'r', encoding='utf-8') as f:
+                fragmento = json.load(f)
+            os.utime(caminho)  # Marca como usado recentemente para a limpeza.
+        except (OSError, ValueError):
+            self.faltas += 1
+            return None
+        self.acertos += 1
+        return fragmento
+
+    def salvar(self, chave: str, fragmento: dict):
+        """Grava o fragmento de forma atômica. Falhas de escrita apenas desativam o cache para ele."""
+        try:
+            os.makedirs(self.diretorio, exist_ok=True)
+            fd, caminho_temporario = tempfile.mkstemp(prefix=".frag_", suffix=".tmp", dir=self.diretorio)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(fragmento, f, ensure_ascii=False)
+            os.replace(caminho_temporario, self._caminho(chave))
+        except OSError as e:
+            print(f"AVISO: Não foi possível gravar o fragmento no cache: {e}")
+
+    def limpar(self):
+        """Remove os fragmentos usados há mais tempo até o cache caber no limite de tamanho."""
+        try:
+            arquivos = [(p.stat().st_mtime, p.stat().st_size, p) for p in self.diretorio.glob("*.json")]
+        except OSError:
+            return
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, caminho in sorted(arquivos):
+            if total <= self.limite_bytes:
+                break
+            try:
+                caminho.unlink()
+                total -= tamanho
+            except OSError:
+                pass
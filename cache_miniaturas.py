@@ -0,0 +1,133 @@
+# cache_miniaturas.py
+# Descrição: Cache persistente de miniaturas das imagens da pré-visualização. Com o zoom de 0.75 do
+# QWebEngineView, exibir figuras e fórmulas pela imagem processada em resolução total obriga o navegador
+# a decodificar bitmaps muito maiores do que os pixels mostrados. Cada imagem é reduzida para o nível
+# de zoom em uso (0.5, 0.75, 1, 1.5, 2, ...) e gravada em disco, indexada pelo hash do conteúdo e pela
+# largura em pixels; os arquivos usados há mais tempo são removidos quando o cache passa do limite.
+
+import os
+import math
+import hashlib
+import tempfile
+from pathlib import Path
+from PIL import Image
+
+# Ex: C:\Users\SeuUsuario\AppData\Local\ABNTHelper\cache\miniaturas_preview
+DIRETORIO_CACHE_MINIATURAS = Path(os.getenv('LOCALAPPDATA', Path.home())) / 'ABNTHelper' / 'cache' / 'miniaturas_preview'
+LIMITE_CACHE_BYTES = 128 * 1024 * 1024
+NIVEIS_ZOOM = (0.5, 0.75, 1.0, 1.5, 2.0, 3.0)
+PIXELS_POR_CM = 96 / 2.54  # pixels CSS
+# Alterar sempre que a forma de reduzir mudar, para invalidar as miniaturas antigas.
+VERSAO_MINIATURAS = 1
+
+def nivel_zoom(fator: float) -> float:
+    """Menor nível da pirâmide que não perde resolução no fator de zoom (já multiplicado pela densidade da tela)."""
+    for nivel in NIVEIS_ZOOM:
+        if nivel >= fator:
+            return nivel
+    return NIVEIS_ZOOM[-1]
+
+class CacheMiniaturas:
+    def __init__(self, diretorio=None, limite_bytes: int = LIMITE_CACHE_BYTES):
+        self.diretorio = Path(diretorio or DIRETORIO_CACHE_MINIATURAS)
+        self.limite_bytes = limite_bytes
+        # (caminho, mtime, tamanho, largura) -> caminho da miniatura, para não reler o arquivo a cada atualização.
+        self._memoria = {}
+        self.geradas = 0
+
+    def _hash_arquivo(self, caminho: str) -> str:
+        h = hashlib.sha1(str(VERSAO_MINIATURAS).encode('ascii'))
+        with open(caminho, 'rb') as f:
+            for bloco in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(bloco)
+        return h.hexdigest()
+
+    def obter(self, caminho: str, largura_cm: float, zoom: float) -> str:
+        """
+        Caminho da miniatura da imagem para a largura de exibição e o zoom informados. Retorna o
+        próprio caminho quando a imagem já é pequena, é vetorial ou não pôde ser reduzida.
+        """
+        if not caminho or caminho.lower().endswith('.svg'):
+            return caminho
+        largura_px = math.ceil(largura_cm * PIXELS_POR_CM * nivel_zoom(zoom))
+        try:
+            estado = os.stat(caminho)
+        except OSError:
+            return caminho
+        chave_memoria = (caminho, estado.st_mtime_ns, estado.st_size, largura_px)
+        miniatura = self._memoria.get(chave_memoria)
+        if miniatura == caminho:
+            return miniatura  # A própria imagem (pequena ou sem miniatura): não é arquivo do cache.
+        if miniatura is not None and self._marcar_uso(miniatura):
+            return miniatura
+
+        try:
+            miniatura = self._obter_ou_gerar(caminho, largura_px)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            print(f"AVISO: Não foi possível gerar a miniatura de '{caminho}': {e}")
+            miniatura = caminho
+        self._memoria[chave_memoria] = miniatura
+        return miniatura
+
+    def _marcar_uso(self, miniatura) -> bool:
+        """Marca a miniatura como usada recentemente (para a limpeza); False se ela não existe mais."""
+        try:
+            os.utime(miniatura)
+        except OSError:
+            return False
+        return True
+
+    def _obter_ou_gerar(self, caminho: str, largura_px: int) -> str:
+        prefixo = f"{self._hash_arquivo(caminho)}_{largura_px}"
+        for extensao in ('.png', '.jpg'):
+            existente = self.diretorio / (prefixo + extensao)
+            if self._marcar_uso(existente):
+                return str(existente)
+
+        with Image.open(caminho) as imagem:
+            if imagem.width <= largura_px:
+                return caminho
+            altura_px = max(1, round(imagem.height * largura_px / imagem.width))
+            reduzida = imagem.resize((largura_px, altura_px), Image.Resampling.LANCZOS)
+            if imagem.format == 'JPEG' and reduzida.mode in ('RGB', 'L'):
+                extensao, formato, opcoes = '.jpg', 'JPEG', {"quality": 90}
+            else:
+                extensao, formato, opcoes = '.png', 'PNG', {}
+        os.makedirs(self.diretorio, exist_ok=True)
+        destino = self.diretorio / (prefixo + extensao)
+        fd, caminho_temporario = tempfile.mkstemp(prefix=".mini_", suffix=".tmp", dir=self.diretorio)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                reduzida.save(f, formato, **opcoes)
+            os.replace(caminho_temporario, destino)
+        except OSError:
+            if os.path.exists(caminho_temporario):
+                os.remove(caminho_temporario)
+            raise
+        self.geradas += 1
+        return str(destino)
+
+    def limpar(self, em_uso=()):
+        """
+        Remove as miniaturas usadas há mais tempo até o cache caber no limite de tamanho. As de em_uso
+        (caminhos referenciados pelas páginas exibidas) nunca são removidas.
+        """
+        em_uso = {os.path.abspath(caminho) for caminho in em_uso}
+        try:
+            arquivos = [(p.stat().st_mtime, p.stat().st_size, p) for p in self.diretorio.iterdir()
+                        if p.suffix in ('.png', '.jpg')]
+        except OSError:
+            return
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, caminho in sorted(arquivos):
+            if total <= self.limite_bytes:
+                break
+            if os.path.abspath(caminho) in em_uso:
+                continue
+            try:
+                caminho.unlink()
+                total -= tamanho
+            except OSError:
+                pass
+        self._memoria = {chave: miniatura for chave, miniatura in self._memoria.items() if os.path.exists(miniatura)}
+        self.geradas = 0
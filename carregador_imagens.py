@@ -0,0 +1,94 @@
+# carregador_imagens.py
+# Descrição: Pré-carregamento das imagens (figuras e fórmulas) usadas na exportação. Os arquivos são
+# lidos e os cabeçalhos analisados em paralelo antes da renderização, de modo que a inserção das
+# imagens no .docx não espera por disco (ou rede, em pastas pessoais montadas remotamente).
+
+import os
+import io
+import hashlib
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Union
+from docx.image.image import Image, _ImageHeaderFactory
+
+from documento import DocumentoABNT, Capitulo
+from tokenizador_conteudo import tokenizar, TokenElemento
+
+TAMANHO_BLOCO_LEITURA = 1024 * 1024
+
+@dataclass
+class ImagemCarregada:
+    caminho: str
+    sha1: str
+    # Image do python-docx com dimensões e dpi já analisados. Quando a imagem é carregada
+    # "em disco", o conteúdo não fica na memória (o blob é vazio) e é lido só ao gravar o pacote.
+    imagem: Image
+
+def calcular_sha1_arquivo(caminho: str) -> str:
+    """Calcula o SHA1 do arquivo lendo-o em blocos, sem carregá-lo inteiro na memória."""
+    sha1 = hashlib.sha1()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(TAMANHO_BLOCO_LEITURA), b''):
+            sha1.update(bloco)
+    return sha1.hexdigest()
+
+def _nome_arquivo_imagem(caminho: str, cabecalho) -> str:
+    nome_arquivo = os.path.basename(caminho)
+    if not os.path.splitext(nome_arquivo)[1]:
+        nome_arquivo = f"image.{cabecalho.default_ext}"
+    return nome_arquivo
+
+def carregar_imagem(caminho: str, em_disco: bool = False) -> ImagemCarregada:
+    """Lê a imagem e analisa o seu cabeçalho. Com em_disco=True apenas o cabeçalho é mantido."""
+    if em_disco:
+        with open(caminho, 'rb') as f:
+            cabecalho = _ImageHeaderFactory(f)
+        imagem = Image(b'', _nome_arquivo_imagem(caminho, cabecalho), cabecalho)
+        return ImagemCarregada(caminho, calcular_sha1_arquivo(caminho), imagem)
+
+    with open(caminho, 'rb') as f:
+        blob = f.read()
+    cabecalho = _ImageHeaderFactory(io.BytesIO(blob))
+    imagem = Image(blob, _nome_arquivo_imagem(caminho, cabecalho), cabecalho)
+    return ImagemCarregada(caminho, imagem.sha1, imagem)
+
+def _carregar_ou_erro(caminho: str, em_disco: bool) -> Union[ImagemCarregada, Exception]:
+    try:
+        return carregar_imagem(caminho, em_disco)
+    except Exception as e:
+        return e
+
+def pre_carregar_imagens(caminhos: Iterable[str], em_disco: bool = False,
+                         max_threads: int = None) -> Dict[str, Union[ImagemCarregada, Exception]]:
+    """
+    Carrega todas as imagens informadas em um pool de threads. Retorna um dicionário caminho ->
+    ImagemCarregada; se a leitura falhar, o valor é a exceção, para ser tratada na inserção.
+    """
+    caminhos = list(dict.fromkeys(caminhos))
+    if not caminhos:
+        return {}
+    with ThreadPoolExecutor(max_workers=max_threads) as executor:
+        resultados = executor.map(lambda c: _carregar_ou_erro(c, em_disco), caminhos)
+        return dict(zip(caminhos, resultados))
+
+def coletar_caminhos_imagens(doc_abnt: DocumentoABNT) -> List[str]:
+    """Retorna, na ordem de uso, os arquivos de imagem das figuras e fórmulas referenciadas no texto."""
+    caminhos = []
+
+    def visitar(no: Capitulo):
+        for filho in no.filhos:
+            for token in tokenizar(filho.conteudo):
+                if not isinstance(token, TokenElemento):
+                    continue
+                if token.tipo == "Figura":
+                    obj = doc_abnt.buscar_figura(token.titulo)
+                    if obj and obj.caminho_processado:
+                        caminhos.append(obj.caminho_processado)
+                elif token.tipo == "Formula":
+                    obj = doc_abnt.buscar_formula(token.titulo)
+                    if obj and obj.caminho_processado_png:
+                        caminhos.append(obj.caminho_processado_png)
+            visitar(filho)
+
+    visitar(doc_abnt.estrutura_textual)
+    return list(dict.fromkeys(caminhos))
@@ -1,8 +1,9 @@
 # documento.py
 # Descrição: Modelo de Dados com bancos de tabelas, figuras e fórmulas globais para o projeto.
 
+import copy
 from dataclasses import dataclass, field
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 from referencia import Referencia, Livro, Artigo, Site
 from formula import Formula
@@ -87,13 +88,83 @@ class DocumentoABNT:
         self.banco_figuras: List[Figura] = []
         self.banco_formulas: List[Formula] = [] # NOVO
 
+        # Índices por título/legenda para resolver os marcadores {{Tipo:...}} em O(1).
+        # Em caso de títulos repetidos, o primeiro elemento do banco prevalece.
+        self._indice_tabelas: Dict[str, Tabela] = {}
+        self._indice_figuras: Dict[str, Figura] = {}
+        self._indice_formulas: Dict[str, Formula] = {}
+
+    @staticmethod
+    def _indexar(banco, atributo: str) -> dict:
+        indice = {}
+        for item in banco:
+            indice.setdefault(getattr(item, atributo), item)
+        return indice
+
+    def reindexar_bancos(self):
+        """Reconstrói os índices dos bancos. Deve ser chamado se as listas forem alteradas diretamente."""
+        self._indice_tabelas = self._indexar(self.banco_tabelas, 'titulo')
+        self._indice_figuras = self._indexar(self.banco_figuras, 'titulo')
+        self._indice_formulas = self._indexar(self.banco_formulas, 'legenda')
+
+    def buscar_tabela(self, titulo: str) -> Optional[Tabela]:
+        return self._indice_tabelas.get(titulo)
+
+    def buscar_figura(self, titulo: str) -> Optional[Figura]:
+        return self._indice_figuras.get(titulo)
+
+    def buscar_formula(self, legenda: str) -> Optional[Formula]:
+        return self._indice_formulas.get(legenda)
+
+    def adicionar_tabela(self, tabela: Tabela):
+        self.banco_tabelas.append(tabela)
+        self._indice_tabelas.setdefault(tabela.titulo, tabela)
+
+    def adicionar_figura(self, figura: Figura):
+        self.banco_figuras.append(figura)
+        self._indice_figuras.setdefault(figura.titulo, figura)
+
+    def adicionar_formula(self, formula: Formula):
+        self.banco_formulas.append(formula)
+        self._indice_formulas.setdefault(formula.legenda, formula)
+
+    def atualizar_tabela(self, tabela: Tabela, dados_novos: Tabela):
+        """Copia os dados editados para a tabela existente, preservando a identidade do objeto."""
+        tabela.__dict__.update(dados_novos.__dict__)
+        self._indice_tabelas = self._indexar(self.banco_tabelas, 'titulo')
+
+    def atualizar_figura(self, figura: Figura, dados_novos: Figura):
+        figura.__dict__.update(dados_novos.__dict__)
+        self._indice_figuras = self._indexar(self.banco_figuras, 'titulo')
+
+    def atualizar_formula(self, formula: Formula, dados_novos: Formula):
+        formula.__dict__.update(dados_novos.__dict__)
+        self._indice_formulas = self._indexar(self.banco_formulas, 'legenda')
+
+    def remover_tabela(self, titulo: str):
+        """Remove todas as tabelas com o título informado."""
+        self.banco_tabelas = [t for t in self.banco_tabelas if t.titulo != titulo]
+        self._indice_tabelas.pop(titulo, None)
+
+    def remover_figura(self, titulo: str):
+        self.banco_figuras = [f for f in self.banco_figuras if f.titulo != titulo]
+        self._indice_figuras.pop(titulo, None)
+
+    def remover_formula(self, legenda: str):
+        self.banco_formulas = [f for f in self.banco_formulas if f.legenda != legenda]
+        self._indice_formulas.pop(legenda, None)
+
+    def snapshot(self) -> 'DocumentoABNT':
+        """Cópia independente do documento, para ser usada fora da thread da interface (ex: exportação)."""
+        return copy.deepcopy(self)
+
     def ordenar_referencias(self):
         self.referencias.sort(key=lambda ref: ref.get_chave_ordenacao())
         
     def to_dict(self):
         refs_serializadas = []
         for ref in self.referencias:
-            ref_dict = ref.__dict__
+            ref_dict = dict(ref.__dict__)
             ref_dict['tipo_ref'] = ref.tipo
             refs_serializadas.append(ref_dict)
 
@@ -125,6 +196,7 @@ class DocumentoABNT:
         doc.banco_tabelas = [Tabela(**t) for t in data.get('banco_tabelas', [])]
         doc.banco_figuras = [Figura(**f) for f in data.get('banco_figuras', [])]
         doc.banco_formulas = [Formula(**f) for f in data.get('banco_formulas', [])] # NOVO
+        doc.reindexar_bancos()
 
         for ref_data in data.get('referencias', []):
             tipo = ref_data.pop('tipo_ref', None)
@@ -0,0 +1,121 @@
+# escritor_docx_streaming.py
+# Descrição: Escrita do .docx com memória limitada. Os elementos já renderizados do corpo são
+# serializados aos poucos para um arquivo temporário (e removidos da árvore do python-docx), e as
+# imagens ficam no disco até o momento de gravar o pacote, quando são copiadas direto para o zip.
+
+import os
+import shutil
+import tempfile
+import zipfile
+from lxml import etree
+from docx.opc.packuri import CONTENT_TYPES_URI, PACKAGE_URI
+from docx.opc.pkgwriter import _ContentTypesItem
+from docx.oxml.ns import qn
+from docx.oxml import parse_xml
+from docx.parts.image import ImagePart
+
+TAMANHO_BLOCO_LEITURA = 1024 * 1024
+
+def serializar_elementos_corpo(doc, elementos) -> bytes:
+    """
+    Remove os elementos do corpo e devolve o XML deles, sem declarações de namespace (que ficam
+    no w:document). Os elementos são movidos para uma raiz com os mesmos namespaces do documento,
+    para que a serialização não repita as declarações xmlns em cada elemento.
+    """
+    raiz = etree.Element(doc.element.tag, nsmap=doc.element.nsmap)
+    recipiente = etree.SubElement(raiz, qn('w:body'))
+    recipiente.extend(elementos)
+    xml = etree.tostring(raiz, encoding='utf-8')
+    inicio = xml.index(b'<w:body>') + len(b'<w:body>')
+    fim = xml.rindex(b'</w:body>')
+    return xml[inicio:fim]
+
+def inserir_elementos_corpo(doc, xml: bytes):
+    """Analisa um XML gerado por serializar_elementos_corpo e insere os elementos no fim do corpo."""
+    abertura = etree.tostring(etree.Element(doc.element.tag, nsmap=doc.element.nsmap))[:-2] + b'>'
+    raiz = parse_xml(abertura + b'<w:body>' + xml + b'</w:body></w:document>')
+    corpo = doc.element.body
+    sectPr = corpo.sectPr
+    for elemento in list(raiz[0]):
+        if sectPr is not None:
+            sectPr.addprevious(elemento)
+        else:
+            corpo.append(elemento)
+
+class ParteImagemEmDisco(ImagePart):
+    """ImagePart cujo conteúdo é lido do arquivo de origem apenas quando necessário."""
+
+    def __init__(self, partname, imagem, caminho: str, sha1: str):
+        super().__init__(partname, imagem.content_type, b'', imagem)
+        self.caminho = caminho
+        self._sha1 = sha1
+
+    @property
+    def blob(self):
+        with open(self.caminho, 'rb') as f:
+            return f.read()
+
+    @property
+    def sha1(self):
+        return self._sha1
+
+class EscritorDOCXStreaming:
+    def __init__(self, doc):
+        self.doc = doc
+        self._arquivo_corpo = tempfile.TemporaryFile(prefix="docx_corpo_")
+
+    def descarregar_corpo(self):
+        """
+        Serializa para o arquivo temporário todos os elementos do corpo já renderizados e os remove
+        da árvore em memória. Apenas o w:sectPr final (que define a última seção) permanece.
+        """
+        corpo = self.doc.element.body
+        filhos = [filho for filho in corpo if filho.tag != qn('w:sectPr')]
+        if filhos:
+            self._arquivo_corpo.write(serializar_elementos_corpo(self.doc, filhos))
+
+    def salvar(self, caminho_arquivo: str):
+        """
+        Grava o pacote .docx. O corpo descarregado é copiado em blocos para word/document.xml e as
+        imagens são copiadas do disco. O arquivo final só substitui o destino quando estiver completo.
+        """
+        self.descarregar_corpo()
+        package = self.doc.part.package
+        partes = list(package.iter_parts())
+        for parte in partes:
+            parte.before_marshal()
+
+        diretorio = os.path.dirname(os.path.abspath(caminho_arquivo))
+        fd, caminho_temporario = tempfile.mkstemp(prefix=".docx_", suffix=".tmp", dir=diretorio)
+        os.close(fd)
+        try:
+            with zipfile.ZipFile(caminho_temporario, 'w', zipfile.ZIP_DEFLATED) as zf:
+                zf.writestr(CONTENT_TYPES_URI.membername, _ContentTypesItem.from_parts(partes).blob)
+                zf.writestr(PACKAGE_URI.rels_uri.membername, package.rels.xml)
+                for parte in partes:
+                    if parte is self.doc.part:
+                        self._escrever_documento(zf, parte)
+                    elif isinstance(parte, ParteImagemEmDisco):
+                        # Imagens já são comprimidas; são armazenadas sem recompressão.
+                        zf.write(parte.caminho, parte.partname.membername, compress_type=zipfile.ZIP_STORED)
+                    else:
+                        zf.writestr(parte.partname.membername, parte.blob)
+                    if len(parte.rels):
+                        zf.writestr(parte.partname.rels_uri.membername, parte.rels.xml)
+            os.replace(caminho_temporario, caminho_arquivo)
+        except BaseException:
+            if os.path.exists(caminho_temporario):
+                os.remove(caminho_temporario)
+            raise
+        finally:
+            self._arquivo_corpo.close()
+
+    def _escrever_documento(self, zf, parte):
+        xml = parte.blob
+        marcador = b'<w:body>'
+        posicao = xml.index(marcador) + len(marcador)
+        with zf.open(parte.partname.membername, 'w') as destino:
+            destino.write(xml[:posicao])
+            self._arquivo_corpo.seek(0)
+            shutil.copyfileobj(self._arquivo_corpo, destino, TAMANHO_BLOCO_LEITURA)
+            destino.write(xml[posicao:])
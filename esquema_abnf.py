@@ -0,0 +1,54 @@
+# esquema_abnf.py
+# Descrição: Esquema de URL abnf:// do QWebEngine, que entrega à pré-visualização a página base e as
+# imagens a partir do RepositorioRecursos (memória), sem setHtml e sem URLs file:///. As imagens têm URL
+# derivada do conteúdo e são servidas como imutáveis, então não são buscadas de novo entre atualizações.
+
+from PySide6.QtCore import QBuffer, QByteArray, QIODevice
+from PySide6.QtWebEngineCore import QWebEngineUrlScheme, QWebEngineUrlSchemeHandler, QWebEngineUrlRequestJob
+
+from recursos_preview import ESQUEMA, HOST_RECURSOS, HOST_PAGINAS
+
+CABECALHO_CACHE_IMUTAVEL = b"public, max-age=31536000, immutable"
+
+def registrar_esquema():
+    """Registra o esquema abnf://. Precisa ser chamado antes de criar o QApplication."""
+    esquema = QWebEngineUrlScheme(ESQUEMA.encode('ascii'))
+    esquema.setSyntax(QWebEngineUrlScheme.Syntax.Host)
+    esquema.setFlags(QWebEngineUrlScheme.Flag.SecureScheme | QWebEngineUrlScheme.Flag.LocalAccessAllowed)
+    QWebEngineUrlScheme.registerScheme(esquema)
+
+class EsquemaABNF(QWebEngineUrlSchemeHandler):
+    def __init__(self, repositorio, parent=None):
+        super().__init__(parent)
+        self.repositorio = repositorio
+
+    def instalar(self, view):
+        """Instala o tratador no perfil da página do QWebEngineView."""
+        perfil = view.page().profile()
+        # Ao voltar da tela inicial, uma nova janela substitui o tratador da anterior.
+        perfil.removeUrlScheme(ESQUEMA.encode('ascii'))
+        perfil.installUrlSchemeHandler(ESQUEMA.encode('ascii'), self)
+
+    def requestStarted(self, job: QWebEngineUrlRequestJob):
+        url = job.requestUrl()
+        nome = url.path().lstrip('/')
+        if url.host() == HOST_RECURSOS:
+            recurso = self.repositorio.obter_recurso(nome)
+            imutavel = True
+        elif url.host() == HOST_PAGINAS:
+            recurso = self.repositorio.obter_pagina(nome)
+            imutavel = False
+        else:
+            recurso = None
+        if recurso is None:
+            job.fail(QWebEngineUrlRequestJob.Error.UrlNotFound)
+            return
+        tipo, dados = recurso
+        # setAdditionalResponseHeaders só existe a partir do Qt 6.6.
+        if imutavel and hasattr(job, 'setAdditionalResponseHeaders'):
+            job.setAdditionalResponseHeaders({QByteArray(b"Cache-Control"): QByteArray(CABECALHO_CACHE_IMUTAVEL)})
+        # O buffer pertence ao job e é destruído junto com ele.
+        buffer = QBuffer(job)
+        buffer.setData(QByteArray(dados))
+        buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+        job.reply(tipo.encode('ascii'), buffer)
@@ -3,14 +3,22 @@
 
 import os
 import re
+import tempfile
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from xml.sax.saxutils import escape
 from docx import Document
-from docx.shared import Cm, Pt
+from docx.shared import Cm, Pt, Emu
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT, WD_TAB_ALIGNMENT
 from docx.enum.section import WD_SECTION
-from docx.oxml.ns import qn
-from docx.oxml import OxmlElement
+from docx.oxml.ns import qn, nsdecls
+from docx.oxml import OxmlElement, parse_xml
+from docx.oxml.shape import CT_Inline
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.parts.image import ImagePart
 
 try:
+    import pythoncom
     import win32com.client as win32
     WIN32_AVAILABLE = True
 except ImportError:
@@ -19,11 +27,143 @@ except ImportError:
 
 from documento import DocumentoABNT, Capitulo
 from normas_abnt import MotorNormasABNT
+from tokenizador_conteudo import tokenizar, TokenParagrafo, TokenElemento
+from gerador_preview import GeradorHTMLPreview
+from escritor_docx_streaming import (EscritorDOCXStreaming, ParteImagemEmDisco,
+                                     serializar_elementos_corpo, inserir_elementos_corpo)
+from cache_fragmentos import CacheFragmentosDOCX, PADRAO_MARCA, marca_relativa, calcular_chave
+from carregador_imagens import carregar_imagem, pre_carregar_imagens, coletar_caminhos_imagens
+from instrumentacao_docx import InstrumentacaoDOCX
 
-def adicionar_sumario(doc, paragrafo_placeholder):
+# Caracteres de controle não permitidos em XML (exceto tab, quebra de linha e retorno de carro).
+_CARACTERES_INVALIDOS_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+def _texto_celula_xml(texto) -> str:
+    """Converte o texto de uma célula no conteúdo de um w:r, tratando tabs e quebras de linha como o python-docx."""
+    texto = _CARACTERES_INVALIDOS_XML.sub('', str(texto)).replace('\r\n', '\n').replace('\r', '\n')
+    partes = []
+    for i, linha in enumerate(texto.split('\n')):
+        if i:
+            partes.append('<w:br/>')
+        for j, trecho in enumerate(linha.split('\t')):
+            if j:
+                partes.append('<w:tab/>')
+            if trecho:
+                partes.append(f'<w:t xml:space="preserve">{escape(trecho)}</w:t>')
+    return ''.join(partes)
+
+def construir_linhas_tabela_xml(dados, num_cols, largura_coluna_twips, estilo_cabecalho, estilo_celula) -> str:
+    """
+    Monta, em uma única passada, o XML de todas as linhas (w:tr) de uma tabela. A formatação das
+    células vem dos estilos de parágrafo informados, sem formatação direta em cada run.
+    Retorna um w:tbl contendo apenas as linhas, para ser analisado de uma vez com parse_xml.
+    """
+    tc_pr = f'<w:tcPr><w:tcW w:type="dxa" w:w="{largura_coluna_twips}"/></w:tcPr>'
+    partes = [f'<w:tbl {nsdecls("w")}>']
+    for i, row_data in enumerate(dados):
+        p_pr = f'<w:pPr><w:pStyle w:val="{estilo_cabecalho if i == 0 else estilo_celula}"/></w:pPr>'
+        partes.append('<w:tr>')
+        for j in range(num_cols):
+            cell_data = row_data[j] if j < len(row_data) else ''
+            conteudo = _texto_celula_xml(cell_data) if cell_data else ''
+            run = f'<w:r>{conteudo}</w:r>' if conteudo else ''
+            partes.append(f'<w:tc>{tc_pr}<w:p>{p_pr}{run}</w:p></w:tc>')
+        partes.append('</w:tr>')
+    partes.append('</w:tbl>')
+    return ''.join(partes)
+
+# Recuo de cada nível do sumário e posição da parada de tabulação (fim da área útil de 16 cm).
+RECUO_NIVEL_SUMARIO = Cm(0.5)
+POSICAO_NUMERO_PAGINA_SUMARIO = Cm(16)
+
+def nome_marcador_sumario(id_ancora: str) -> str:
+    """Nome do marcador (bookmark) do Word usado pelo sumário para a âncora de uma seção."""
+    return "_Toc_" + id_ancora.replace('-', '_')
+
+def adicionar_marcador(paragrafo, nome: str, id_marcador: int):
+    """Envolve o conteúdo do parágrafo em um marcador do Word."""
+    inicio = OxmlElement('w:bookmarkStart')
+    inicio.set(qn('w:id'), str(id_marcador))
+    inicio.set(qn('w:name'), nome)
+    fim = OxmlElement('w:bookmarkEnd')
+    fim.set(qn('w:id'), str(id_marcador))
+    p_xml = paragrafo._p
+    if p_xml.pPr is not None:
+        p_xml.pPr.addnext(inicio)
+    else:
+        p_xml.insert(0, inicio)
+    p_xml.append(fim)
+
+def _criar_run_campo(tipo_campo: str):
+    r = OxmlElement('w:r')
+    fldChar = OxmlElement('w:fldChar')
+    fldChar.set(qn('w:fldCharType'), tipo_campo)
+    r.append(fldChar)
+    return r
+
+def _criar_run_texto(texto: str):
+    r = OxmlElement('w:r')
+    t = OxmlElement('w:t')
+    t.set(qn('xml:space'), 'preserve')
+    t.text = texto
+    r.append(t)
+    return r
+
+def _criar_paragrafo_entrada_sumario(entrada: dict):
+    """
+    Cria o parágrafo de uma entrada do sumário: texto do título, tabulação com pontilhado e
+    um campo PAGEREF para o marcador da seção (com o número de página estimado como resultado).
+    Tudo fica dentro de um hyperlink para o marcador, como o Word faz ao atualizar o sumário.
+    """
+    p = OxmlElement('w:p')
+    pPr = OxmlElement('w:pPr')
+    tabs = OxmlElement('w:tabs')
+    tab = OxmlElement('w:tab')
+    tab.set(qn('w:val'), 'right')
+    tab.set(qn('w:leader'), 'dot')
+    tab.set(qn('w:pos'), str(int(POSICAO_NUMERO_PAGINA_SUMARIO.twips)))
+    tabs.append(tab)
+    pPr.append(tabs)
+    if entrada["nivel"] > 1:
+        ind = OxmlElement('w:ind')
+        ind.set(qn('w:left'), str(int(RECUO_NIVEL_SUMARIO.twips) * (entrada["nivel"] - 1)))
+        pPr.append(ind)
+    p.append(pPr)
+
+    if entrada["numero"]:
+        titulo = entrada["titulo"].upper() if entrada["nivel"] == 1 else entrada["titulo"]
+        texto = f"{entrada['numero']} {titulo}"
+    else:
+        texto = entrada["titulo"].upper()
+    marcador = nome_marcador_sumario(entrada["id_ancora"])
+
+    hyperlink = OxmlElement('w:hyperlink')
+    hyperlink.set(qn('w:anchor'), marcador)
+    hyperlink.set(qn('w:history'), '1')
+    hyperlink.append(_criar_run_texto(texto))
+    r_tab = OxmlElement('w:r')
+    r_tab.append(OxmlElement('w:tab'))
+    hyperlink.append(r_tab)
+    hyperlink.append(_criar_run_campo('begin'))
+    r_instr = OxmlElement('w:r')
+    instrText = OxmlElement('w:instrText')
+    instrText.set(qn('xml:space'), 'preserve')
+    instrText.text = f' PAGEREF {marcador} \\h '
+    r_instr.append(instrText)
+    hyperlink.append(r_instr)
+    hyperlink.append(_criar_run_campo('separate'))
+    hyperlink.append(_criar_run_texto(str(entrada["pagina"])))
+    hyperlink.append(_criar_run_campo('end'))
+    p.append(hyperlink)
+    return p
+
+def adicionar_sumario(doc, paragrafo_placeholder, entradas=None):
+    """
+    Substitui o parágrafo informado por um campo TOC. Se as entradas forem informadas, o resultado
+    do campo já é preenchido com elas (sem depender do Word); caso contrário o campo fica vazio.
+    """
     sdt = OxmlElement('w:sdt')
     sdtContent = OxmlElement('w:sdtContent')
-    p = OxmlElement('w:p')
     r = OxmlElement('w:r')
     fldChar_begin = OxmlElement('w:fldChar')
     fldChar_begin.set(qn('w:fldCharType'), 'begin')
@@ -32,25 +172,75 @@ def adicionar_sumario(doc, paragrafo_placeholder):
     instrText.text = 'TOC \\o "1-3" \\h \\z \\u'
     fldChar_separate = OxmlElement('w:fldChar')
     fldChar_separate.set(qn('w:fldCharType'), 'separate')
-    fldChar_end = OxmlElement('w:fldChar')
-    fldChar_end.set(qn('w:fldCharType'), 'end')
     r.append(fldChar_begin)
     r.append(instrText)
     r.append(fldChar_separate)
-    r.append(fldChar_end)
-    p.append(r)
-    sdtContent.append(p)
+
+    paragrafos = [_criar_paragrafo_entrada_sumario(entrada) for entrada in (entradas or [])]
+    if not paragrafos:
+        paragrafos = [OxmlElement('w:p')]
+    primeiro = paragrafos[0]
+    if primeiro.pPr is not None:
+        primeiro.pPr.addnext(r)
+    else:
+        primeiro.insert(0, r)
+    paragrafos[-1].append(_criar_run_campo('end'))
+
+    for p in paragrafos:
+        sdtContent.append(p)
     sdt.append(sdtContent)
     p_xml = paragrafo_placeholder._p
     p_xml.addnext(sdt)
     p_xml.getparent().remove(p_xml)
 
+# Atributos dos elementos dos bancos que não entram na chave do cache de fragmentos: o número é
+# relativo dentro do fragmento e os caminhos de arquivo são substituídos pelo hash da imagem.
+CAMPOS_FORA_DA_CHAVE = {'numero', 'caminho_original', 'caminho_processado', 'caminho_svg', 'caminho_processado_png'}
+
+class ExportacaoCancelada(Exception):
+    """Lançada quando a geração é cancelada (GeradorDOCX.cancelar). Nenhum arquivo é deixado no destino."""
+
 class GeradorDOCX:
-    def __init__(self, doc_abnt: DocumentoABNT):
+    def __init__(self, doc_abnt: DocumentoABNT, atualizar_sumario_word: bool = False, modo_streaming: bool = False,
+                 usar_cache_fragmentos: bool = False, diretorio_cache=None, modo_estilos: bool = False,
+                 processos: int = 1, progresso=None, instrumentar: bool = False):
         self.doc_abnt = doc_abnt
+        # Com instrumentar=True, o tempo de cada fase é registrado e um relatório JSON
+        # (ver instrumentacao_docx.py) é gravado ao lado do .docx.
+        self.instrumentacao = InstrumentacaoDOCX() if instrumentar else None
+        self._opcoes = {"atualizar_sumario_word": atualizar_sumario_word, "modo_streaming": modo_streaming,
+                        "usar_cache_fragmentos": usar_cache_fragmentos, "modo_estilos": modo_estilos,
+                        "processos": processos}
+        # O sumário é sempre preenchido diretamente no XML; a automação do Word (somente Windows)
+        # é um refinamento opcional que recalcula os números de página reais.
+        self.atualizar_sumario_word = atualizar_sumario_word
+        self._proximo_id_marcador = 0
         self.doc = Document()
-        self.regras = MotorNormasABNT(self.doc_abnt)
-        self.regras.configurar_pagina_e_estilos(self.doc)
+        self.regras = MotorNormasABNT(self.doc_abnt, modo_estilos=modo_estilos)
+        with self._fase("configurar_pagina_e_estilos"):
+            self.regras.configurar_pagina_e_estilos(self.doc)
+        # No modo streaming o corpo já renderizado vai para o disco a cada seção e as imagens não
+        # são carregadas na memória, limitando o consumo em documentos muito grandes.
+        self._escritor = EscritorDOCXStreaming(self.doc) if modo_streaming else None
+        self._imagens_em_disco = modo_streaming
+        self._imagens = {}
+        self._partes_imagem = {}
+        self._proximo_id_forma = None
+        # Com o cache de fragmentos, cada capítulo de primeiro nível é renderizado como um modelo
+        # com marcas relativas (ver cache_fragmentos.py) e reaproveitado enquanto não mudar.
+        self._cache_fragmentos = CacheFragmentosDOCX(diretorio_cache) if usar_cache_fragmentos else None
+        self._bases_fragmento = None
+        self._imagens_fragmento = []
+        # Com mais de um processo, os capítulos de primeiro nível são renderizados como fragmentos
+        # em paralelo e depois inseridos em ordem (a numeração é atribuída na inserção).
+        self.processos = max(1, processos or os.cpu_count() or 1)
+        self._opcoes_processo = {"modo_estilos": modo_estilos}
+        # progresso(passos_feitos, passos_total, descricao) é chamado a cada seção, tabela, figura
+        # e fórmula renderizada. cancelar() pode ser chamado de outra thread.
+        self._progresso = progresso
+        self._cancelado = False
+        self._passos_total = 0
+        self._passos_feitos = 0
         self.contador_tabelas = 0
         self.contador_figuras = 0
         self.contador_formulas = 0
@@ -60,6 +250,8 @@ class GeradorDOCX:
             print("Não foi possível atualizar o sumário: pywin32 não está instalado.")
             return False
         word = None
+        # A automação COM pode ser chamada fora da thread principal (exportação em segundo plano).
+        pythoncom.CoInitialize()
         try:
             print("Iniciando automação do MS Word para reconstrução do sumário...")
             word = win32.DispatchEx("Word.Application")
@@ -78,105 +270,461 @@ class GeradorDOCX:
         finally:
             if word is not None:
                 word.Quit()
+            pythoncom.CoUninitialize()
+
+    def _fase(self, nome: str, **detalhes):
+        """Contexto que mede uma fase quando a instrumentação está ativa."""
+        if self.instrumentacao is None:
+            return nullcontext()
+        return self.instrumentacao.fase(nome, **detalhes)
+
+    def _gravar_relatorio_instrumentacao(self, caminho_arquivo: str, status: str):
+        inst = self.instrumentacao
+        inst.contar("capitulos", len(self.doc_abnt.estrutura_textual.filhos))
+        inst.contar("tabelas", self.contador_tabelas)
+        inst.contar("figuras", self.contador_figuras)
+        inst.contar("formulas", self.contador_formulas)
+        inst.contar("referencias", len(self.doc_abnt.referencias))
+        inst.contar("imagens_no_pacote", len(self._partes_imagem))
+        if self._cache_fragmentos is not None:
+            inst.contar("cache_acertos", self._cache_fragmentos.acertos)
+            inst.contar("cache_faltas", self._cache_fragmentos.faltas)
+        try:
+            caminho = inst.salvar(caminho_arquivo, arquivo=os.path.abspath(caminho_arquivo), status=status,
+                                  tipo_trabalho=self.doc_abnt.configuracoes.tipo_trabalho, opcoes=self._opcoes,
+                                  tamanho_bytes=os.path.getsize(caminho_arquivo) if status == "sucesso" else None)
+            print(f"Relatório de instrumentação gravado em {caminho}")
+        except OSError as e:
+            print(f"AVISO: Não foi possível gravar o relatório de instrumentação: {e}")
+
+    def _descarregar_corpo(self):
+        if self._escritor is not None:
+            self._escritor.descarregar_corpo()
+
+    def _salvar(self, caminho_arquivo: str):
+        self._verificar_cancelamento()
+        with self._fase("gravacao", streaming=self._escritor is not None):
+            if self._escritor is not None:
+                self._escritor.salvar(caminho_arquivo)
+            else:
+                self._salvar_documento(caminho_arquivo)
+        # Depois de gravado o arquivo a geração não é mais cancelada; o passo só é registrado.
+        self._registrar_passos("Arquivo gravado")
+
+    def _salvar_documento(self, caminho_arquivo: str):
+        # O destino só é substituído quando o arquivo estiver completo.
+        diretorio = os.path.dirname(os.path.abspath(caminho_arquivo))
+        fd, caminho_temporario = tempfile.mkstemp(prefix=".docx_", suffix=".tmp", dir=diretorio)
+        os.close(fd)
+        try:
+            self.doc.save(caminho_temporario)
+            os.replace(caminho_temporario, caminho_arquivo)
+        except BaseException:
+            if os.path.exists(caminho_temporario):
+                os.remove(caminho_temporario)
+            raise
+
+    def cancelar(self):
+        """Pede o cancelamento da geração; ela é interrompida no próximo passo com ExportacaoCancelada."""
+        self._cancelado = True
+
+    def _verificar_cancelamento(self):
+        if self._cancelado:
+            raise ExportacaoCancelada("Exportação cancelada pelo usuário.")
+
+    def _avancar(self, descricao: str, passos: int = 1):
+        """Registra passos concluídos e notifica o progresso. Também é o ponto de cancelamento."""
+        self._verificar_cancelamento()
+        self._registrar_passos(descricao, passos)
+
+    def _registrar_passos(self, descricao: str, passos: int = 1):
+        if self._bases_fragmento is not None:
+            return  # Fragmentos contam os passos quando são inseridos.
+        self._passos_feitos += passos
+        if self._progresso is not None:
+            self._progresso(self._passos_feitos, self._passos_total, descricao)
+
+    def _contar_passos(self, no: Capitulo) -> int:
+        """Passos de progresso de uma seção e subseções: a própria seção e cada elemento referenciado."""
+        passos = 1
+        for token in tokenizar(no.conteudo):
+            if isinstance(token, TokenElemento):
+                if token.tipo == "Tabela":
+                    passos += self.doc_abnt.buscar_tabela(token.titulo) is not None
+                elif token.tipo == "Figura":
+                    passos += self.doc_abnt.buscar_figura(token.titulo) is not None
+                elif token.tipo == "Formula":
+                    passos += self.doc_abnt.buscar_formula(token.titulo) is not None
+        return passos + sum(self._contar_passos(filho) for filho in no.filhos)
+
+    def _pre_carregar_imagens(self):
+        """Lê em paralelo todas as imagens referenciadas, antes de começar a renderização."""
+        self._imagens = pre_carregar_imagens(coletar_caminhos_imagens(self.doc_abnt),
+                                             em_disco=self._imagens_em_disco)
+
+    def _obter_parte_imagem(self, carregada):
+        """Retorna a parte de imagem do pacote (imagens com o mesmo conteúdo são compartilhadas)."""
+        parte = self._partes_imagem.get(carregada.sha1)
+        if parte is None:
+            image_parts = self.doc.part.package.image_parts
+            partname = image_parts._next_image_partname(carregada.imagem.ext)
+            if self._escritor is not None:
+                parte = ParteImagemEmDisco(partname, carregada.imagem, carregada.caminho, carregada.sha1)
+            else:
+                parte = ImagePart.from_image(carregada.imagem, partname)
+            image_parts.append(parte)
+            self._partes_imagem[carregada.sha1] = parte
+        return parte
+
+    def _inserir_imagem(self, run, caminho: str, largura):
+        """Equivalente a run.add_picture(), usando as imagens pré-carregadas."""
+        carregada = self._imagens.get(caminho)
+        if carregada is None:
+            carregada = carregar_imagem(caminho, em_disco=self._imagens_em_disco)
+            self._imagens[caminho] = carregada
+        elif isinstance(carregada, Exception):
+            raise carregada
+        if self._bases_fragmento is not None:
+            # Renderizando um fragmento: a parte e o rId só são criados quando ele for inserido.
+            indice = len(self._imagens_fragmento)
+            self._imagens_fragmento.append(carregada)
+            cx, cy = carregada.imagem.scaled_dimensions(largura, None)
+            inline = CT_Inline.new_pic_inline(0, marca_relativa('I', indice), marca_relativa('N', indice), cx, cy)
+            inline.docPr.set('id', marca_relativa('D', indice))
+            inline.docPr.set('name', f"Picture {marca_relativa('D', indice)}")
+            run._r.add_drawing(inline)
+            return
+        parte = self._obter_parte_imagem(carregada)
+        rId = self.doc.part.relate_to(parte, RT.IMAGE)
+        cx, cy = parte.image.scaled_dimensions(largura, None)
+        inline = CT_Inline.new_pic_inline(self._novo_id_forma(), rId, parte.image.filename, cx, cy)
+        run._r.add_drawing(inline)
+
+    def _novo_id_forma(self, quantidade: int = 1) -> int:
+        """Reserva ids de forma (wp:docPr) e retorna o primeiro."""
+        # O python-docx procura o próximo id varrendo todo o XML a cada imagem (e não enxerga o
+        # corpo já descarregado no modo streaming); o contador é mantido aqui.
+        if self._proximo_id_forma is None:
+            self._proximo_id_forma = self.doc.part.next_id
+        id_forma = self._proximo_id_forma
+        self._proximo_id_forma += quantidade
+        return id_forma
+
+    def _rotulo_numero(self, tipo: str, numero: int) -> str:
+        """Texto do número de uma tabela (T), figura (F) ou equação (E); relativo dentro de um fragmento."""
+        if self._bases_fragmento is None:
+            return str(numero)
+        return marca_relativa(tipo, numero - self._bases_fragmento[tipo])
 
     def gerar_documento(self, caminho_arquivo: str):
-        if self.regras.is_artigo:
-            self._gerar_artigo(caminho_arquivo)
-        else:
-            self._gerar_trabalho_academico(caminho_arquivo)
+        # Passos fixos: elementos pré-textuais e sumário (ou cabeçalho do artigo), referências e gravação.
+        self._passos_total = (3 if self.regras.is_artigo else 4) + sum(self._contar_passos(c) for c in self.doc_abnt.estrutura_textual.filhos)
+        self._passos_feitos = 0
+        try:
+            with self._fase("pre_carregamento_imagens"):
+                self._pre_carregar_imagens()
+            if self.regras.is_artigo:
+                self._gerar_artigo(caminho_arquivo)
+            else:
+                self._gerar_trabalho_academico(caminho_arquivo)
+        except ExportacaoCancelada:
+            raise
+        except Exception as e:
+            # Em um lote, o relatório dos projetos que falharam também interessa.
+            if self.instrumentacao is not None:
+                self._gravar_relatorio_instrumentacao(caminho_arquivo, f"erro: {type(e).__name__}: {e}")
+            raise
+        if self.instrumentacao is not None:
+            self._gravar_relatorio_instrumentacao(caminho_arquivo, "sucesso")
 
     def _gerar_trabalho_academico(self, caminho_arquivo: str):
-        self._renderizar_capa()
-        self._renderizar_folha_rosto()
-        self._renderizar_resumo()
+        with self._fase("capa"):
+            self._renderizar_capa()
+        with self._fase("folha_rosto"):
+            self._renderizar_folha_rosto()
+        with self._fase("resumo"):
+            self._renderizar_resumo()
+        self._avancar("Elementos pré-textuais")
         section = self.doc.add_section(WD_SECTION.NEW_PAGE)
         self._set_page_numbering(section)
-        self._renderizar_sumario()
-        self._renderizar_secoes_recursivamente(self.doc_abnt.estrutura_textual)
+        with self._fase("sumario"):
+            self._renderizar_sumario()
+        self._avancar("Sumário")
+        self._descarregar_corpo()
+        with self._fase("capitulos"):
+            self._renderizar_capitulos(self.doc_abnt.estrutura_textual)
         self.doc.add_section(WD_SECTION.NEW_PAGE)
-        self._renderizar_referencias()
+        with self._fase("referencias", quantidade=len(self.doc_abnt.referencias)):
+            self._renderizar_referencias()
         
-        self.doc.save(caminho_arquivo)
-        self._atualizar_sumario_com_word(caminho_arquivo)
+        self._salvar(caminho_arquivo)
+        self._finalizar_cache_fragmentos()
+        if self.atualizar_sumario_word:
+            with self._fase("sumario_word") as registro:
+                atualizado = self._atualizar_sumario_com_word(caminho_arquivo)
+                if registro is not None:
+                    registro["atualizado"] = atualizado
 
     def _gerar_artigo(self, caminho_arquivo: str):
         section = self.doc.sections[0]
         self._set_page_numbering(section)
-        self.regras.renderizar_cabecalho_artigo(self.doc)
-        self._renderizar_secoes_recursivamente(self.doc_abnt.estrutura_textual)
+        with self._fase("cabecalho_artigo"):
+            self.regras.renderizar_cabecalho_artigo(self.doc)
+        self._avancar("Cabeçalho do artigo")
+        with self._fase("capitulos"):
+            self._renderizar_capitulos(self.doc_abnt.estrutura_textual)
         self.doc.add_section(WD_SECTION.NEW_PAGE)
-        self._renderizar_referencias()
+        with self._fase("referencias", quantidade=len(self.doc_abnt.referencias)):
+            self._renderizar_referencias()
         
-        self.doc.save(caminho_arquivo)
+        self._salvar(caminho_arquivo)
+        self._finalizar_cache_fragmentos()
         print("Documento de Artigo Científico gerado com sucesso.")
 
+    def _renderizar_capitulos(self, raiz: Capitulo):
+        if self._cache_fragmentos is None and self.processos == 1:
+            for i, capitulo in enumerate(raiz.filhos, 1):
+                with self._fase("capitulo", numero=i, titulo=capitulo.titulo):
+                    self._renderizar_secao(capitulo, str(i))
+                    self._descarregar_corpo()
+            return
+
+        chaves, fragmentos = {}, {}
+        origens = {}
+        if self._cache_fragmentos is not None:
+            with self._fase("consulta_cache_fragmentos"):
+                for i, capitulo in enumerate(raiz.filhos, 1):
+                    chaves[i] = self._chave_capitulo(capitulo, str(i))
+                    fragmento = self._cache_fragmentos.obter(chaves[i])
+                    if fragmento is not None and fragmento.get("imagens") == sum(1 for _ in self._imagens_do_capitulo(capitulo)):
+                        fragmentos[i] = fragmento
+                        origens[i] = "cache"
+
+        pendentes = [i for i in range(1, len(raiz.filhos) + 1) if i not in fragmentos]
+        if self.processos > 1 and len(pendentes) > 1:
+            with self._fase("renderizacao_paralela", processos=self.processos, capitulos=len(pendentes)):
+                novos = renderizar_fragmentos_em_paralelo(self.doc_abnt, pendentes, self._opcoes_processo, self.processos,
+                                                          ao_concluir=self._verificar_cancelamento)
+            for i, fragmento in novos.items():
+                fragmentos[i] = fragmento
+                origens[i] = "paralelo"
+                if self._cache_fragmentos is not None:
+                    self._cache_fragmentos.salvar(chaves[i], fragmento)
+
+        for i, capitulo in enumerate(raiz.filhos, 1):
+            with self._fase("capitulo", numero=i, titulo=capitulo.titulo, origem=origens.get(i, "renderizado")):
+                fragmento = fragmentos.get(i)
+                if fragmento is None:
+                    fragmento = self._renderizar_fragmento(capitulo, str(i))
+                    if self._cache_fragmentos is not None:
+                        self._cache_fragmentos.salvar(chaves[i], fragmento)
+                self._inserir_fragmento(capitulo, fragmento)
+                self._avancar(f"Seção {i} {capitulo.titulo}", passos=self._contar_passos(capitulo))
+                self._descarregar_corpo()
+
     def _renderizar_secoes_recursivamente(self, no_pai: Capitulo, prefixo_numeracao=""):
         for i, no_filho in enumerate(no_pai.filhos, 1):
-            numero_completo = f"{prefixo_numeracao}{i}"
-            nivel_titulo = len(numero_completo.split('.'))
-            self.regras.aplicar_estilo_titulo_secao(self.doc, numero_completo, no_filho.titulo, nivel=nivel_titulo)
-            
-            if no_filho.conteudo:
-                padrao = r"\{\{(Tabela|Figura|Formula):([^}]+)\}\}"
-                partes = re.split(padrao, no_filho.conteudo)
-                
-                for k, parte in enumerate(partes):
-                    if k % 3 == 0:
-                        bloco_de_texto = parte
-                        if bloco_de_texto.strip():
-                            paragrafos = bloco_de_texto.strip().split('\n')
-                            for texto_paragrafo in paragrafos:
-                                if texto_paragrafo.strip():
-                                    p = self.doc.add_paragraph()
-                                    self.regras.aplicar_estilo_paragrafo_normal(p, texto_paragrafo)
-                    elif k % 3 == 1:
-                        tipo = parte
-                        titulo = partes[k+1]
-                        if tipo == "Tabela":
-                            obj = next((t for t in self.doc_abnt.banco_tabelas if t.titulo == titulo), None)
-                            if obj:
-                                self.contador_tabelas += 1
-                                obj.numero = self.contador_tabelas
-                                self._renderizar_tabela(obj)
-                        elif tipo == "Figura":
-                            obj = next((f for f in self.doc_abnt.banco_figuras if f.titulo == titulo), None)
-                            if obj:
-                                self.contador_figuras += 1
-                                obj.numero = self.contador_figuras
-                                self._renderizar_figura(obj)
-                        elif tipo == "Formula":
-                            obj = next((f for f in self.doc_abnt.banco_formulas if f.legenda == titulo), None)
-                            if obj:
-                                self.contador_formulas += 1
-                                obj.numero = self.contador_formulas
-                                self._renderizar_formula(obj)
-            
-            self._renderizar_secoes_recursivamente(no_filho, prefixo_numeracao=f"{numero_completo}.")
+            self._renderizar_secao(no_filho, f"{prefixo_numeracao}{i}")
+
+    def _renderizar_secao(self, no: Capitulo, numero_completo: str):
+        nivel_titulo = len(numero_completo.split('.'))
+        heading = self.regras.aplicar_estilo_titulo_secao(self.doc, numero_completo, no.titulo, nivel=nivel_titulo)
+        self._marcar_titulo(heading, f"secao-{numero_completo.replace('.', '-')}")
+        self._avancar(f"Seção {numero_completo} {no.titulo}")
+
+        for token in tokenizar(no.conteudo):
+            if isinstance(token, TokenParagrafo):
+                p = self.doc.add_paragraph()
+                self.regras.aplicar_estilo_paragrafo_normal(p, token.texto)
+                continue
+            obj = self._buscar_e_numerar(token)
+            if not obj:
+                continue
+            if token.tipo == "Tabela":
+                with self._fase("tabela", titulo=obj.titulo, linhas=len(obj.dados or [])):
+                    self._renderizar_tabela(obj)
+                self._avancar(f"Tabela {obj.numero}")
+            elif token.tipo == "Figura":
+                with self._fase("figura", titulo=obj.titulo):
+                    self._renderizar_figura(obj)
+                self._avancar(f"Figura {obj.numero}")
+            elif token.tipo == "Formula":
+                with self._fase("formula", titulo=obj.legenda):
+                    self._renderizar_formula(obj)
+                self._avancar(f"Equação {obj.numero}")
+
+        self._renderizar_secoes_recursivamente(no, prefixo_numeracao=f"{numero_completo}.")
+
+    def _buscar_e_numerar(self, token: TokenElemento):
+        """Busca o elemento referenciado e, se existir, atribui a ele o próximo número do seu tipo."""
+        if token.tipo == "Tabela":
+            obj = self.doc_abnt.buscar_tabela(token.titulo)
+            if obj:
+                self.contador_tabelas += 1
+                obj.numero = self.contador_tabelas
+        elif token.tipo == "Figura":
+            obj = self.doc_abnt.buscar_figura(token.titulo)
+            if obj:
+                self.contador_figuras += 1
+                obj.numero = self.contador_figuras
+        elif token.tipo == "Formula":
+            obj = self.doc_abnt.buscar_formula(token.titulo)
+            if obj:
+                self.contador_formulas += 1
+                obj.numero = self.contador_formulas
+        else:
+            obj = None
+        return obj
+
+    def _numerar_elementos(self, no: Capitulo):
+        """Numera as tabelas, figuras e fórmulas da seção e subseções como a renderização faria."""
+        for token in tokenizar(no.conteudo):
+            if isinstance(token, TokenElemento):
+                self._buscar_e_numerar(token)
+        for filho in no.filhos:
+            self._numerar_elementos(filho)
+
+    def _dados_chave_capitulo(self, no: Capitulo):
+        """Tudo o que influencia o XML renderizado de uma seção e das suas subseções."""
+        elementos = []
+        for token in tokenizar(no.conteudo):
+            if not isinstance(token, TokenElemento):
+                continue
+            if token.tipo == "Tabela":
+                obj = self.doc_abnt.buscar_tabela(token.titulo)
+                imagem = None
+            elif token.tipo == "Figura":
+                obj = self.doc_abnt.buscar_figura(token.titulo)
+                imagem = obj.caminho_processado if obj else None
+            else:
+                obj = self.doc_abnt.buscar_formula(token.titulo)
+                imagem = obj.caminho_processado_png if obj else None
+            dados_obj = {k: v for k, v in vars(obj).items() if k not in CAMPOS_FORA_DA_CHAVE} if obj else None
+            # A imagem entra na chave pelo hash do conteúdo (ou pelo erro, se ela não puder ser lida),
+            # já que os caminhos mudam a cada vez que o projeto é aberto.
+            if imagem:
+                carregada = self._imagens.get(imagem)
+                imagem = repr(carregada) if carregada is None or isinstance(carregada, Exception) else carregada.sha1
+            elementos.append([token.tipo, token.titulo, dados_obj, imagem])
+        return {
+            "titulo": no.titulo,
+            "conteudo": no.conteudo,
+            "elementos": elementos,
+            "filhos": [self._dados_chave_capitulo(filho) for filho in no.filhos],
+        }
+
+    def _chave_capitulo(self, capitulo: Capitulo, numero: str) -> str:
+        return calcular_chave({
+            "numero": numero,
+            "configuracoes": vars(self.doc_abnt.configuracoes),
+            "modo_estilos": self.regras.modo_estilos,
+            "capitulo": self._dados_chave_capitulo(capitulo),
+        })
+
+    def _renderizar_fragmento(self, capitulo: Capitulo, numero: str) -> dict:
+        """
+        Renderiza o capítulo com marcas relativas no lugar da numeração e dos ids e o retira do
+        documento. Os contadores voltam ao estado anterior; o fragmento é inserido em seguida.
+        """
+        corpo = self.doc.element.body
+        anterior = corpo.sectPr.getprevious() if corpo.sectPr is not None else (corpo[-1] if len(corpo) else None)
+        contadores = (self.contador_tabelas, self.contador_figuras, self.contador_formulas, self._proximo_id_marcador)
+        self._bases_fragmento = {'T': self.contador_tabelas, 'F': self.contador_figuras,
+                                 'E': self.contador_formulas, 'M': self._proximo_id_marcador}
+        self._imagens_fragmento = []
+        try:
+            self._renderizar_secao(capitulo, numero)
+        finally:
+            self._bases_fragmento = None
+        marcadores = self._proximo_id_marcador - contadores[3]
+        self.contador_tabelas, self.contador_figuras, self.contador_formulas, self._proximo_id_marcador = contadores
+
+        novos = []
+        elemento = anterior.getnext() if anterior is not None else (corpo[0] if len(corpo) else None)
+        while elemento is not None and elemento is not corpo.sectPr:
+            novos.append(elemento)
+            elemento = elemento.getnext()
+        return {
+            "xml": serializar_elementos_corpo(self.doc, novos).decode('utf-8'),
+            "imagens": len(self._imagens_fragmento),
+            "marcadores": marcadores,
+        }
+
+    def _inserir_fragmento(self, capitulo: Capitulo, fragmento: dict):
+        """Insere um fragmento no documento, trocando as marcas relativas pelos valores reais."""
+        bases = {'T': self.contador_tabelas, 'F': self.contador_figuras,
+                 'E': self.contador_formulas, 'M': self._proximo_id_marcador}
+        imagens = list(self._imagens_do_capitulo(capitulo))
+        rIds, nomes = [], []
+        for carregada in imagens:
+            parte = self._obter_parte_imagem(carregada)
+            rIds.append(self.doc.part.relate_to(parte, RT.IMAGE))
+            nomes.append(escape(parte.image.filename, {'"': '&quot;'}))
+        bases['D'] = self._novo_id_forma(len(imagens)) if imagens else 0
+
+        def substituir(m):
+            tipo, valor = m.group(1), int(m.group(2))
+            if tipo == 'I':
+                return rIds[valor]
+            if tipo == 'N':
+                return nomes[valor]
+            return str(bases[tipo] + valor)
+
+        inserir_elementos_corpo(self.doc, PADRAO_MARCA.sub(substituir, fragmento["xml"]).encode('utf-8'))
+        # Fora do modo de estilos, os estilos de título são ajustados quando um título do nível é
+        # criado; no fragmento reaproveitado os títulos já existem, então os estilos são ajustados aqui.
+        if not self.regras.modo_estilos:
+            for nivel in range(1, self._profundidade(capitulo) + 1):
+                self.regras.formatar_estilo_titulo(self.doc.styles[f"Heading {nivel}"])
+        self._numerar_elementos(capitulo)
+        self._proximo_id_marcador += fragmento["marcadores"]
+
+    def _imagens_do_capitulo(self, no: Capitulo):
+        """Imagens inseridas pela seção e subseções, na ordem (as que não puderam ser lidas ficam de fora)."""
+        for token in tokenizar(no.conteudo):
+            if not isinstance(token, TokenElemento):
+                continue
+            if token.tipo == "Figura":
+                obj = self.doc_abnt.buscar_figura(token.titulo)
+                caminho = obj.caminho_processado if obj else None
+            elif token.tipo == "Formula":
+                obj = self.doc_abnt.buscar_formula(token.titulo)
+                caminho = obj.caminho_processado_png if obj else None
+            else:
+                continue
+            carregada = self._imagens.get(caminho) if caminho else None
+            if carregada is not None and not isinstance(carregada, Exception):
+                yield carregada
+        for filho in no.filhos:
+            yield from self._imagens_do_capitulo(filho)
+
+    def _profundidade(self, no: Capitulo) -> int:
+        return 1 + max((self._profundidade(filho) for filho in no.filhos), default=0)
+
+    def _finalizar_cache_fragmentos(self):
+        if self._cache_fragmentos is None:
+            return
+        print(f"Cache de fragmentos: {self._cache_fragmentos.acertos} capítulo(s) reaproveitado(s), "
+              f"{self._cache_fragmentos.faltas} renderizado(s).")
+        self._cache_fragmentos.limpar()
 
     def _renderizar_tabela(self, tabela_obj):
         p_titulo = self.doc.add_paragraph()
-        p_titulo.add_run(f"Tabela {tabela_obj.numero} – {tabela_obj.titulo}")
+        p_titulo.add_run(f"Tabela {self._rotulo_numero('T', tabela_obj.numero)} – {tabela_obj.titulo}")
         self.regras.aplicar_estilo_legenda(p_titulo, is_titulo=True)
         p_titulo.paragraph_format.keep_with_next = True
         
         if not tabela_obj.dados: return
         
-        num_rows = len(tabela_obj.dados)
-        num_cols = len(tabela_obj.dados[0]) if num_rows > 0 else 0
-        t = self.doc.add_table(rows=num_rows, cols=num_cols)
+        num_cols = len(tabela_obj.dados[0])
+        t = self.doc.add_table(rows=0, cols=num_cols)
         t.style = 'Table Grid'
-        
-        for i, row_data in enumerate(tabela_obj.dados):
-            for j, cell_data in enumerate(row_data):
-                cell = t.cell(i, j)
-                cell.text = cell_data
-                p = cell.paragraphs[0]
-                run = p.runs[0]
-                run.font.name = self.regras.FONTE_PADRAO
-                run.font.size = self.regras.TAMANHO_FONTE_LEGENDA
-                run.font.color.rgb = self.regras.COR_FONTE_PADRAO
-                if i == 0:
-                    p.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+        largura_coluna = Emu(self.doc._block_width // num_cols) if num_cols else Emu(0)
+        estilo_cabecalho = self.doc.styles[self.regras.ESTILO_TABELA_CABECALHO].style_id
+        estilo_celula = self.doc.styles[self.regras.ESTILO_TABELA_CELULA].style_id
+        linhas = parse_xml(construir_linhas_tabela_xml(tabela_obj.dados, num_cols, largura_coluna.twips,
+                                                       estilo_cabecalho, estilo_celula))
+        t._tbl.extend(list(linhas))
                     
         if tabela_obj.estilo_borda == 'abnt':
             self.regras.aplicar_estilo_tabela_abnt(t)
@@ -188,14 +736,14 @@ class GeradorDOCX:
 
     def _renderizar_figura(self, figura_obj):
         p_titulo = self.doc.add_paragraph()
-        p_titulo.add_run(f"Figura {figura_obj.numero} – {figura_obj.titulo}")
+        p_titulo.add_run(f"Figura {self._rotulo_numero('F', figura_obj.numero)} – {figura_obj.titulo}")
         self.regras.aplicar_estilo_legenda(p_titulo, is_titulo=True)
         p_titulo.paragraph_format.keep_with_next = True
 
         p_imagem = self.doc.add_paragraph()
         p_imagem.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
         try:
-            p_imagem.add_run().add_picture(figura_obj.caminho_processado, width=Cm(figura_obj.largura_cm))
+            self._inserir_imagem(p_imagem.add_run(), figura_obj.caminho_processado, Cm(figura_obj.largura_cm))
         except Exception as e:
             run_erro = p_imagem.add_run(f"[ERRO: Imagem '{figura_obj.caminho_processado}' não encontrada ou inválida. {e}]")
             run_erro.italic = True
@@ -238,7 +786,7 @@ class GeradorDOCX:
                  raise FileNotFoundError(f"Arquivo de imagem da fórmula não encontrado em '{caminho_imagem_valido}'")
             
             # Usa a LARGURA selecionada pelo usuário, não mais a altura fixa.
-            run.add_picture(caminho_imagem_valido, width=Cm(formula_obj.largura_cm))
+            self._inserir_imagem(run, caminho_imagem_valido, Cm(formula_obj.largura_cm))
 
         except Exception as e:
             erro_msg = f"[ERRO: Imagem da fórmula '{formula_obj.legenda}' não encontrada: {e}]"
@@ -250,12 +798,12 @@ class GeradorDOCX:
         run.add_tab()
 
         # Adiciona o número da equação.
-        run_numero = p_formula.add_run(f"({formula_obj.numero})")
+        run_numero = p_formula.add_run(f"({self._rotulo_numero('E', formula_obj.numero)})")
         self.regras._aplicar_formatacao_run(run_numero)
 
         # Adiciona a legenda ABAIXO do parágrafo da fórmula.
         p_legenda = self.doc.add_paragraph()
-        p_legenda.add_run(f"Equação {formula_obj.numero} – {formula_obj.legenda}")
+        p_legenda.add_run(f"Equação {self._rotulo_numero('E', formula_obj.numero)} – {formula_obj.legenda}")
         self.regras.aplicar_estilo_legenda(p_legenda, is_titulo=True)
         p_legenda.paragraph_format.space_before = Pt(6)
         p_legenda.paragraph_format.space_after = Pt(12)
@@ -349,15 +897,61 @@ class GeradorDOCX:
         texto_kw = self.doc_abnt.palavras_chave.replace(';', '.') + "."
         p_kw.add_run(texto_kw)
 
+    def _marcar_titulo(self, heading, id_ancora):
+        self._proximo_id_marcador += 1
+        id_marcador = self._proximo_id_marcador
+        if self._bases_fragmento is not None:
+            id_marcador = marca_relativa('M', id_marcador - self._bases_fragmento['M'])
+        adicionar_marcador(heading, nome_marcador_sumario(id_ancora), id_marcador)
+
     def _renderizar_sumario(self):
         self.regras.aplicar_estilo_titulo_secao(self.doc, numero="", titulo_texto="SUMÁRIO")
         paragrafo_placeholder = self.doc.add_paragraph()
-        adicionar_sumario(self.doc, paragrafo_placeholder)
+        # Reaproveita a estimativa de paginação da pré-visualização para os números de página.
+        entradas = GeradorHTMLPreview(self.doc_abnt).coletar_entradas_sumario()
+        adicionar_sumario(self.doc, paragrafo_placeholder, entradas)
         self.doc.add_page_break()
 
     def _renderizar_referencias(self):
-        self.regras.aplicar_estilo_titulo_secao(self.doc, numero="", titulo_texto="REFERÊNCIAS")
+        heading = self.regras.aplicar_estilo_titulo_secao(self.doc, numero="", titulo_texto="REFERÊNCIAS")
+        self._marcar_titulo(heading, "secao-referencias")
         self.doc_abnt.ordenar_referencias()
         for ref in self.doc_abnt.referencias:
             p_ref = self.doc.add_paragraph()
-            self.regras.aplicar_estilo_referencia(p_ref, ref.formatar())
\ No newline at end of file
+            self.regras.aplicar_estilo_referencia(p_ref, ref.formatar())
+        self._avancar("Referências")
+
+# --- Renderização paralela dos capítulos ---
+# Cada processo recebe o documento uma única vez (no inicializador do pool) e devolve os capítulos
+# como fragmentos com marcas relativas, que o processo principal insere em ordem.
+
+_gerador_do_processo = None
+
+def _inicializar_processo_renderizacao(doc_abnt: DocumentoABNT, opcoes: dict):
+    global _gerador_do_processo
+    _gerador_do_processo = GeradorDOCX(doc_abnt, **opcoes)
+    # O processo só precisa das dimensões das imagens; o conteúdo é lido pelo processo principal.
+    _gerador_do_processo._imagens_em_disco = True
+
+def _renderizar_fragmento_em_processo(indice: int) -> dict:
+    capitulo = _gerador_do_processo.doc_abnt.estrutura_textual.filhos[indice - 1]
+    return _gerador_do_processo._renderizar_fragmento(capitulo, str(indice))
+
+def renderizar_fragmentos_em_paralelo(doc_abnt: DocumentoABNT, indices: list, opcoes: dict, processos: int,
+                                      ao_concluir=None) -> dict:
+    """
+    Renderiza os capítulos de primeiro nível informados (numerados a partir de 1) em um pool de processos.
+    ao_concluir() é chamado a cada capítulo pronto; se lançar uma exceção, os pendentes são cancelados.
+    """
+    executor = ProcessPoolExecutor(max_workers=min(processos, len(indices)), initializer=_inicializar_processo_renderizacao,
+                                   initargs=(doc_abnt, opcoes))
+    try:
+        futuros = {executor.submit(_renderizar_fragmento_em_processo, i): i for i in indices}
+        fragmentos = {}
+        for futuro in as_completed(futuros):
+            fragmentos[futuros[futuro]] = futuro.result()
+            if ao_concluir is not None:
+                ao_concluir()
+        return fragmentos
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
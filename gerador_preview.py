@@ -2,183 +2,46 @@
 # Descrição: Versão final com suporte para renderização de Fórmulas LaTeX de tamanho variável.
 
 import os
-import re
-import math
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from documento import DocumentoABNT, Capitulo
+from tokenizador_conteudo import tokenizar, TokenParagrafo, TokenElemento
+from motor_layout import MotorLayout, ALTURA_LINHA_TEXTO, LARGURA_TEXTO, ALTURA_CONTEUDO_PAGINA, medir_paragrafos
+from metricas_fonte import contar_linhas, CM_POR_PONTO
+from cache_miniaturas import CacheMiniaturas, nivel_zoom
 
 # --- CONSTANTES DE ESTIMATIVA DE ALTURA (EM CM) ---
-ALTURA_CONTEUDO_PAGINA = 24.7
-ALTURA_LINHA_TEXTO = 0.6
+# A altura útil da página, a da linha de texto e a largura do texto ficam no motor_layout.
 ALTURA_TITULO_SECAO = 1.5
 ALTURA_LEGENDA = 1.2
 ALTURA_LINHA_TABELA = 0.8
+ALTURA_LINHA_EXTRA_TABELA = 10 * 1.5 * CM_POR_PONTO  # cada linha a mais de uma célula (10pt, entrelinha 1,5)
+PADDING_CELULA_TABELA = 0.21  # 4px de cada lado
+ALTURA_LINHA_REFERENCIA = 12 * CM_POR_PONTO  # referências em espaço simples
+ESPACO_APOS_REFERENCIA = 0.3175  # 12px
 ALTURA_FORMULA_ESTIMADA = 4.0 # Estimativa de altura para uma fórmula
-CARACTERES_POR_LINHA = 80
+# Abaixo disso, abrir o pool de processos custa mais do que medir o texto na própria thread.
+MINIMO_CARACTERES_PARALELO = 200_000
+# Cada processo do pool é um interpretador novo ("spawn"); acima disso a partida custa mais do que rende.
+MAXIMO_PROCESSOS_PREVIEW = 4
+# Páginas pré-textuais antes do sumário no trabalho acadêmico: capa, folha de rosto e resumo.
+PAGINAS_ANTES_DO_SUMARIO = 3
 
-class GeradorHTMLPreview:
-    def __init__(self, doc_abnt: DocumentoABNT):
-        self.doc_abnt = doc_abnt
-        self.entradas_sumario = []
-        self.paginas_html = []
-        self.conteudo_pagina_atual = []
-        self.altura_restante = ALTURA_CONTEUDO_PAGINA
-        self.contador_tabelas = 0
-        self.contador_figuras = 0
-        self.contador_formulas = 0
-        self.classe_pagina_atual = 'pagina'
-        self.is_artigo = self.doc_abnt.configuracoes.tipo_trabalho == "Artigo Científico"
-
-    def _estimar_paginacao_e_coletar_sumario(self):
-        self.entradas_sumario = []
-        altura_restante = ALTURA_CONTEUDO_PAGINA
-        pagina_atual = 4
-        
-        def simular_nova_pagina():
-            nonlocal altura_restante, pagina_atual
-            pagina_atual += 1
-            altura_restante = ALTURA_CONTEUDO_PAGINA
-
-        def simular_adicao_bloco(altura_bloco):
-            nonlocal altura_restante
-            altura_necessaria = altura_bloco
-            if altura_bloco == ALTURA_TITULO_SECAO:
-                altura_necessaria += ALTURA_LINHA_TEXTO * 2
-            if altura_restante < altura_necessaria:
-                simular_nova_pagina()
-            altura_restante -= altura_bloco
-
-        def simular_paragrafo_quebravel(texto):
-            nonlocal altura_restante
-            if not texto.strip(): return
-            num_linhas_total = math.ceil(len(texto.strip()) / CARACTERES_POR_LINHA)
-            altura_total_paragrafo = num_linhas_total * ALTURA_LINHA_TEXTO
-            while altura_total_paragrafo > 0:
-                altura_que_cabe = math.floor(altura_restante / ALTURA_LINHA_TEXTO) * ALTURA_LINHA_TEXTO
-                if altura_que_cabe <= 0:
-                    simular_nova_pagina()
-                    continue
-                if altura_total_paragrafo <= altura_que_cabe:
-                    altura_restante -= altura_total_paragrafo
-                    altura_total_paragrafo = 0
-                else:
-                    altura_total_paragrafo -= altura_que_cabe
-                    simular_nova_pagina()
-
-        def coletar_recursivo(no_pai: Capitulo, prefixo_numeracao=""):
-            for i, no_filho in enumerate(no_pai.filhos, 1):
-                numero_completo = f"{prefixo_numeracao}{i}"
-                pagina_prevista = pagina_atual
-                if altura_restante < (ALTURA_TITULO_SECAO + ALTURA_LINHA_TEXTO * 2):
-                    pagina_prevista += 1
-                self.entradas_sumario.append({
-                    "numero": numero_completo, "titulo": no_filho.titulo, "nivel": len(numero_completo.split('.')),
-                    "id_ancora": f"secao-{numero_completo.replace('.', '-')}", "pagina": pagina_prevista
-                })
-                simular_adicao_bloco(ALTURA_TITULO_SECAO)
-                if no_filho.conteudo:
-                    padrao = r"\{\{(Tabela|Figura|Formula):([^}]+)\}\}"
-                    partes = re.split(padrao, no_filho.conteudo)
-                    for k, parte in enumerate(partes):
-                        if k % 3 == 0:
-                            if parte.strip():
-                                paragrafos = parte.strip().split('\n')
-                                for paragrafo_texto in paragrafos:
-                                    if paragrafo_texto.strip():
-                                        simular_paragrafo_quebravel(paragrafo_texto)
-                        elif k % 3 == 1:
-                            tipo, titulo = parte, partes[k+1]
-                            if tipo == "Tabela":
-                                obj = next((t for t in self.doc_abnt.banco_tabelas if t.titulo == titulo), None)
-                                if obj and obj.dados: simular_adicao_bloco((len(obj.dados) * ALTURA_LINHA_TABELA) + (ALTURA_LEGENDA * 2))
-                            elif tipo == "Figura":
-                                obj = next((f for f in self.doc_abnt.banco_figuras if f.titulo == titulo), None)
-                                if obj: simular_adicao_bloco((obj.largura_cm / 16 * 9) + (ALTURA_LEGENDA * 2))
-                            elif tipo == "Formula":
-                                simular_adicao_bloco(ALTURA_FORMULA_ESTIMADA + ALTURA_LEGENDA)
-                coletar_recursivo(no_filho, f"{numero_completo}.")
-        
-        coletar_recursivo(self.doc_abnt.estrutura_textual)
-
-        simular_nova_pagina()
-        self.entradas_sumario.append({
-            "numero": "", "titulo": "REFERÊNCIAS", "nivel": 1,
-            "id_ancora": "secao-referencias", "pagina": pagina_atual
-        })
-
-    def _nova_pagina(self):
-        if self.conteudo_pagina_atual:
-            classe_real = self.conteudo_pagina_atual.pop(0)
-            self.paginas_html.append(f'<div class="{classe_real}">{"".join(self.conteudo_pagina_atual)}</div>')
-        self.conteudo_pagina_atual = [self.classe_pagina_atual]
-        self.altura_restante = ALTURA_CONTEUDO_PAGINA
-
-    def _adicionar_elemento_bloco(self, html, altura):
-        self.classe_pagina_atual = 'pagina'
-        if not self.conteudo_pagina_atual: self.conteudo_pagina_atual.append(self.classe_pagina_atual)
-        altura_necessaria = altura
-        if html.startswith("<h1"): altura_necessaria += ALTURA_LINHA_TEXTO * 2
-        if self.altura_restante < altura_necessaria: self._nova_pagina()
-        self.conteudo_pagina_atual.append(html)
-        self.altura_restante -= altura
-
-    def _adicionar_paragrafo_quebravel(self, texto_paragrafo):
-        self.classe_pagina_atual = 'pagina'
-        if not self.conteudo_pagina_atual: self.conteudo_pagina_atual.append(self.classe_pagina_atual)
-        texto_restante = texto_paragrafo.strip()
-        is_continuacao = False
-        while texto_restante:
-            base_class = "corpo-texto" if not is_continuacao else "paragrafo-continuado"
-            linhas_que_cabem = math.floor(self.altura_restante / ALTURA_LINHA_TEXTO)
-            if linhas_que_cabem <= 0:
-                self._nova_pagina()
-                continue
-            caracteres_que_cabem = linhas_que_cabem * CARACTERES_POR_LINHA
-            if len(texto_restante) <= caracteres_que_cabem:
-                self.conteudo_pagina_atual.append(f'<p class="{base_class}">{texto_restante}</p>')
-                altura_consumida = math.ceil(len(texto_restante) / CARACTERES_POR_LINHA) * ALTURA_LINHA_TEXTO
-                self.altura_restante -= altura_consumida
-                texto_restante = ""
-            else:
-                ponto_quebra = texto_restante.rfind(' ', 0, caracteres_que_cabem)
-                if ponto_quebra == -1 or ponto_quebra < caracteres_que_cabem * 0.8:
-                    ponto_quebra = caracteres_que_cabem
-                texto_para_pagina_atual = texto_restante[:ponto_quebra]
-                texto_restante = texto_restante[ponto_quebra:].lstrip()
-                classe_final = f"{base_class} paragrafo-quebrado"
-                self.conteudo_pagina_atual.append(f'<p class="{classe_final}">{texto_para_pagina_atual}</p>')
-                self.altura_restante -= math.ceil(len(texto_para_pagina_atual)/CARACTERES_POR_LINHA) * ALTURA_LINHA_TEXTO
-                self._nova_pagina()
-                is_continuacao = True
-
-    def _renderizar_cabecalho_artigo_html(self):
-        autores_html = ", ".join([a.nome_completo for a in self.doc_abnt.autores])
-        self._adicionar_elemento_bloco(f'<p style="text-align: center;"><strong>{self.doc_abnt.titulo.upper()}</strong></p><br>', ALTURA_LINHA_TEXTO * 2)
-        self._adicionar_elemento_bloco(f'<p style="text-align: center;">{autores_html}</p><br>', ALTURA_LINHA_TEXTO * 2)
-        self._adicionar_elemento_bloco(f'<p><strong>Resumo</strong></p>', ALTURA_LINHA_TEXTO)
-        self._adicionar_paragrafo_quebravel(self.doc_abnt.resumo)
-        self._adicionar_elemento_bloco(f'<br><p><strong>Palavras-chave:</strong> {self.doc_abnt.palavras_chave.replace(";", ".")}.</p>', ALTURA_LINHA_TEXTO * 2)
-
-    def gerar_html(self) -> str:
-        self.paginas_html = []
-        self.conteudo_pagina_atual = []
-        self.altura_restante = ALTURA_CONTEUDO_PAGINA
-        self.classe_pagina_atual = 'pagina'
-        
-        cfg = self.doc_abnt.configuracoes
-        
-        html_style = """
+# Folha de estilo da pré-visualização (usada no HTML completo e na página base do transporte_preview).
+ESTILO_PREVIEW = """
         <style>
             html { scroll-behavior: smooth; }
-            body { font-family: 'Times New Roman', Times, serif; font-size: 12pt; background-color: #E0E0E0; counter-reset: page; }
+            body { font-family: 'Times New Roman', Times, serif; font-size: 12pt; background-color: #E0E0E0; }
             .pagina {
                 width: 21cm; height: 29.7cm; padding: 3cm 2cm 2cm 3cm;
                 margin: 20px auto; background-color: white;
                 box-shadow: 0 0 10px rgba(0,0,0,0.2); box-sizing: border-box;
                 position: relative; overflow: hidden; line-height: 1.5;
             }
-            .pagina:not(.pre-textual) { counter-increment: page; }
-            .pagina:not(.pre-textual)::after {
-                content: counter(page); position: absolute;
+            .pagina[data-numero]::after {
+                content: attr(data-numero); position: absolute;
                 top: 1.5cm; right: 2cm; font-size: 12pt;
             }
             h1 { font-size: 12pt; font-weight: bold; text-transform: uppercase; margin-top: 1em; margin-bottom: 1em; }
@@ -194,6 +57,7 @@ class GeradorHTMLPreview:
             .referencia { text-align: justify; line-height: 1.0; margin-bottom: 12px; }
             .legenda { font-size: 10pt; text-align: center; text-indent: 0; margin-bottom: 0.5em; }
             .fonte { font-size: 10pt; text-align: left; text-indent: 0; margin-top: 2px; }
+            .indicacao-tabela { font-size: 10pt; text-align: right; text-indent: 0; margin-top: -0.5em; }
             .formula-container { text-align: center; margin: 1em 0; }
             .formula-legenda { font-size: 10pt; text-align: center; text-indent: 0; margin-top: 0.5em; }
             table { border-collapse: collapse; width: 100%; margin: 1em 0; font-size: 10pt; }
@@ -203,6 +67,7 @@ class GeradorHTMLPreview:
             table.abnt tbody tr:last-of-type { border-bottom: 1px solid black; }
             img { display: block; margin: 1em auto; max-width: 100%; height: auto; }
             .posicao-final-pagina { position: absolute; bottom: 2cm; width: 16cm; left: 3cm; text-align: center; }
+            .imagem-rascunho { margin: 1em auto; max-width: 100%; background-color: #F0F0F0; border: 1px dashed #A0A0A0; box-sizing: border-box; }
             .sumario-item { display: flex; justify-content: space-between; text-indent: 0; }
             .sumario-item a { text-decoration: none; color: black; display: flex; width: 100%; }
             .sumario-item a:hover { text-decoration: underline; }
@@ -212,80 +77,360 @@ class GeradorHTMLPreview:
             .sumario-nivel-2 { margin-left: 2em; } .sumario-nivel-3 { margin-left: 4em; }
         </style>
         """
-        
+
+def _percorrer(no: Capitulo):
+    """A seção e todas as subseções, na ordem do documento."""
+    yield no
+    for filho in no.filhos:
+        yield from _percorrer(filho)
+
+@dataclass(frozen=True)
+class TrechoCapitulo:
+    """Onde um capítulo de primeiro nível ficou no modelo de páginas do texto e o estado em que começou."""
+    pagina_inicio: int
+    bloco_inicio: int
+    altura_inicio: float
+    contadores_inicio: tuple
+    pagina_fim: int
+    bloco_fim: int
+
+@dataclass(frozen=True)
+class ResultadoPreview:
+    """Resultado de uma paginação completa; serve de base para os rascunhos até a próxima."""
+    paginas_html: list
+    paginas_texto: list  # Pagina do motor_layout
+    indice_primeira_pagina_texto: int  # posição, em paginas_html, da primeira página do texto
+    primeira_pagina_texto: int  # número dessa página
+    capitulos: dict  # número do capítulo de primeiro nível -> TrechoCapitulo
+
+class GeradorHTMLPreview:
+    def __init__(self, doc_abnt: DocumentoABNT, zoom: float = None, recursos=None, rascunho: bool = False,
+                 processos: int = 1):
+        self.doc_abnt = doc_abnt
+        # Com mais de um processo, os parágrafos dos capítulos a paginar são medidos em paralelo.
+        self.processos = max(1, processos or os.cpu_count() or 1)
+        self._executor = None
+        self._medidas = {}
+        # No rascunho as imagens são substituídas por quadros do mesmo tamanho (sem ler arquivos).
+        self.rascunho = rascunho
+        self.resultado = None
+        self._trechos_capitulos = {}
+        # Com zoom, figuras e fórmulas em bitmap apontam para miniaturas no tamanho exibido; sem zoom
+        # (ex: HTML exportado), para as imagens processadas em resolução total.
+        self.zoom = zoom
+        # Com um RepositorioRecursos, as imagens são referenciadas por URLs abnf:// em vez de file:///.
+        self.recursos = recursos
+        self.cache_miniaturas = CacheMiniaturas() if zoom is not None else None
+        # Imagens (miniaturas ou originais) referenciadas pelas páginas da execução atual, inclusive
+        # as das seções repetidas; a limpeza do cache de miniaturas não pode apagá-las.
+        self._imagens_execucao = []
+        self.entradas_sumario = []
+        self.motor = MotorLayout()
+        self.contador_tabelas = 0
+        self.contador_figuras = 0
+        self.contador_formulas = 0
+        self.is_artigo = self.doc_abnt.configuracoes.tipo_trabalho == "Artigo Científico"
+        # Paginação incremental: o trecho de fluxo de cada seção fica guardado entre uma execução e
+        # outra, indexado pela impressão digital da seção e pelo estado em que ela começou (altura
+        # restante na página e contadores). Uma seção inalterada que começa no mesmo ponto da página é
+        # apenas repetida; por isso, mantendo a mesma instância, editar o capítulo 12 não pagina de novo
+        # os capítulos 1 a 11, e a paginação volta a ser reaproveitada assim que as quebras convergirem.
+        self._impressoes = {}
+        self._layout_anterior, self._layout_atual = {}, {}
+        self.secoes_reaproveitadas = 0
+        self.secoes_refeitas = 0
+
+    def definir_zoom(self, zoom: float):
+        """Atualiza o zoom da visualização; mudar de nível de miniatura descarta a paginação reaproveitável."""
+        if self.zoom is not None and zoom is not None and nivel_zoom(zoom) == nivel_zoom(self.zoom):
+            self.zoom = zoom
+            return
+        self.zoom = zoom
+        if zoom is not None and self.cache_miniaturas is None:
+            self.cache_miniaturas = CacheMiniaturas()
+        self._layout_anterior = {}
+
+    def _url_imagem(self, caminho: str, largura_cm: float) -> str:
+        if self.zoom is not None:
+            caminho = self.cache_miniaturas.obter(caminho, largura_cm, self.zoom)
+        self._imagens_execucao.append(caminho)
+        if self.recursos is not None:
+            url = self.recursos.registrar_arquivo(caminho)
+            if url is not None:
+                return url
+        caminho_abs = os.path.abspath(caminho)
+        return f"file:///{caminho_abs.replace(os.path.sep, '/')}"
+
+    def _dados_elemento(self, token: TokenElemento):
+        """O que do elemento referenciado influencia a pré-visualização (sem o número, que depende da posição)."""
+        if token.tipo == "Tabela":
+            obj = self.doc_abnt.buscar_tabela(token.titulo)
+        elif token.tipo == "Figura":
+            obj = self.doc_abnt.buscar_figura(token.titulo)
+        elif token.tipo == "Formula":
+            obj = self.doc_abnt.buscar_formula(token.titulo)
+        else:
+            return None
+        if obj is None:
+            return None
+        dados = {k: v for k, v in vars(obj).items() if k != 'numero'}
+        if token.tipo in ("Figura", "Formula"):
+            # A URL da imagem depende do conteúdo do arquivo: trocar o arquivo refaz a seção.
+            caminho = obj.caminho_processado if token.tipo == "Figura" else (obj.caminho_svg or obj.caminho_processado_png)
+            try:
+                estado = os.stat(caminho)
+                dados['arquivo'] = (estado.st_mtime_ns, estado.st_size)
+            except (OSError, TypeError):
+                dados['arquivo'] = None
+            if token.tipo == "Formula":
+                dados['existe'] = dados['arquivo'] is not None
+        return dados
+
+    def _calcular_impressao(self, no: Capitulo) -> str:
+        h = hashlib.sha1()
+        h.update(no.titulo.encode('utf-8') + b'\0' + no.conteudo.encode('utf-8') + b'\0')
+        for token in tokenizar(no.conteudo):
+            if isinstance(token, TokenElemento):
+                h.update(repr((token.tipo, token.titulo, self._dados_elemento(token))).encode('utf-8'))
+        for filho in no.filhos:
+            h.update(self._calcular_impressao(filho).encode('ascii'))
+        impressao = h.hexdigest()
+        self._impressoes[id(no)] = impressao
+        return impressao
+
+    def _atualizar_impressoes(self):
+        """Calcula a impressão digital de cada seção (inclui as subseções e os elementos referenciados)."""
+        self._impressoes = {}
+        self.secoes_reaproveitadas = 0
+        self.secoes_refeitas = 0
+        self._calcular_impressao(self.doc_abnt.estrutura_textual)
+
+    def _coletar_entradas(self, no_pai: Capitulo, prefixo_numeracao=""):
+        """Entradas do sumário na ordem do documento, ainda sem o número da página."""
+        for i, no_filho in enumerate(no_pai.filhos, 1):
+            numero_completo = f"{prefixo_numeracao}{i}"
+            self.entradas_sumario.append({
+                "numero": numero_completo, "titulo": no_filho.titulo, "nivel": len(numero_completo.split('.')),
+                "id_ancora": f"secao-{numero_completo.replace('.', '-')}"
+            })
+            self._coletar_entradas(no_filho, f"{numero_completo}.")
+
+    def coletar_entradas_sumario(self) -> list:
+        """Retorna as entradas do sumário (número, título, nível, âncora e página)."""
+        self.gerar_paginas()
+        return self.entradas_sumario
+
+    def _adicionar_elemento_bloco(self, html, altura, ancora=None):
+        self.motor.adicionar_bloco(html, altura, titulo=html.startswith("<h1"), ancora=ancora)
+
+    def _adicionar_paragrafo_quebravel(self, texto_paragrafo):
+        self.motor.adicionar_paragrafo(texto_paragrafo, self._medidas.get(texto_paragrafo.strip()))
+
+    def _renderizar_cabecalho_artigo_html(self):
+        autores_html = ", ".join([a.nome_completo for a in self.doc_abnt.autores])
+        self._adicionar_elemento_bloco(f'<p style="text-align: center;"><strong>{self.doc_abnt.titulo.upper()}</strong></p><br>', ALTURA_LINHA_TEXTO * 2)
+        self._adicionar_elemento_bloco(f'<p style="text-align: center;">{autores_html}</p><br>', ALTURA_LINHA_TEXTO * 2)
+        self._adicionar_elemento_bloco(f'<p><strong>Resumo</strong></p>', ALTURA_LINHA_TEXTO)
+        self._adicionar_paragrafo_quebravel(self.doc_abnt.resumo)
+        self._adicionar_elemento_bloco(f'<br><p><strong>Palavras-chave:</strong> {self.doc_abnt.palavras_chave.replace(";", ".")}.</p>', ALTURA_LINHA_TEXTO * 2)
+
+    def gerar_html(self) -> str:
+        paginas = self.gerar_paginas()
+        return f"<!DOCTYPE html><html><head><meta charset='UTF-8'>{ESTILO_PREVIEW}</head><body>{''.join(paginas)}</body></html>"
+
+    def gerar_paginas(self) -> list:
+        """
+        Pagina o documento em uma única passada e retorna o HTML de cada página, na ordem. As páginas
+        do sumário são montadas depois, a partir das âncoras do modelo de páginas; a quantidade de
+        páginas do próprio sumário só desloca a numeração do texto.
+        """
+        self.motor = MotorLayout()
+        self.contador_tabelas = 0
+        self.contador_figuras = 0
+        self.contador_formulas = 0
+        self.is_artigo = self.doc_abnt.configuracoes.tipo_trabalho == "Artigo Científico"
+        self._atualizar_impressoes()
+        self._medir_capitulos_em_paralelo()
+        self.entradas_sumario = []
+        self._coletar_entradas(self.doc_abnt.estrutura_textual)
+        self.entradas_sumario.append({"numero": "", "titulo": "REFERÊNCIAS", "nivel": 1, "id_ancora": "secao-referencias"})
+
         if self.is_artigo:
-            self.classe_pagina_atual = 'pagina'
-            self.conteudo_pagina_atual = [self.classe_pagina_atual]
             self._renderizar_cabecalho_artigo_html()
-        else:
-            self._estimar_paginacao_e_coletar_sumario()
-            autores_capa_html = "<br>".join([a.nome_completo.upper() for a in self.doc_abnt.autores])
-            self.paginas_html.append(f'<div class="pagina capa pre-textual">{self._renderizar_capa_html(cfg, autores_capa_html)}</div>')
-            self.paginas_html.append(f'<div class="pagina folha-rosto pre-textual">{self._renderizar_folha_rosto_html(cfg, autores_capa_html)}</div>')
-            self.paginas_html.append(f'<div class="pagina resumo-page pre-textual">{self._renderizar_resumo_html()}</div>')
-            if self.entradas_sumario:
-                self.paginas_html.append(f'<div class="pagina sumario-page pre-textual">{self._renderizar_sumario_html()}</div>')
-            self.classe_pagina_atual = 'pagina'
-            self.conteudo_pagina_atual = [self.classe_pagina_atual]
-            self.altura_restante = ALTURA_CONTEUDO_PAGINA
 
+        self._layout_atual = {}
+        self._imagens_execucao = []
+        self._trechos_capitulos = {}
         self._renderizar_secoes_recursivamente_html(self.doc_abnt.estrutura_textual)
-        self._nova_pagina()
+        self._layout_anterior, self._layout_atual = self._layout_atual, {}
+        self.motor.quebrar_pagina()
         
-        self._adicionar_elemento_bloco("<h1 id='secao-referencias'>REFERÊNCIAS</h1>", ALTURA_TITULO_SECAO)
+        self._adicionar_elemento_bloco("<h1 id='secao-referencias'>REFERÊNCIAS</h1>", ALTURA_TITULO_SECAO,
+                                       ancora="secao-referencias")
         self.doc_abnt.ordenar_referencias()
         for ref in self.doc_abnt.referencias:
             ref_html = f'<p class="referencia">{ref.formatar().replace("**", "<strong>").replace("</strong>", "</strong>")}</p>'
-            altura_ref = (len(ref.formatar()) / 100 + 1) * (ALTURA_LINHA_TEXTO * 0.8)
+            linhas_ref = max(contar_linhas(ref.formatar().replace("**", ""), LARGURA_TEXTO), 1)
+            altura_ref = linhas_ref * ALTURA_LINHA_REFERENCIA + ESPACO_APOS_REFERENCIA
             self._adicionar_elemento_bloco(ref_html, altura_ref)
-        self._nova_pagina()
+        paginas_texto = self.motor.finalizar()
+        if self.cache_miniaturas is not None and self.cache_miniaturas.geradas:
+            self.cache_miniaturas.limpar(em_uso=set(self._imagens_execucao))
+
+        # Numeração física, como no .docx: a capa é a página 1. O texto começa depois da capa, da
+        # folha de rosto, do resumo e das páginas do sumário (no artigo, na página 1).
+        paginas_pre_textuais = []
+        if not self.is_artigo:
+            cfg = self.doc_abnt.configuracoes
+            autores_capa_html = "<br>".join([a.nome_completo.upper() for a in self.doc_abnt.autores])
+            paginas_pre_textuais.append(f'<div class="pagina capa pre-textual">{self._renderizar_capa_html(cfg, autores_capa_html)}</div>')
+            paginas_pre_textuais.append(f'<div class="pagina folha-rosto pre-textual">{self._renderizar_folha_rosto_html(cfg, autores_capa_html)}</div>')
+            paginas_pre_textuais.append(f'<div class="pagina resumo-page pre-textual">{self._renderizar_resumo_html()}</div>')
+            paginas_sumario = self._paginar_sumario()
+            primeira_pagina_texto = PAGINAS_ANTES_DO_SUMARIO + len(paginas_sumario) + 1
+        else:
+            paginas_sumario = []
+            primeira_pagina_texto = 1
+
+        pagina_da_ancora = MotorLayout.indice_ancoras(paginas_texto)
+        for entrada in self.entradas_sumario:
+            entrada["pagina"] = primeira_pagina_texto + pagina_da_ancora.get(entrada["id_ancora"], 0)
+        paginas_pre_textuais.extend(self._renderizar_pagina_sumario(pagina) for pagina in paginas_sumario)
 
-        return f"<!DOCTYPE html><html><head><meta charset='UTF-8'>{html_style}</head><body>{''.join(self.paginas_html)}</body></html>"
+        paginas_html = paginas_pre_textuais + [pagina.html(primeira_pagina_texto + i) for i, pagina in enumerate(paginas_texto)]
+        self.resultado = ResultadoPreview(paginas_html, paginas_texto, len(paginas_pre_textuais),
+                                          primeira_pagina_texto, self._trechos_capitulos)
+        return paginas_html
+
+    def _medir_capitulos_em_paralelo(self):
+        """
+        Mede (quebra em linhas) os parágrafos dos capítulos de primeiro nível que não devem ser
+        reaproveitados, um capítulo por tarefa, no pool de processos. A medição não depende do ponto da
+        página em que o capítulo começa; a passada sequencial do motor depois só distribui as linhas.
+        """
+        self._medidas = {}
+        if self.processos == 1:
+            return
+        reaproveitaveis = {chave[0] for chave in self._layout_anterior}
+        lotes = []
+        for capitulo in self.doc_abnt.estrutura_textual.filhos:
+            if self._impressoes[id(capitulo)] in reaproveitaveis:
+                continue
+            lotes.append([token.texto.strip() for no in _percorrer(capitulo) for token in tokenizar(no.conteudo)
+                          if isinstance(token, TokenParagrafo)])
+        if len(lotes) < 2 or sum(len(texto) for lote in lotes for texto in lote) < MINIMO_CARACTERES_PARALELO:
+            return
+        if self._executor is None:
+            # "spawn" também no Linux: o pool é aberto de dentro da interface (QThread, com as threads
+            # do Qt/Chromium já rodando), e um fork desse processo pode travar os filhos.
+            self._executor = ProcessPoolExecutor(max_workers=self.processos,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        for lote, medidas in zip(lotes, self._executor.map(medir_paragrafos, lotes)):
+            self._medidas.update(zip(lote, medidas))
+
+    def encerrar(self):
+        """Encerra o pool de processos da medição paralela, se tiver sido aberto."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def gerar_rascunho(self, base: ResultadoPreview, numero_capitulo: int) -> list | None:
+        """
+        Rascunho rápido: pagina de novo só o capítulo de primeiro nível informado, a partir do ponto em
+        que ele começava na última paginação completa (base), e encaixa as páginas dele no lugar das
+        antigas. O sumário, a numeração das páginas seguintes e as imagens ficam para a paginação
+        completa. Retorna None quando o capítulo não existe na base.
+        """
+        trecho = base.capitulos.get(str(numero_capitulo))
+        capitulos = self.doc_abnt.estrutura_textual.filhos
+        if trecho is None or not 1 <= numero_capitulo <= len(capitulos):
+            return None
+        no = capitulos[numero_capitulo - 1]
+        self.motor = MotorLayout()
+        self.motor.pagina_atual.blocos = base.paginas_texto[trecho.pagina_inicio].blocos[:trecho.bloco_inicio]
+        self.motor.altura_restante = trecho.altura_inicio
+        self.contador_tabelas, self.contador_figuras, self.contador_formulas = trecho.contadores_inicio
+        self.is_artigo = self.doc_abnt.configuracoes.tipo_trabalho == "Artigo Científico"
+        self._impressoes = {}
+        self._calcular_impressao(no)
+        self._layout_anterior, self._layout_atual = {}, {}
+        self._renderizar_secao_html(no, str(numero_capitulo))
+        # O que vinha depois do capítulo na última página dele é mantido, sem nova paginação.
+        for bloco in base.paginas_texto[trecho.pagina_fim].blocos[trecho.bloco_fim:]:
+            self.motor.emitir(bloco)
+        novas = self.motor.finalizar()
+
+        inicio = base.indice_primeira_pagina_texto + trecho.pagina_inicio
+        fim = base.indice_primeira_pagina_texto + trecho.pagina_fim + 1
+        numero_inicio = base.primeira_pagina_texto + trecho.pagina_inicio
+        return (base.paginas_html[:inicio] + [pagina.html(numero_inicio + i) for i, pagina in enumerate(novas)]
+                + base.paginas_html[fim:])
 
     def _renderizar_secoes_recursivamente_html(self, no_pai: Capitulo, prefixo_numeracao=""):
         for i, no_filho in enumerate(no_pai.filhos, 1):
-            numero_completo = f"{prefixo_numeracao}{i}"
-            nivel = len(numero_completo.split('.'))
-            
-            if self.is_artigo:
-                titulo_texto = f"{numero_completo} {no_filho.titulo}"
-            else:
-                titulo_texto = f"{numero_completo} {no_filho.titulo.upper() if nivel == 1 else no_filho.titulo}"
-            
-            id_ancora = f"secao-{numero_completo.replace('.', '-')}"
-            self._adicionar_elemento_bloco(f"<h1 id='{id_ancora}'>{titulo_texto}</h1>", ALTURA_TITULO_SECAO)
-
-            if no_filho.conteudo:
-                padrao = r"\{\{(Tabela|Figura|Formula):([^}]+)\}\}"
-                partes = re.split(padrao, no_filho.conteudo)
-                for k, parte in enumerate(partes):
-                    if k % 3 == 0:
-                        if parte.strip():
-                            paragrafos = parte.strip().split('\n')
-                            for paragrafo_texto in paragrafos:
-                                if paragrafo_texto.strip():
-                                    self._adicionar_paragrafo_quebravel(paragrafo_texto)
-                    elif k % 3 == 1:
-                        tipo, titulo = parte, partes[k+1]
-                        if tipo == "Tabela":
-                            obj = next((t for t in self.doc_abnt.banco_tabelas if t.titulo == titulo), None)
-                            if obj:
-                                self.contador_tabelas += 1; obj.numero = self.contador_tabelas
-                                altura = (len(obj.dados) * ALTURA_LINHA_TABELA) + (ALTURA_LEGENDA * 2) if obj.dados else (ALTURA_LEGENDA * 2)
-                                self._adicionar_elemento_bloco(self._renderizar_tabela_html(obj), altura)
-                        elif tipo == "Figura":
-                            obj = next((f for f in self.doc_abnt.banco_figuras if f.titulo == titulo), None)
-                            if obj:
-                                self.contador_figuras += 1; obj.numero = self.contador_figuras
-                                altura = (obj.largura_cm / 16 * 9) + (ALTURA_LEGENDA * 2)
-                                self._adicionar_elemento_bloco(self._renderizar_figura_html(obj), altura)
-                        elif tipo == "Formula":
-                            obj = next((f for f in self.doc_abnt.banco_formulas if f.legenda == titulo), None)
-                            if obj:
-                                self.contador_formulas += 1; obj.numero = self.contador_formulas
-                                self._adicionar_elemento_bloco(self._renderizar_formula_html(obj), ALTURA_FORMULA_ESTIMADA + ALTURA_LEGENDA)
-            
-            self._renderizar_secoes_recursivamente_html(no_filho, f"{numero_completo}.")
+            if prefixo_numeracao:
+                self._renderizar_secao_html(no_filho, f"{prefixo_numeracao}{i}")
+                continue
+            # Capítulos de primeiro nível: guarda onde cada um ficou, para os rascunhos.
+            motor = self.motor
+            pagina_inicio, bloco_inicio = len(motor.paginas), len(motor.pagina_atual.blocos)
+            altura_inicio = motor.altura_restante
+            contadores_inicio = (self.contador_tabelas, self.contador_figuras, self.contador_formulas)
+            self._renderizar_secao_html(no_filho, str(i))
+            self._trechos_capitulos[str(i)] = TrechoCapitulo(pagina_inicio, bloco_inicio, altura_inicio, contadores_inicio,
+                                                             len(motor.paginas), len(motor.pagina_atual.blocos))
+
+    def _renderizar_secao_html(self, no: Capitulo, numero_completo: str):
+        contadores = (self.contador_tabelas, self.contador_figuras, self.contador_formulas)
+        chave = (self._impressoes[id(no)], numero_completo, self.is_artigo, self.motor.altura_restante, contadores)
+        layout = self._layout_anterior.get(chave)
+        if layout is not None:
+            # Seção inalterada começando no mesmo ponto da página: repete o fluxo registrado.
+            fluxo, altura_final, contadores_finais, imagens = layout
+            self.motor.repetir(fluxo)
+            self.motor.altura_restante = altura_final
+            self._imagens_execucao.extend(imagens)
+            self.contador_tabelas, self.contador_figuras, self.contador_formulas = contadores_finais
+            self._layout_atual[chave] = layout
+            self.secoes_reaproveitadas += 1
+            return
+
+        inicio = len(self.motor.fluxo)
+        inicio_imagens = len(self._imagens_execucao)
+        nivel = len(numero_completo.split('.'))
+        if self.is_artigo:
+            titulo_texto = f"{numero_completo} {no.titulo}"
+        else:
+            titulo_texto = f"{numero_completo} {no.titulo.upper() if nivel == 1 else no.titulo}"
+        
+        id_ancora = f"secao-{numero_completo.replace('.', '-')}"
+        self._adicionar_elemento_bloco(f"<h1 id='{id_ancora}'>{titulo_texto}</h1>", ALTURA_TITULO_SECAO, ancora=id_ancora)
+
+        for token in tokenizar(no.conteudo):
+            if isinstance(token, TokenParagrafo):
+                self._adicionar_paragrafo_quebravel(token.texto)
+            elif token.tipo == "Tabela":
+                obj = self.doc_abnt.buscar_tabela(token.titulo)
+                if obj:
+                    self.contador_tabelas += 1; obj.numero = self.contador_tabelas
+                    self._adicionar_tabela(obj)
+            elif token.tipo == "Figura":
+                obj = self.doc_abnt.buscar_figura(token.titulo)
+                if obj:
+                    self.contador_figuras += 1; obj.numero = self.contador_figuras
+                    altura = (obj.largura_cm / 16 * 9) + (ALTURA_LEGENDA * 2)
+                    self._adicionar_elemento_bloco(self._renderizar_figura_html(obj), altura)
+            elif token.tipo == "Formula":
+                obj = self.doc_abnt.buscar_formula(token.titulo)
+                if obj:
+                    self.contador_formulas += 1; obj.numero = self.contador_formulas
+                    self._adicionar_elemento_bloco(self._renderizar_formula_html(obj), ALTURA_FORMULA_ESTIMADA + ALTURA_LEGENDA)
+        
+        self._renderizar_secoes_recursivamente_html(no, f"{numero_completo}.")
+        self._layout_atual[chave] = (self.motor.fluxo[inicio:], self.motor.altura_restante,
+                                     (self.contador_tabelas, self.contador_figuras, self.contador_formulas),
+                                     self._imagens_execucao[inicio_imagens:])
+        self.secoes_refeitas += 1
     
     def _renderizar_capa_html(self, cfg, autores_html):
         return f"""<div class="capa"><p><strong>{cfg.instituicao.upper()}</strong></p><br><br><br><p><strong>{autores_html}</strong></p><br><br><br><br><p><strong>{self.doc_abnt.titulo.upper()}</strong></p><div class="posicao-final-pagina"><p>{cfg.cidade.upper()}</p><p>{cfg.ano}</p></div></div>"""
@@ -296,54 +441,127 @@ class GeradorHTMLPreview:
     def _renderizar_resumo_html(self):
         return f"""<h1>RESUMO</h1><p class="resumo-paragrafo">{self.doc_abnt.resumo}</p><p><br></p><p class="resumo-titulo-palavras-chave">Palavras-chave: <span style="font-weight: normal;">{self.doc_abnt.palavras_chave.replace(';', '.')}.</span></p>"""
 
-    def _renderizar_sumario_html(self):
-        html = "<h1>SUMÁRIO</h1>"
+    def _paginar_sumario(self) -> list:
+        """Distribui as entradas do sumário pelas páginas; os números de página são preenchidos depois."""
+        motor = MotorLayout('pagina sumario-page pre-textual')
+        motor.adicionar_bloco("<h1>SUMÁRIO</h1>", ALTURA_TITULO_SECAO, titulo=True)
         for entrada in self.entradas_sumario:
-            is_referencias = not entrada["numero"]
-            titulo_sumario = entrada["titulo"].upper()
-            
-            if is_referencias:
-                html += f"""<p class="sumario-item sumario-nivel-1"><a href="#{entrada['id_ancora']}"><span class="sumario-titulo">{titulo_sumario}</span><span class="sumario-dots"></span><span class="sumario-pagina">{entrada['pagina']}</span></a></p>"""
+            motor.adicionar_bloco(entrada, ALTURA_LINHA_TEXTO)
+        return motor.finalizar()
+
+    def _renderizar_pagina_sumario(self, pagina) -> str:
+        html = "".join(bloco if isinstance(bloco, str) else self._renderizar_entrada_sumario(bloco) for bloco in pagina.blocos)
+        return f'<div class="{pagina.classe}">{html}</div>'
+
+    def _renderizar_entrada_sumario(self, entrada) -> str:
+        is_referencias = not entrada["numero"]
+        titulo_sumario = entrada["titulo"].upper()
+        
+        if is_referencias:
+            return f"""<p class="sumario-item sumario-nivel-1"><a href="#{entrada['id_ancora']}"><span class="sumario-titulo">{titulo_sumario}</span><span class="sumario-dots"></span><span class="sumario-pagina">{entrada['pagina']}</span></a></p>"""
+        titulo = entrada["titulo"].upper() if entrada["nivel"] == 1 else entrada["titulo"]
+        return f"""<p class="sumario-item sumario-nivel-{entrada['nivel']}"><a href="#{entrada['id_ancora']}"><span class="sumario-titulo">{entrada['numero']} {titulo}</span><span class="sumario-dots"></span><span class="sumario-pagina">{entrada['pagina']}</span></a></p>"""
+
+    def _alturas_linhas_tabela(self, tabela) -> list:
+        """Cada linha da tabela tem a altura da célula que mais quebra (10pt, colunas de largura igual)."""
+        num_colunas = max((len(linha) for linha in tabela.dados), default=0) or 1
+        largura_celula = LARGURA_TEXTO / num_colunas - PADDING_CELULA_TABELA
+        alturas = []
+        for linha in tabela.dados:
+            linhas_celula = max((contar_linhas(str(celula), largura_celula, 10) for celula in linha), default=1)
+            alturas.append(ALTURA_LINHA_TABELA + max(linhas_celula - 1, 0) * ALTURA_LINHA_EXTRA_TABELA)
+        return alturas
+
+    def _adicionar_tabela(self, tabela):
+        """
+        Tabela que cabe em uma página é um bloco só. As maiores são divididas entre linhas, repetindo
+        o título e o cabeçalho em cada parte, com as indicações "continua", "continuação" e "conclusão".
+        """
+        alturas = self._alturas_linhas_tabela(tabela)
+        # Título, linhas e, se houver, a fonte: a tabela só é dividida se não couber nem em uma página inteira.
+        altura_inteira = ALTURA_LEGENDA + sum(alturas) + (ALTURA_LEGENDA if tabela.fonte else 0)
+        if altura_inteira <= ALTURA_CONTEUDO_PAGINA or len(alturas) < 2:
+            self._adicionar_elemento_bloco(self._renderizar_tabela_html(tabela), sum(alturas) + ALTURA_LEGENDA * 2)
+            return
+        motor = self.motor
+        altura_cabecalho = alturas[0]
+        inicio, fim_dados = 1, len(tabela.dados)
+        while inicio < fim_dados:
+            # Cada parte precisa de título, cabeçalho e ao menos uma linha; senão começa na próxima página.
+            if motor.altura_restante < ALTURA_LEGENDA + altura_cabecalho + alturas[inicio]:
+                motor.quebrar_pagina()
+            disponivel = motor.altura_restante - ALTURA_LEGENDA - altura_cabecalho
+            fim, altura_parte = inicio, 0.0
+            while fim < fim_dados and (fim == inicio or altura_parte + alturas[fim] <= disponivel):
+                altura_parte += alturas[fim]
+                fim += 1
+            # A fonte fica só na última parte; se ela não couber, a última linha passa para a próxima.
+            if tabela.fonte and fim == fim_dados and fim - inicio > 1 and altura_parte + ALTURA_LEGENDA > disponivel:
+                fim -= 1
+                altura_parte -= alturas[fim]
+            ultima = fim == fim_dados
+            if inicio == 1:
+                # Se a primeira parte já é a última (a tabela coube inteira na página nova), não há indicação.
+                indicacao = None if ultima else "continua"
             else:
-                titulo = entrada["titulo"].upper() if entrada["nivel"] == 1 else entrada["titulo"]
-                html += f"""<p class="sumario-item sumario-nivel-{entrada['nivel']}"><a href="#{entrada['id_ancora']}"><span class="sumario-titulo">{entrada['numero']} {titulo}</span><span class="sumario-dots"></span><span class="sumario-pagina">{entrada['pagina']}</span></a></p>"""
-        return html
+                indicacao = "conclusão" if ultima else "continuação"
+            html = self._renderizar_tabela_html(tabela, tabela.dados[inicio:fim], indicacao, com_fonte=ultima)
+            altura = ALTURA_LEGENDA + altura_cabecalho + altura_parte + (ALTURA_LEGENDA if ultima else 0)
+            motor.adicionar_bloco(html, altura)
+            if not ultima:
+                motor.quebrar_pagina()
+            inicio = fim
 
-    def _renderizar_tabela_html(self, tabela):
+    def _renderizar_tabela_html(self, tabela, linhas=None, indicacao=None, com_fonte=True):
+        """HTML da tabela (ou de uma parte dela: as linhas informadas, sob o mesmo cabeçalho)."""
         classe_css = 'abnt' if tabela.estilo_borda == 'abnt' else ''
-        html = f'<div><p class="legenda">Tabela {tabela.numero} – {tabela.titulo}</p><table class="{classe_css}" align="center">'
+        partes = ['<div>']
+        if indicacao:
+            partes.append(f'<p class="legenda">Tabela {tabela.numero} – {tabela.titulo}</p>'
+                          f'<p class="indicacao-tabela">({indicacao})</p>')
+        else:
+            partes.append(f'<p class="legenda">Tabela {tabela.numero} – {tabela.titulo}</p>')
+        partes.append(f'<table class="{classe_css}" align="center">')
         if tabela.dados:
-            html += '<thead><tr>'
-            for header in tabela.dados[0]: html += f'<th>{header}</th>'
-            html += '</tr></thead><tbody>'
-            for row in tabela.dados[1:]:
-                html += '<tr>'
-                for cell in row: html += f'<td>{cell}</td>'
-                html += '</tr>'
-            html += '</tbody>'
-        html += '</table>'
-        if tabela.fonte: html += f'<p class="fonte">Fonte: {tabela.fonte}</p>'
-        html += '</div>'
-        return html
+            partes.append('<thead><tr>')
+            partes.extend(f'<th>{header}</th>' for header in tabela.dados[0])
+            partes.append('</tr></thead><tbody>')
+            for row in (tabela.dados[1:] if linhas is None else linhas):
+                partes.append('<tr>')
+                partes.extend(f'<td>{cell}</td>' for cell in row)
+                partes.append('</tr>')
+            partes.append('</tbody>')
+        partes.append('</table>')
+        if tabela.fonte and com_fonte: partes.append(f'<p class="fonte">Fonte: {tabela.fonte}</p>')
+        partes.append('</div>')
+        return ''.join(partes)
+
+    def _renderizar_imagem_rascunho(self, legenda: str, largura_cm: float, altura_cm: float) -> str:
+        return (f'<div><p class="legenda">{legenda}</p>'
+                f'<div class="imagem-rascunho" style="width: {largura_cm}cm; height: {altura_cm:.2f}cm;"></div></div>')
 
     def _renderizar_figura_html(self, figura):
-        caminho_abs = os.path.abspath(figura.caminho_processado)
-        url_local = f"file:///{caminho_abs.replace(os.path.sep, '/')}"
-        html = f'<div><p class="legenda">Figura {figura.numero} – {figura.titulo}</p>'
-        html += f'<img src="{url_local}" style="width: {figura.largura_cm}cm;">'
-        if figura.fonte: html += f'<p class="fonte">Fonte: {figura.fonte}</p>'
-        html += '</div>'
-        return html
+        if self.rascunho:
+            return self._renderizar_imagem_rascunho(f"Figura {figura.numero} – {figura.titulo}", figura.largura_cm,
+                                                    figura.largura_cm / 16 * 9)
+        url_local = self._url_imagem(figura.caminho_processado, figura.largura_cm)
+        partes = [f'<div><p class="legenda">Figura {figura.numero} – {figura.titulo}</p>',
+                  f'<img src="{url_local}" style="width: {figura.largura_cm}cm;">']
+        if figura.fonte: partes.append(f'<p class="fonte">Fonte: {figura.fonte}</p>')
+        partes.append('</div>')
+        return ''.join(partes)
 
     def _renderizar_formula_html(self, formula):
+        if self.rascunho:
+            return self._renderizar_imagem_rascunho(f"Equação {formula.numero} – {formula.legenda}", formula.largura_cm,
+                                                    ALTURA_FORMULA_ESTIMADA - ALTURA_LEGENDA)
         # Prioriza o SVG de alta qualidade para a pré-visualização.
         caminho_para_renderizar = formula.caminho_svg or formula.caminho_processado_png
 
         if not caminho_para_renderizar or not os.path.exists(caminho_para_renderizar):
             return '<div class="formula-container"><p style="color: red;">[ERRO: Imagem da fórmula não encontrada]</p></div>'
             
-        caminho_abs = os.path.abspath(caminho_para_renderizar)
-        url_local = f"file:///{caminho_abs.replace(os.path.sep, '/')}"
+        url_local = self._url_imagem(caminho_para_renderizar, formula.largura_cm)
         
         html = f"""
         <div class="formula-container">
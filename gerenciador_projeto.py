@@ -2,12 +2,12 @@
 # Descrição: Lida com a criação, salvamento e carregamento de projetos no formato .abnf,
 # agora com suporte integrado para salvar e carregar os arquivos SVG e PNG das fórmulas.
 
+import io
 import os
 import json
 import zipfile
 import tempfile
 import shutil
-import copy
 
 # É importante garantir que todas as classes necessárias sejam importadas para a desserialização.
 # O from_dict pode precisar instanciar essas classes.
@@ -16,6 +16,9 @@ from documento import (DocumentoABNT, Capitulo, Figura, Formula, Configuracoes,
 from referencia import Referencia, Livro, Artigo, Site
 import gerenciador_config
 
+# Membros do .abnf gravados sem compressão (o formato já é comprimido).
+EXTENSOES_JA_COMPRIMIDAS = ('.png', '.jpg', '.jpeg')
+
 class GerenciadorProjetos:
     def __init__(self):
         self.diretorio_temporario_atual = None
@@ -33,62 +36,55 @@ class GerenciadorProjetos:
         """
         Salva o estado atual do documento, suas figuras (imagens) e fórmulas (svg e png)
         em um único arquivo .abnf (que é um zip).
+        O zip é escrito diretamente, em uma passada: o documento.json é serializado já com os caminhos
+        relativos à raiz do zip (sem copiar o documento) e os arquivos são lidos do lugar onde estão.
+        PNG e JPEG entram sem compressão, pois já são comprimidos. O arquivo final só é substituído
+        quando o novo estiver completo.
         """
-        with tempfile.TemporaryDirectory(prefix="abnf_save_") as temp_dir:
-            # Cria subdiretórios dentro do zip para organização
-            imagens_dir = os.path.join(temp_dir, 'imagens')
-            os.makedirs(imagens_dir)
-            
-            # Diretório para os SVGs das fórmulas
-            formulas_svg_dir = os.path.join(temp_dir, 'formulas_svg')
-            os.makedirs(formulas_svg_dir)
-            
-            # Diretório para os PNGs das fórmulas
-            formulas_png_dir = os.path.join(temp_dir, 'formulas_png')
-            os.makedirs(formulas_png_dir)
-
-            # Faz uma cópia profunda para não modificar o documento em memória durante o processo
-            doc_para_salvar = copy.deepcopy(documento)
-
-            # Processa as figuras
-            for figura in doc_para_salvar.banco_figuras:
-                if figura.caminho_processado and os.path.exists(figura.caminho_processado):
-                    nome_arquivo = os.path.basename(figura.caminho_processado)
-                    caminho_destino = os.path.join(imagens_dir, nome_arquivo)
-                    shutil.copy2(figura.caminho_processado, caminho_destino)
-                    # O caminho salvo no JSON é relativo à raiz do zip
-                    figura.caminho_processado = os.path.join('imagens', nome_arquivo).replace('\\', '/')
-            
-            # Processa as fórmulas (SVG e PNG)
-            for formula in doc_para_salvar.banco_formulas:
-                # Salva o SVG
-                if formula.caminho_svg and os.path.exists(formula.caminho_svg):
-                    nome_arquivo_svg = os.path.basename(formula.caminho_svg)
-                    caminho_destino_svg = os.path.join(formulas_svg_dir, nome_arquivo_svg)
-                    shutil.copy2(formula.caminho_svg, caminho_destino_svg)
-                    formula.caminho_svg = os.path.join('formulas_svg', nome_arquivo_svg).replace('\\', '/')
-                
-                # Salva o PNG
-                if formula.caminho_processado_png and os.path.exists(formula.caminho_processado_png):
-                    nome_arquivo_png = os.path.basename(formula.caminho_processado_png)
-                    caminho_destino_png = os.path.join(formulas_png_dir, nome_arquivo_png)
-                    shutil.copy2(formula.caminho_processado_png, caminho_destino_png)
-                    formula.caminho_processado_png = os.path.join('formulas_png', nome_arquivo_png).replace('\\', '/')
-            
-            # Serializa o objeto Documento para JSON
-            dados_dict = doc_para_salvar.to_dict()
-            caminho_json = os.path.join(temp_dir, 'documento.json')
-            with open(caminho_json, 'w', encoding='utf-8') as f:
-                json.dump(dados_dict, f, ensure_ascii=False, indent=4)
-            
-            # Cria o arquivo .zip
-            base_name = os.path.splitext(caminho_arquivo)[0]
-            shutil.make_archive(base_name, 'zip', temp_dir)
-            
-            # Renomeia o .zip para .abnf, substituindo o antigo se existir
+        membros = {}  # nome no zip -> caminho no disco
+
+        def incluir(caminho, pasta):
+            # O caminho salvo no JSON é relativo à raiz do zip
+            if caminho and os.path.exists(caminho):
+                nome = f"{pasta}/{os.path.basename(caminho)}"
+                membros[nome] = caminho
+                return nome
+            return caminho
+
+        dados_dict = documento.to_dict()
+        # Os dicionários do to_dict são os próprios atributos dos objetos: são copiados antes de alterar.
+        dados_dict["banco_figuras"] = [
+            {**figura, "caminho_processado": incluir(figura.get("caminho_processado"), 'imagens')}
+            for figura in dados_dict["banco_figuras"]]
+        dados_dict["banco_formulas"] = [
+            {**formula, "caminho_svg": incluir(formula.get("caminho_svg"), 'formulas_svg'),
+             "caminho_processado_png": incluir(formula.get("caminho_processado_png"), 'formulas_png')}
+            for formula in dados_dict["banco_formulas"]]
+
+        diretorio = os.path.dirname(os.path.abspath(caminho_arquivo))
+        fd, caminho_temporario = tempfile.mkstemp(prefix=".abnf_save_", suffix=".tmp", dir=diretorio)
+        try:
+            with os.fdopen(fd, 'wb') as arquivo, \
+                    zipfile.ZipFile(arquivo, 'w', compression=zipfile.ZIP_DEFLATED) as zip_ref:
+                with zip_ref.open('documento.json', 'w') as membro, \
+                        io.TextIOWrapper(membro, encoding='utf-8') as texto:
+                    json.dump(dados_dict, texto, ensure_ascii=False)
+                for nome, caminho in membros.items():
+                    extensao = os.path.splitext(nome)[1].lower()
+                    compressao = zipfile.ZIP_STORED if extensao in EXTENSOES_JA_COMPRIMIDAS else zipfile.ZIP_DEFLATED
+                    zip_ref.write(caminho, nome, compress_type=compressao)
+            # O mkstemp cria o arquivo só com permissão para o dono; o .abnf mantém as permissões usuais.
             if os.path.exists(caminho_arquivo):
-                os.remove(caminho_arquivo)
-            os.rename(base_name + '.zip', caminho_arquivo)
+                shutil.copymode(caminho_arquivo, caminho_temporario)
+            else:
+                mascara = os.umask(0)
+                os.umask(mascara)
+                os.chmod(caminho_temporario, 0o666 & ~mascara)
+            os.replace(caminho_temporario, caminho_arquivo)
+        except BaseException:
+            if os.path.exists(caminho_temporario):
+                os.remove(caminho_temporario)
+            raise
 
         if add_to_recents:
             gerenciador_config.add_projeto_recente(caminho_arquivo)
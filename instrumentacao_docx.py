@@ -0,0 +1,112 @@
+# instrumentacao_docx.py
+# Descrição: Instrumentação opcional da geração do .docx. Registra o tempo (e, nas fases de primeiro
+# nível, o pico de memória) de cada fase do GeradorDOCX, incluindo cada capítulo, tabela, figura e
+# fórmula, além de contadores, e grava um relatório JSON ao lado do arquivo gerado. Serve para achar
+# os projetos problemáticos de um lote sem precisar de um profiler.
+
+import os
+import re
+import json
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+VERSAO_RELATORIO = 1
+SUFIXO_RELATORIO = ".instrumentacao.json"
+
+def caminho_relatorio(caminho_saida: str) -> str:
+    """Caminho do relatório de instrumentação de um .docx (trabalho.docx -> trabalho.instrumentacao.json)."""
+    return os.path.splitext(caminho_saida)[0] + SUFIXO_RELATORIO
+
+def pico_memoria_kib() -> int | None:
+    """Pico de memória residente do processo (desde o último reinício da medição), em KiB."""
+    try:
+        with open('/proc/self/status') as f:
+            return int(re.search(r'VmHWM:\s+(\d+)', f.read()).group(1))
+    except (OSError, AttributeError):
+        pass
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return None
+
+def reiniciar_pico_memoria():
+    """Zera o pico de memória residente (somente Linux); em outros sistemas o pico é acumulado."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+class InstrumentacaoDOCX:
+    def __init__(self):
+        self.fases = []
+        self.contadores = {}
+        self._pilha = []
+        self._inicio = time.perf_counter()
+
+    @contextmanager
+    def fase(self, nome: str, **detalhes):
+        """
+        Mede o bloco como uma fase. Fases abertas dentro de outra ficam em "fases" da fase externa.
+        Os detalhes (ex: título, número de linhas) vão para o relatório junto com o tempo.
+        """
+        registro = {"fase": nome, **detalhes}
+        (self._pilha[-1].setdefault("fases", []) if self._pilha else self.fases).append(registro)
+        primeiro_nivel = not self._pilha
+        if primeiro_nivel:
+            reiniciar_pico_memoria()
+        self._pilha.append(registro)
+        inicio = time.perf_counter()
+        try:
+            yield registro
+        except BaseException as e:
+            registro["erro"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            registro["tempo_s"] = round(time.perf_counter() - inicio, 6)
+            if primeiro_nivel:
+                registro["pico_memoria_kib"] = pico_memoria_kib()
+            self._pilha.pop()
+
+    def contar(self, nome: str, quantidade: int = 1):
+        self.contadores[nome] = self.contadores.get(nome, 0) + quantidade
+
+    def _totais(self) -> dict:
+        """Quantidade e tempo somado de cada tipo de fase, em qualquer nível."""
+        totais = {}
+
+        def somar(fases):
+            for registro in fases:
+                total = totais.setdefault(registro["fase"], {"quantidade": 0, "tempo_s": 0.0})
+                total["quantidade"] += 1
+                total["tempo_s"] += registro.get("tempo_s", 0.0)
+                somar(registro.get("fases", []))
+
+        somar(self.fases)
+        for total in totais.values():
+            total["tempo_s"] = round(total["tempo_s"], 6)
+        return totais
+
+    def relatorio(self, **informacoes) -> dict:
+        return {
+            "versao": VERSAO_RELATORIO,
+            "data": datetime.now().isoformat(timespec='seconds'),
+            **informacoes,
+            "tempo_total_s": round(time.perf_counter() - self._inicio, 6),
+            "pico_memoria_kib": max((r["pico_memoria_kib"] for r in self.fases if r.get("pico_memoria_kib")), default=None),
+            "contadores": dict(sorted(self.contadores.items())),
+            "totais": self._totais(),
+            "fases": self.fases,
+        }
+
+    def salvar(self, caminho_saida: str, **informacoes) -> str:
+        """Grava o relatório ao lado do arquivo gerado e retorna o caminho do JSON."""
+        caminho = caminho_relatorio(caminho_saida)
+        with open(caminho, 'w', encoding='utf-8') as f:
+            json.dump(self.relatorio(**informacoes), f, ensure_ascii=False, indent=4)
+        return caminho
@@ -7,22 +7,26 @@ import os
 os.environ['QTWEBENGINE_REMOTE_DEBUGGING'] = '9222'
 
 import shutil
+import time
 from datetime import datetime
 from PySide6 import QtWidgets, QtCore
 from PySide6.QtWidgets import (QApplication, QWidget, QLabel, QLineEdit, QTextEdit,
                                QPushButton, QVBoxLayout, QHBoxLayout, QFileDialog,
                                QMessageBox, QTabWidget, QComboBox,
-                               QFormLayout, QMenuBar, QCheckBox, QSplitter)
+                               QFormLayout, QMenuBar, QCheckBox, QSplitter, QProgressDialog)
 from PySide6.QtGui import QAction, QKeySequence, QActionGroup
 from PySide6.QtWebEngineCore import QWebEnginePage
 from PySide6.QtWebEngineWidgets import QWebEngineView
 
 # --- Assume que os arquivos abaixo estão na mesma pasta ---
 from documento import DocumentoABNT, Autor, Capitulo
-from gerador_docx import GeradorDOCX
+from gerador_docx import GeradorDOCX, ExportacaoCancelada
 from referencia import Livro, Artigo, Site
 from aba_conteudo import AbaConteudo
-from gerador_preview import GeradorHTMLPreview
+from gerador_preview import GeradorHTMLPreview, MAXIMO_PROCESSOS_PREVIEW
+from transporte_preview import TransportePreview
+from recursos_preview import RepositorioRecursos
+from esquema_abnf import EsquemaABNF, registrar_esquema
 from gerenciador_projeto import GerenciadorProjetos
 from dialogs import ReferenciaDialog, DialogoFigura
 from modelos_trabalho import get_estrutura_por_nome, get_nomes_modelos
@@ -34,6 +38,47 @@ import gerenciador_recuperacao
 from dialogs import DialogoRecuperacao
 # -------------------------------------------------------------------------------
 
+class ThreadExportacaoDOCX(QtCore.QThread):
+    """Gera o .docx fora da thread da interface, a partir de uma cópia do documento."""
+    progresso = QtCore.Signal(int, int, str)
+    concluido = QtCore.Signal(str)
+    falhou = QtCore.Signal(str)
+    cancelado = QtCore.Signal()
+
+    def __init__(self, documento, caminho_arquivo, parent=None):
+        super().__init__(parent)
+        self.caminho_arquivo = caminho_arquivo
+        self.gerador = GeradorDOCX(documento, usar_cache_fragmentos=True, progresso=self.progresso.emit)
+
+    def cancelar(self):
+        self.gerador.cancelar()
+
+    def run(self):
+        try:
+            self.gerador.gerar_documento(self.caminho_arquivo)
+            self.concluido.emit(self.caminho_arquivo)
+        except ExportacaoCancelada:
+            self.cancelado.emit()
+        except Exception as e:
+            self.falhou.emit(str(e))
+
+class ThreadPreview(QtCore.QThread):
+    """Pagina a pré-visualização fora da thread da interface, a partir de uma cópia do documento."""
+    concluido = QtCore.Signal(int, object)
+    falhou = QtCore.Signal(int, str)
+
+    def __init__(self, gerador, geracao, parent=None):
+        super().__init__(parent)
+        self.gerador = gerador
+        self.geracao = geracao
+
+    def run(self):
+        try:
+            self.gerador.gerar_paginas()
+            self.concluido.emit(self.geracao, self.gerador.resultado)
+        except Exception as e:
+            self.falhou.emit(self.geracao, str(e))
+
 class ABNTHelperApp(QWidget):
     def __init__(self):
         super().__init__()
@@ -50,17 +95,34 @@ class ABNTHelperApp(QWidget):
         self.wants_to_restart = False
 
         self.modo_preview = "lado_a_lado"
+        # Pré-visualização em dois níveis: o rascunho (só o capítulo em edição, sobre a última paginação
+        # completa) sai a cada tecla; a paginação completa, com sumário e numeração, após uma pausa maior.
         self.preview_update_timer = QtCore.QTimer(self)
         self.preview_update_timer.setSingleShot(True)
-        self.preview_update_timer.setInterval(750)
+        self.preview_update_timer.setInterval(2000)
         self.preview_update_timer.timeout.connect(self._atualizar_preview)
+        self.rascunho_timer = QtCore.QTimer(self)
+        self.rascunho_timer.setSingleShot(True)
+        self.rascunho_timer.setInterval(50)
+        self.rascunho_timer.timeout.connect(self._atualizar_rascunho)
         
         self.autosave_timer = QtCore.QTimer(self)
         intervalo_ms = self.config['recovery']['autosave_periodic_interval_min'] * 60 * 1000
         self.autosave_timer.setInterval(intervalo_ms)
         self.autosave_timer.timeout.connect(self._auto_salvar_recuperacao)
         
-        self.scroll_posicao = 0
+        # A pré-visualização é gerada em segundo plano: um pedido por vez, e, enquanto ele roda, só o
+        # pedido mais recente fica na fila; resultados de pedidos já superados são descartados.
+        self.gerador_preview = None
+        self.gerador_rascunho = None
+        self.resultado_preview = None
+        self._geracao_documento = 0
+        self.thread_preview = None
+        self._snapshot_preview_pendente = None
+        self._geracao_preview = 0
+        self._avisar_preview = False
+        self.thread_exportacao = None
+        self.dialogo_exportacao = None
         self.main_layout = QVBoxLayout(self)
         self.main_content_widget = None
 
@@ -123,6 +185,12 @@ class ABNTHelperApp(QWidget):
         menu_visualizacao.addAction(self.acao_modo_aba)
         grupo_modos.addAction(self.acao_modo_aba)
 
+        menu_visualizacao.addSeparator()
+        acao_atualizar_preview = QAction("Atualizar Pré-Visualização", self)
+        acao_atualizar_preview.setShortcut(QKeySequence("F5"))
+        acao_atualizar_preview.triggered.connect(self._atualizar_preview)
+        menu_visualizacao.addAction(acao_atualizar_preview)
+
         self.tabs = QTabWidget()
         self.aba_conteudo = AbaConteudo(self.documento)
         self.tabs.addTab(self._criar_aba_geral(), "Geral e Pré-Textual")
@@ -273,7 +341,12 @@ class ABNTHelperApp(QWidget):
         self.preview_display = QWebEngineView()
         self.preview_display.setHtml("<html><body><h1>Pré-Visualização</h1><p>A pré-visualização será atualizada aqui.</p></body></html>")
         self.preview_display.setZoomFactor(0.75)
-        self.preview_display.loadFinished.connect(self._restaurar_scroll_preview)
+        # A página base e as imagens são servidas da memória pelo esquema abnf://.
+        self.recursos_preview = RepositorioRecursos()
+        self.esquema_abnf = EsquemaABNF(self.recursos_preview, self)
+        self.esquema_abnf.instalar(self.preview_display)
+        # Depois da primeira atualização, só as páginas alteradas são trocadas (a rolagem é mantida).
+        self.transporte_preview = TransportePreview(self.preview_display, self, recursos=self.recursos_preview)
         layout.addWidget(self.preview_display, 1)
         
         self.btn_atualizar_preview = QPushButton("Atualizar Pré-Visualização")
@@ -321,32 +394,89 @@ class ABNTHelperApp(QWidget):
         if self.modo_preview == "lado_a_lado":
             self.preview_update_timer.start()
             
-    def _salvar_scroll_preview(self):
-        self.preview_display.page().runJavaScript("window.scrollY;", self._on_scroll_posicao_recebida)
-        
-    @QtCore.Slot(object)
-    def _on_scroll_posicao_recebida(self, result):
-        if isinstance(result, (int, float)):
-            self.scroll_posicao = result
-            
     @QtCore.Slot()
-    def _restaurar_scroll_preview(self):
-        self.preview_display.page().runJavaScript(f"window.scrollTo(0, {self.scroll_posicao});")
+    def _disparar_rascunho(self):
+        if self.modo_preview == "lado_a_lado" and not self._populando_ui:
+            self._geracao_preview += 1  # A paginação completa em andamento já não reflete o texto.
+            self.rascunho_timer.start()
+
+    def _capitulo_principal_em_edicao(self) -> int | None:
+        """Número do capítulo de primeiro nível que contém o tópico aberto no editor."""
+        capitulo = self.aba_conteudo._get_capitulo_selecionado()
+        if capitulo is None:
+            return None
+        def contem(no):
+            return no is capitulo or any(contem(filho) for filho in no.filhos)
+        for i, no in enumerate(self.documento.estrutura_textual.filhos, 1):
+            if contem(no):
+                return i
+        return None
+
+    @QtCore.Slot()
+    def _atualizar_rascunho(self):
+        if self.resultado_preview is None:
+            return
+        numero_capitulo = self._capitulo_principal_em_edicao()
+        if numero_capitulo is None:
+            return
+        self.aba_conteudo.sincronizar_conteudo_pendente()
+        if self.gerador_rascunho is None:
+            self.gerador_rascunho = GeradorHTMLPreview(self.documento, rascunho=True)
+        self.gerador_rascunho.doc_abnt = self.documento
+        paginas = self.gerador_rascunho.gerar_rascunho(self.resultado_preview, numero_capitulo)
+        if paginas is not None:
+            self.transporte_preview.atualizar(paginas)
 
     @QtCore.Slot()
     def _atualizar_preview(self):
-        if self.modo_preview == "lado_a_lado":
-            self._salvar_scroll_preview()
+        self.rascunho_timer.stop()
         self.aba_conteudo.sincronizar_conteudo_pendente()
         self._sincronizar_modelo_com_ui()
+        self._geracao_preview += 1
+        self._avisar_preview = self.modo_preview == "aba"
+        self._snapshot_preview_pendente = self.documento.snapshot()
+        if self.thread_preview is None:
+            self._iniciar_thread_preview()
+
+    def _iniciar_thread_preview(self):
+        snapshot, self._snapshot_preview_pendente = self._snapshot_preview_pendente, None
+        # O gerador é mantido entre as atualizações para reaproveitar a paginação das seções não
+        # alteradas (o reaproveitamento é por conteúdo, então vale também entre cópias do documento).
+        if self.gerador_preview is None:
+            self.gerador_preview = GeradorHTMLPreview(snapshot, recursos=self.recursos_preview, processos=min(os.cpu_count() or 1, MAXIMO_PROCESSOS_PREVIEW))
+        self.gerador_preview.doc_abnt = snapshot
+        self.gerador_preview.definir_zoom(self.preview_display.zoomFactor() * self.preview_display.devicePixelRatioF())
+        self.thread_preview = ThreadPreview(self.gerador_preview, self._geracao_preview, self)
+        self.thread_preview.concluido.connect(self._preview_concluido)
+        self.thread_preview.falhou.connect(self._preview_falhou)
+        self.thread_preview.finished.connect(self._thread_preview_finalizada)
+        self.thread_preview.start()
+
+    @QtCore.Slot(int, object)
+    def _preview_concluido(self, geracao, resultado):
+        # Mesmo superada, a paginação serve de base aos próximos rascunhos (é mais nova que a anterior).
+        if geracao > self._geracao_documento:
+            self.resultado_preview = resultado
+        if geracao != self._geracao_preview:
+            return  # Já existe um pedido mais recente.
         self.preview_display.findText("")
-        gerador = GeradorHTMLPreview(self.documento)
-        html_content = gerador.gerar_html()
-        base_url = QtCore.QUrl.fromLocalFile(os.path.abspath(os.path.dirname(__file__)))
-        self.preview_display.setHtml(html_content, baseUrl=base_url)
-        if self.modo_preview == "aba":
+        self.transporte_preview.atualizar(resultado.paginas_html)
+        if self._avisar_preview:
             QMessageBox.information(self, "Atualizado", "A pré-visualização foi atualizada com sucesso.")
 
+    @QtCore.Slot(int, str)
+    def _preview_falhou(self, geracao, mensagem):
+        print(f"Erro ao gerar a pré-visualização: {mensagem}")
+        if geracao == self._geracao_preview and self._avisar_preview:
+            QMessageBox.critical(self, "Erro", f"Não foi possível atualizar a pré-visualização:\n{mensagem}")
+
+    @QtCore.Slot()
+    def _thread_preview_finalizada(self):
+        self.thread_preview.deleteLater()
+        self.thread_preview = None
+        if self._snapshot_preview_pendente is not None:
+            self._iniciar_thread_preview()
+
     def _marcar_modificado(self):
         if self._populando_ui:
             return
@@ -361,13 +491,28 @@ class ABNTHelperApp(QWidget):
         self._disparar_atualizacao_automatica()
 
     def closeEvent(self, event):
-        if self._verificar_alteracoes_nao_salvas():
-            if self.caminho_projeto_atual or self.modificado:
-                 gerenciador_recuperacao.limpar_recuperacao(self.caminho_projeto_atual)
-            self.gerenciador_projeto.fechar_projeto()
-            event.accept()
-        else:
+        # As duas perguntas vêm antes de qualquer ação: se o usuário desistir em uma delas, a
+        # exportação em andamento continua.
+        if self.thread_exportacao is not None:
+            if QMessageBox.question(self, "Exportação em andamento",
+                                    "O documento .docx ainda está sendo gerado. Cancelar a exportação e sair?") != QMessageBox.StandardButton.Yes:
+                event.ignore()
+                return
+        if not self._verificar_alteracoes_nao_salvas():
             event.ignore()
+            return
+        if self.thread_exportacao is not None:
+            self.thread_exportacao.cancelar()
+            self.thread_exportacao.wait()
+        if self.caminho_projeto_atual or self.modificado:
+             gerenciador_recuperacao.limpar_recuperacao(self.caminho_projeto_atual)
+        self.gerenciador_projeto.fechar_projeto()
+        if self.thread_preview is not None:
+            self._snapshot_preview_pendente = None
+            self.thread_preview.wait()
+        if self.gerador_preview is not None:
+            self.gerador_preview.encerrar()
+        event.accept()
 
     @QtCore.Slot(bool)
     def _novo_projeto(self, primeira_execucao=False):
@@ -438,6 +583,9 @@ class ABNTHelperApp(QWidget):
 
     def _popular_ui_com_documento(self):
         self._populando_ui = True
+        # Os rascunhos não podem partir da paginação do documento anterior (nem de uma ainda em andamento).
+        self.resultado_preview = None
+        self._geracao_documento = self._geracao_preview
         cfg = self.documento.configuracoes
         self.cfg_tipo.setCurrentText(cfg.tipo_trabalho)
         self.cfg_instituicao.setText(cfg.instituicao)
@@ -488,6 +636,7 @@ class ABNTHelperApp(QWidget):
         self.resumo_input.textChanged.connect(self._marcar_modificado)
         self.keywords_input.textChanged.connect(self._marcar_modificado)
         self.aba_conteudo.editor_capitulo.textChanged.connect(self._marcar_modificado)
+        self.aba_conteudo.editor_capitulo.textChanged.connect(self._disparar_rascunho)
         self.aba_conteudo.arvore_capitulos.estruturaAlterada.connect(self._marcar_modificado)
         self.aba_conteudo.arvore_capitulos.itemChanged.connect(self._marcar_modificado)
 
@@ -541,6 +690,7 @@ class ABNTHelperApp(QWidget):
         self.documento.palavras_chave = self.keywords_input.text()
 
     def _gerar_documento_final(self):
+        if self.thread_exportacao is not None: return
         self.aba_conteudo.sincronizar_conteudo_pendente()
         self._sincronizar_modelo_com_ui()
         if not self.documento.titulo or not self.documento.autores:
@@ -548,12 +698,73 @@ class ABNTHelperApp(QWidget):
             return
         filename, _ = QFileDialog.getSaveFileName(self, "Salvar Documento", "trabalho_abnt.docx", "Word Documents (*.docx)")
         if not filename: return
-        try:
-            gerador = GeradorDOCX(self.documento)
-            gerador.gerar_documento(filename)
-            QMessageBox.information(self, "Sucesso", f"Documento .docx gerado com sucesso em:\n{filename}")
-        except Exception as e:
-            QMessageBox.critical(self, "Erro na Geração", f"Ocorreu um erro: {e}")
+
+        # A geração trabalha sobre uma cópia: o usuário pode continuar editando durante a exportação.
+        self.thread_exportacao = ThreadExportacaoDOCX(self.documento.snapshot(), filename, self)
+        self.thread_exportacao.progresso.connect(self._atualizar_progresso_exportacao)
+        self.thread_exportacao.concluido.connect(self._exportacao_concluida)
+        self.thread_exportacao.falhou.connect(self._exportacao_falhou)
+        self.thread_exportacao.cancelado.connect(self._exportacao_cancelada)
+        self.thread_exportacao.finished.connect(self._finalizar_exportacao)
+
+        self.dialogo_exportacao = QProgressDialog("Preparando a exportação...", "Cancelar", 0, 0, self)
+        self.dialogo_exportacao.setWindowTitle("Gerando Documento .docx")
+        self.dialogo_exportacao.setWindowModality(QtCore.Qt.WindowModality.NonModal)
+        self.dialogo_exportacao.setAutoClose(False)
+        self.dialogo_exportacao.setAutoReset(False)
+        self.dialogo_exportacao.setMinimumDuration(0)
+        self.dialogo_exportacao.canceled.connect(self._cancelar_exportacao)
+        self.dialogo_exportacao.show()
+
+        self.generate_btn.setEnabled(False)
+        self.inicio_exportacao = time.monotonic()
+        self.thread_exportacao.start()
+
+    @QtCore.Slot(int, int, str)
+    def _atualizar_progresso_exportacao(self, feitos, total, descricao):
+        if self.dialogo_exportacao is None or self.dialogo_exportacao.wasCanceled(): return
+        self.dialogo_exportacao.setMaximum(total)
+        self.dialogo_exportacao.setValue(min(feitos, total))
+        texto = descricao
+        if 0 < feitos < total:
+            decorrido = time.monotonic() - self.inicio_exportacao
+            restante = int(decorrido * (total - feitos) / feitos)
+            texto += f"\nTempo restante estimado: {restante // 60}min {restante % 60:02d}s"
+        self.dialogo_exportacao.setLabelText(texto)
+
+    @QtCore.Slot()
+    def _cancelar_exportacao(self):
+        if self.thread_exportacao is None: return
+        self.thread_exportacao.cancelar()
+        self.dialogo_exportacao.setLabelText("Cancelando...")
+
+    @QtCore.Slot(str)
+    def _exportacao_concluida(self, filename):
+        self._fechar_dialogo_exportacao()
+        QMessageBox.information(self, "Sucesso", f"Documento .docx gerado com sucesso em:\n{filename}")
+
+    @QtCore.Slot(str)
+    def _exportacao_falhou(self, erro):
+        self._fechar_dialogo_exportacao()
+        QMessageBox.critical(self, "Erro na Geração", f"Ocorreu um erro: {erro}")
+
+    @QtCore.Slot()
+    def _exportacao_cancelada(self):
+        self._fechar_dialogo_exportacao()
+
+    @QtCore.Slot()
+    def _finalizar_exportacao(self):
+        self._fechar_dialogo_exportacao()
+        self.thread_exportacao.deleteLater()
+        self.thread_exportacao = None
+        self.generate_btn.setEnabled(True)
+
+    def _fechar_dialogo_exportacao(self):
+        if self.dialogo_exportacao is None: return
+        self.dialogo_exportacao.canceled.disconnect(self._cancelar_exportacao)
+        self.dialogo_exportacao.close()
+        self.dialogo_exportacao.deleteLater()
+        self.dialogo_exportacao = None
 
     @QtCore.Slot()
     def _auto_salvar_recuperacao(self):
@@ -608,14 +819,9 @@ class ABNTHelperApp(QWidget):
         self._disparar_atualizacao_automatica()
 
 
-if __name__ == '__main__':
-    try:
-        from PySide6.QtWebEngineWidgets import QWebEngineView
-    except ImportError:
-        print("ERRO: A dependência 'PySide6-WebEngineWidgets' não está instalada.")
-        print("Por favor, execute: pip install PySide6-WebEngineWidgets")
-        sys.exit(1)
-
+def executar():
+    """Abre a interface gráfica. Chamado por abnt_helper_gui.py, o ponto de entrada do aplicativo."""
+    registrar_esquema()  # O esquema abnf:// precisa ser registrado antes do QApplication.
     app = QApplication(sys.argv)
     
     # Loop principal para permitir voltar à tela inicial
@@ -697,4 +903,8 @@ if __name__ == '__main__':
         if not win.wants_to_restart:
             break
             
-    sys.exit(0)
\ No newline at end of file
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(executar())
@@ -0,0 +1,79 @@
+# metricas_fonte.py
+# Descrição: Métricas de largura da Times New Roman e quebra de linhas para a paginação da
+# pré-visualização. As larguras de avanço (em milésimos de eme, as mesmas da Times-Roman padrão)
+# ficam em uma tabela pré-calculada, sem depender de a fonte estar instalada. A quebra de linhas é
+# gulosa por palavra, como a do navegador e a do Word para texto justificado, e o resultado é
+# guardado por parágrafo: na pré-visualização incremental quase todos os parágrafos se repetem.
+
+import re
+from functools import lru_cache
+
+CM_POR_PONTO = 2.54 / 72
+
+# Largura de avanço dos caracteres ASCII imprimíveis (do espaço, 32, ao til, 126).
+_LARGURAS_ASCII = (
+    250, 333, 408, 500, 500, 833, 778, 180, 333, 333, 500, 564, 250, 333, 250, 278,  #   ! " # $ % & ' ( ) * + , - . /
+    500, 500, 500, 500, 500, 500, 500, 500, 500, 500, 278, 278, 564, 564, 564, 444,  # 0-9 : ; < = > ?
+    921, 722, 667, 667, 722, 611, 556, 722, 722, 333, 389, 722, 611, 889, 722, 722,  # @ A-O
+    556, 722, 667, 556, 611, 722, 722, 944, 722, 722, 611, 333, 278, 333, 469, 500,  # P-Z [ \ ] ^ _
+    333, 444, 500, 444, 500, 444, 333, 500, 500, 278, 278, 500, 278, 778, 500, 500,  # ` a-o
+    500, 500, 333, 389, 278, 500, 500, 722, 500, 500, 444, 480, 200, 480, 541,       # p-z { | } ~
+)
+LARGURAS_TIMES = {chr(32 + i): largura for i, largura in enumerate(_LARGURAS_ASCII)}
+# Letras acentuadas têm a largura da letra base.
+for _base, _acentuadas in (('a', 'àáâãäå'), ('e', 'èéêë'), ('i', 'ìíîï'), ('o', 'òóôõöø'), ('u', 'ùúûü'),
+                           ('c', 'ç'), ('n', 'ñ'), ('y', 'ýÿ'), ('A', 'ÀÁÂÃÄÅ'), ('E', 'ÈÉÊË'), ('I', 'ÌÍÎÏ'),
+                           ('O', 'ÒÓÔÕÖØ'), ('U', 'ÙÚÛÜ'), ('C', 'Ç'), ('N', 'Ñ'), ('Y', 'Ý')):
+    for _caractere in _acentuadas:
+        LARGURAS_TIMES[_caractere] = LARGURAS_TIMES[_base]
+LARGURAS_TIMES.update({
+    ' ': 250, '–': 500, '—': 1000, '‘': 333, '’': 333, '“': 444, '”': 444, '…': 1000, '•': 350,
+    '°': 400, 'ª': 276, 'º': 310, '«': 500, '»': 500, '§': 500, '¿': 444, '¡': 333, '×': 564, '±': 564,
+    '²': 300, '³': 300, '¹': 300, '½': 750, 'µ': 500, '€': 500, '£': 500, 'æ': 667, 'Æ': 889, 'ß': 500,
+})
+# Caracteres fora da tabela (grego, símbolos etc.) usam uma largura média.
+LARGURA_PADRAO = 500
+
+@lru_cache(maxsize=65536)
+def _largura_palavra(palavra: str) -> int:
+    return sum(LARGURAS_TIMES.get(c, LARGURA_PADRAO) for c in palavra)
+
+def largura_texto(texto: str, tamanho_pt: float = 12) -> float:
+    """Largura do texto em uma única linha, em cm."""
+    return _largura_palavra(texto) * tamanho_pt / 1000 * CM_POR_PONTO
+
+_PALAVRA = re.compile(r'\S+')
+
+@lru_cache(maxsize=16384)
+def quebrar_linhas(texto: str, largura_cm: float, tamanho_pt: float = 12, recuo_primeira_linha_cm: float = 0.0) -> tuple:
+    """
+    Quebra o texto em linhas que caibam na largura informada. Retorna o índice do texto em que
+    cada linha termina (a última é len(texto)). Uma palavra maior que a linha fica sozinha nela.
+    """
+    # Tudo em milésimos de eme, para somar apenas inteiros no laço.
+    unidades_por_cm = 1000 / (tamanho_pt * CM_POR_PONTO)
+    largura_linha = largura_cm * unidades_por_cm
+    disponivel = largura_linha - recuo_primeira_linha_cm * unidades_por_cm
+    espaco = LARGURAS_TIMES[' ']
+
+    fins = []
+    ocupado = None  # None: linha ainda vazia
+    fim_linha = 0
+    for m in _PALAVRA.finditer(texto):
+        largura = _largura_palavra(m.group())
+        if ocupado is None:
+            ocupado = largura
+        elif ocupado + espaco + largura <= disponivel:
+            ocupado += espaco + largura
+        else:
+            fins.append(fim_linha)
+            disponivel = largura_linha
+            ocupado = largura
+        fim_linha = m.end()
+    fins.append(len(texto))
+    return tuple(fins)
+
+def contar_linhas(texto: str, largura_cm: float, tamanho_pt: float = 12, recuo_primeira_linha_cm: float = 0.0) -> int:
+    if not texto.strip():
+        return 0
+    return len(quebrar_linhas(texto, largura_cm, tamanho_pt, recuo_primeira_linha_cm))
@@ -0,0 +1,132 @@
+# motor_layout.py
+# Descrição: Motor de paginação da pré-visualização. Distribui os blocos do documento pelas páginas
+# em uma única passada e produz o modelo de páginas (blocos, quebras e âncoras), do qual saem tanto
+# as páginas HTML quanto os números de página do sumário.
+
+import math
+from dataclasses import dataclass, field
+
+from metricas_fonte import quebrar_linhas
+
+# --- GEOMETRIA DA PÁGINA (EM CM) ---
+ALTURA_CONTEUDO_PAGINA = 24.7
+ALTURA_LINHA_TEXTO = 0.6
+LARGURA_TEXTO = 16.0  # A4 com margens de 3 cm (esquerda) e 2 cm (direita)
+RECUO_PRIMEIRA_LINHA = 1.25
+TAMANHO_FONTE_TEXTO = 12
+
+# Marca de quebra de página no fluxo registrado.
+QUEBRA_PAGINA = None
+
+@dataclass(frozen=True)
+class Ancora:
+    """Marca, no fluxo, o ponto em que um destino do sumário (id_ancora) foi posicionado."""
+    id: str
+
+@dataclass
+class Pagina:
+    classe: str = 'pagina'
+    blocos: list = field(default_factory=list)
+    ancoras: list = field(default_factory=list)
+
+    def html(self, numero: int = None) -> str:
+        atributo_numero = f' data-numero="{numero}"' if numero is not None else ''
+        return f'<div class="{self.classe}"{atributo_numero}>{"".join(self.blocos)}</div>'
+
+class MotorLayout:
+    """
+    Paginação por altura estimada. Tudo o que é colocado na página passa pelo "fluxo" (blocos,
+    quebras e âncoras, na ordem); um trecho do fluxo registrado pode ser repetido com repetir(),
+    o que reproduz exatamente o mesmo resultado quando ele começa no mesmo ponto da página.
+    """
+    def __init__(self, classe_pagina: str = 'pagina'):
+        self.classe_pagina = classe_pagina
+        self.paginas = []
+        self.pagina_atual = Pagina(classe_pagina)
+        self.altura_restante = ALTURA_CONTEUDO_PAGINA
+        self.fluxo = []
+
+    def quebrar_pagina(self):
+        self.fluxo.append(QUEBRA_PAGINA)
+        self.paginas.append(self.pagina_atual)
+        self.pagina_atual = Pagina(self.classe_pagina)
+        self.altura_restante = ALTURA_CONTEUDO_PAGINA
+
+    def ancorar(self, id_ancora: str):
+        self.fluxo.append(Ancora(id_ancora))
+        self.pagina_atual.ancoras.append(id_ancora)
+
+    def emitir(self, bloco):
+        self.fluxo.append(bloco)
+        self.pagina_atual.blocos.append(bloco)
+
+    def adicionar_bloco(self, bloco, altura: float, titulo: bool = False, ancora: str = None):
+        """Bloco indivisível. Títulos exigem espaço para mais duas linhas abaixo deles na mesma página."""
+        altura_necessaria = altura
+        if titulo: altura_necessaria += ALTURA_LINHA_TEXTO * 2
+        if self.altura_restante < altura_necessaria: self.quebrar_pagina()
+        if ancora: self.ancorar(ancora)
+        self.emitir(bloco)
+        self.altura_restante -= altura
+
+    def adicionar_paragrafo(self, texto_paragrafo: str, fins_linhas: tuple = None):
+        """
+        Parágrafo de corpo de texto, quebrado entre páginas quando não couber inteiro. fins_linhas é a
+        quebra de linhas do texto já medida (quebrar_linhas com o recuo da primeira linha), se houver.
+        """
+        texto_restante = texto_paragrafo.strip()
+        if texto_restante and fins_linhas is None:
+            fins_linhas = quebrar_linhas(texto_restante, LARGURA_TEXTO, TAMANHO_FONTE_TEXTO, RECUO_PRIMEIRA_LINHA)
+        is_continuacao = False
+        while texto_restante:
+            base_class = "corpo-texto" if not is_continuacao else "paragrafo-continuado"
+            linhas_que_cabem = math.floor(self.altura_restante / ALTURA_LINHA_TEXTO)
+            if linhas_que_cabem <= 0:
+                self.quebrar_pagina()
+                continue
+            if len(fins_linhas) <= linhas_que_cabem:
+                self.emitir(f'<p class="{base_class}">{texto_restante}</p>')
+                self.altura_restante -= len(fins_linhas) * ALTURA_LINHA_TEXTO
+                texto_restante = ""
+            else:
+                ponto_quebra = fins_linhas[linhas_que_cabem - 1]
+                texto_para_pagina_atual = texto_restante[:ponto_quebra]
+                resto = texto_restante[ponto_quebra:]
+                texto_restante = resto.lstrip()
+                # Só a primeira linha tem recuo; a continuação (sem recuo) quebra nos mesmos pontos, então
+                # basta deslocar os fins de linha restantes em vez de medir o texto de novo.
+                deslocamento = ponto_quebra + len(resto) - len(texto_restante)
+                fins_linhas = tuple(fim - deslocamento for fim in fins_linhas[linhas_que_cabem:])
+                classe_final = f"{base_class} paragrafo-quebrado"
+                self.emitir(f'<p class="{classe_final}">{texto_para_pagina_atual}</p>')
+                self.altura_restante -= linhas_que_cabem * ALTURA_LINHA_TEXTO
+                self.quebrar_pagina()
+                is_continuacao = True
+
+    def repetir(self, fluxo: list):
+        """Reaplica um trecho de fluxo registrado anteriormente."""
+        for item in fluxo:
+            if item is QUEBRA_PAGINA:
+                self.quebrar_pagina()
+            elif isinstance(item, Ancora):
+                self.ancorar(item.id)
+            else:
+                self.emitir(item)
+
+    def finalizar(self) -> list:
+        """Fecha a página atual e retorna todas as páginas."""
+        self.paginas.append(self.pagina_atual)
+        self.pagina_atual = Pagina(self.classe_pagina)
+        return self.paginas
+
+    @staticmethod
+    def indice_ancoras(paginas: list) -> dict:
+        """id_ancora -> índice da página (a partir de 0) em que ela ficou."""
+        return {id_ancora: i for i, pagina in enumerate(paginas) for id_ancora in pagina.ancoras}
+
+def medir_paragrafos(textos: list) -> list:
+    """
+    Quebra de linhas de cada parágrafo de corpo de texto, como adicionar_paragrafo a faria. Não depende
+    da posição na página, então pode ser feita antes (e em outro processo) da distribuição nas páginas.
+    """
+    return [quebrar_linhas(texto, LARGURA_TEXTO, TAMANHO_FONTE_TEXTO, RECUO_PRIMEIRA_LINHA) for texto in textos]
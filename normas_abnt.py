@@ -3,13 +3,18 @@
 
 from docx.shared import Pt, Cm, RGBColor
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+from docx.enum.style import WD_STYLE_TYPE
 from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
 from documento import DocumentoABNT
 
 class MotorNormasABNT:
-    def __init__(self, doc_abnt: DocumentoABNT):
+    def __init__(self, doc_abnt: DocumentoABNT, modo_estilos: bool = False):
         self.doc_abnt = doc_abnt
+        # No modo de estilos toda a formatação ABNT fica em estilos nomeados criados uma única vez
+        # em configurar_pagina_e_estilos; parágrafos apenas referenciam o estilo e os runs não
+        # recebem formatação direta (document.xml menor e geração mais rápida).
+        self.modo_estilos = modo_estilos
         self.MARGEM_SUPERIOR = Cm(3)
         self.MARGEM_INFERIOR = Cm(2)
         self.MARGEM_ESQUERDA = Cm(3)
@@ -24,6 +29,12 @@ class MotorNormasABNT:
         self.RECUO_CITACAO_LONGA = Cm(4)
         self.TAMANHO_FONTE_CITACAO_LONGA = Pt(10)
         self.TAMANHO_FONTE_LEGENDA = Pt(10)
+        self.ESTILO_TABELA_CELULA = 'TabelaABNT'
+        self.ESTILO_TABELA_CABECALHO = 'TabelaABNTCabecalho'
+        self.ESTILO_TEXTO = 'TextoABNT'
+        self.ESTILO_LEGENDA_TITULO = 'LegendaTituloABNT'
+        self.ESTILO_LEGENDA_FONTE = 'LegendaFonteABNT'
+        self._ids_estilo = {}
 
     @property
     def is_artigo(self) -> bool:
@@ -79,6 +90,9 @@ class MotorNormasABNT:
             tbl_borders.append(border)
 
     def aplicar_estilo_legenda(self, paragrafo, is_titulo=True):
+        if self.modo_estilos:
+            self._definir_estilo(paragrafo, self.ESTILO_LEGENDA_TITULO if is_titulo else self.ESTILO_LEGENDA_FONTE)
+            return
         paragrafo.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER if is_titulo else WD_PARAGRAPH_ALIGNMENT.LEFT
         paragrafo.paragraph_format.space_before = Pt(0) if is_titulo else Pt(6)
         paragrafo.paragraph_format.space_after = Pt(6) if is_titulo else Pt(12)
@@ -114,15 +128,65 @@ class MotorNormasABNT:
         ref_style.paragraph_format.line_spacing = self.ESPAÇAMENTO_SIMPLES
         ref_style.paragraph_format.space_after = Pt(6)
         ref_style.paragraph_format.first_line_indent = 0
+
+        # Estilos das células de tabela: toda a formatação fica no estilo, não em cada run.
+        celula_style = doc.styles.add_style(self.ESTILO_TABELA_CELULA, 1)
+        celula_style.base_style = style
+        celula_style.font.name = self.FONTE_PADRAO
+        celula_style.font.size = self.TAMANHO_FONTE_LEGENDA
+        celula_style.font.color.rgb = self.COR_FONTE_PADRAO
+
+        cabecalho_style = doc.styles.add_style(self.ESTILO_TABELA_CABECALHO, 1)
+        cabecalho_style.base_style = celula_style
+        cabecalho_style.paragraph_format.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
         
+        if self.modo_estilos:
+            self._configurar_estilos_nomeados(doc, style)
+
         for section in doc.sections:
             section.top_margin = self.MARGEM_SUPERIOR
             section.bottom_margin = self.MARGEM_INFERIOR
             section.left_margin = self.MARGEM_ESQUERDA
             section.right_margin = self.MARGEM_DIREITA
             
+    def _configurar_estilos_nomeados(self, doc, normal_style):
+        """Cria os estilos usados no modo de estilos (texto, legendas) e formata os estilos de título."""
+        texto_style = doc.styles.add_style(self.ESTILO_TEXTO, 1)
+        texto_style.base_style = normal_style
+        texto_style.paragraph_format.first_line_indent = self.RECUO_PRIMEIRA_LINHA
+        texto_style.paragraph_format.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
+
+        legenda_titulo_style = doc.styles.add_style(self.ESTILO_LEGENDA_TITULO, 1)
+        legenda_titulo_style.base_style = normal_style
+        legenda_titulo_style.font.size = self.TAMANHO_FONTE_LEGENDA
+        legenda_titulo_style.paragraph_format.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+        legenda_titulo_style.paragraph_format.space_before = Pt(0)
+        legenda_titulo_style.paragraph_format.space_after = Pt(6)
+        legenda_titulo_style.paragraph_format.line_spacing = 1.0
+
+        legenda_fonte_style = doc.styles.add_style(self.ESTILO_LEGENDA_FONTE, 1)
+        legenda_fonte_style.base_style = legenda_titulo_style
+        legenda_fonte_style.paragraph_format.alignment = WD_PARAGRAPH_ALIGNMENT.LEFT
+        legenda_fonte_style.paragraph_format.space_before = Pt(6)
+        legenda_fonte_style.paragraph_format.space_after = Pt(12)
+
+        doc.styles['Referencias'].paragraph_format.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
+
+        for nivel in range(1, 10):
+            if f'Heading {nivel}' not in doc.styles:
+                continue
+            heading_style = doc.styles[f'Heading {nivel}']
+            self.formatar_estilo_titulo(heading_style)
+            heading_style.paragraph_format.space_before = Pt(18) if nivel == 1 and not self.is_artigo else Pt(12)
+            heading_style.paragraph_format.space_after = Pt(6)
+            heading_style.paragraph_format.first_line_indent = 0
+
     def aplicar_estilo_paragrafo_normal(self, paragrafo, texto):
-        paragrafo.style = 'Normal'
+        if self.modo_estilos:
+            self._definir_estilo(paragrafo, self.ESTILO_TEXTO)
+            paragrafo.add_run(texto)
+            return
+        self._definir_estilo(paragrafo, 'Normal')
         paragrafo.paragraph_format.first_line_indent = self.RECUO_PRIMEIRA_LINHA
         paragrafo.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
         run = paragrafo.add_run(texto)
@@ -135,41 +199,64 @@ class MotorNormasABNT:
         else:
             titulo_formatado = f"{numero} {titulo_texto.upper() if nivel == 1 else titulo_texto}" if numero else titulo_texto.upper()
         
+        if self.modo_estilos:
+            heading = doc.add_paragraph()
+            heading.add_run(titulo_formatado)
+            self._definir_estilo(heading, f'Heading {nivel}')
+            return heading
         heading = doc.add_heading(titulo_formatado, level=nivel)
-        heading.style.font.name = self.FONTE_PADRAO
-        heading.style.font.bold = True
-        heading.style.font.size = self.TAMANHO_FONTE_PADRAO
-        heading.style.font.color.rgb = self.COR_FONTE_PADRAO # CORRIGIDO
+        self.formatar_estilo_titulo(heading.style)
         heading.paragraph_format.space_before = Pt(18) if nivel == 1 and not self.is_artigo else Pt(12)
         heading.paragraph_format.space_after = Pt(6)
         heading.paragraph_format.first_line_indent = 0
+        return heading
         
+    def formatar_estilo_titulo(self, estilo):
+        """Aplica a fonte ABNT ao estilo de título (Heading N) usado por uma seção."""
+        estilo.font.name = self.FONTE_PADRAO
+        estilo.font.bold = True
+        estilo.font.size = self.TAMANHO_FONTE_PADRAO
+        estilo.font.color.rgb = self.COR_FONTE_PADRAO # CORRIGIDO
+
+    def _definir_estilo(self, paragrafo, nome_estilo):
+        """
+        Equivale a 'paragrafo.style = nome_estilo', mas resolve o id do estilo uma única vez
+        (o python-docx percorre todos os estilos do documento a cada atribuição).
+        """
+        if nome_estilo not in self._ids_estilo:
+            self._ids_estilo[nome_estilo] = paragrafo.part.get_style_id(nome_estilo, WD_STYLE_TYPE.PARAGRAPH)
+        paragrafo._p.style = self._ids_estilo[nome_estilo]
+
     def aplicar_estilo_natureza_trabalho(self, paragrafo, texto):
-        paragrafo.style = 'Normal'
+        self._definir_estilo(paragrafo, 'Normal')
         paragrafo.paragraph_format.left_indent = Cm(8)
         paragrafo.paragraph_format.line_spacing = self.ESPAÇAMENTO_SIMPLES
         paragrafo.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
         paragrafo.add_run(texto)
     
     def aplicar_estilo_resumo(self, paragrafo, texto):
-        paragrafo.style = 'Normal'
+        self._definir_estilo(paragrafo, 'Normal')
         paragrafo.paragraph_format.line_spacing = self.ESPAÇAMENTO_SIMPLES
         paragrafo.paragraph_format.first_line_indent = 0
         paragrafo.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
         paragrafo.add_run(texto)
         
     def aplicar_estilo_referencia(self, paragrafo, texto_formatado):
-        paragrafo.style = 'Referencias'
-        paragrafo.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
+        self._definir_estilo(paragrafo, 'Referencias')
+        if not self.modo_estilos:
+            paragrafo.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
         partes = texto_formatado.split('**')
         for i, parte in enumerate(partes):
             run = paragrafo.add_run(parte)
-            run.font.color.rgb = self.COR_FONTE_PADRAO # CORRIGIDO
+            if not self.modo_estilos:
+                run.font.color.rgb = self.COR_FONTE_PADRAO # CORRIGIDO
             if i % 2 == 1:
                 run.bold = True
 
     def _aplicar_formatacao_run(self, run):
         """Método auxiliar para aplicar formatação padrão a um 'run' de texto."""
+        if self.modo_estilos:
+            return  # A formatação vem do estilo Normal.
         run.font.name = self.FONTE_PADRAO
         run.font.size = self.TAMANHO_FONTE_PADRAO
         run.font.color.rgb = self.COR_FONTE_PADRAO
\ No newline at end of file
@@ -0,0 +1,125 @@
+# recursos_preview.py
+# Descrição: Repositório dos recursos servidos à pré-visualização pelo esquema abnf:// (ver
+# esquema_abnf.py). Cada imagem recebe uma URL derivada do hash do seu conteúdo
+# (abnf://asset/<hash>.<ext>), então uma URL nunca muda de conteúdo e o navegador pode guardá-la sem
+# revalidar. Os bytes ficam em um cache LRU em memória, limitado em tamanho, e são relidos do arquivo
+# de origem quando descartados. Não depende do Qt: o gerador da pré-visualização roda em outra thread.
+
+import os
+import hashlib
+import mimetypes
+import threading
+from collections import OrderedDict
+
+ESQUEMA = "abnf"
+HOST_RECURSOS = "asset"
+HOST_PAGINAS = "preview"
+LIMITE_MEMORIA_BYTES = 64 * 1024 * 1024
+LIMITE_ARQUIVOS = 4096  # arquivos lembrados (e relidos sob demanda) além dos bytes em memória
+
+def tipo_mime(nome: str) -> str:
+    if nome.lower().endswith('.svg'):
+        return "image/svg+xml"
+    return mimetypes.guess_type(nome)[0] or "application/octet-stream"
+
+class RepositorioRecursos:
+    def __init__(self, limite_bytes: int = LIMITE_MEMORIA_BYTES, limite_arquivos: int = LIMITE_ARQUIVOS):
+        self.limite_bytes = limite_bytes
+        self.limite_arquivos = limite_arquivos
+        self._trava = threading.Lock()
+        self._origens = {}  # chave -> caminho do arquivo
+        # caminho -> ((mtime, tamanho), chave), só a versão atual de cada arquivo; do menos para o mais recentemente registrado
+        self._arquivos = OrderedDict()
+        self._memoria = OrderedDict()  # chave -> bytes, do menos para o mais recentemente usado
+        self._bytes_em_memoria = 0
+        self._paginas = {}  # nome -> (tipo, bytes); não entram no LRU
+
+    def registrar_arquivo(self, caminho: str) -> str | None:
+        """URL abnf:// do arquivo. O conteúdo só é lido (e o hash calculado) quando o arquivo muda."""
+        try:
+            estado = os.stat(caminho)
+        except OSError:
+            return None
+        caminho_absoluto = os.path.abspath(caminho)
+        assinatura = (estado.st_mtime_ns, estado.st_size)
+        chave = None
+        with self._trava:
+            registro = self._arquivos.get(caminho_absoluto)
+            if registro is not None and registro[0] == assinatura:
+                self._arquivos.move_to_end(caminho_absoluto)
+                chave = registro[1]
+        if chave is None:
+            try:
+                with open(caminho, 'rb') as f:
+                    dados = f.read()
+            except OSError:
+                return None
+            extensao = os.path.splitext(caminho)[1].lower()
+            chave = hashlib.sha1(dados).hexdigest() + extensao
+            with self._trava:
+                self._registrar(caminho_absoluto, assinatura, chave)
+                self._guardar(chave, dados)
+        return f"{ESQUEMA}://{HOST_RECURSOS}/{chave}"
+
+    def _registrar(self, caminho: str, assinatura: tuple, chave: str):
+        """Guarda a versão atual do arquivo, esquecendo a anterior e os arquivos registrados há mais tempo."""
+        anterior = self._arquivos.pop(caminho, None)
+        self._arquivos[caminho] = (assinatura, chave)
+        self._origens[chave] = caminho
+        if anterior is not None and anterior[1] != chave:
+            self._esquecer(anterior[1])
+        while len(self._arquivos) > self.limite_arquivos:
+            _, (_, descartada) = self._arquivos.popitem(last=False)
+            self._esquecer(descartada)
+
+    def _esquecer(self, chave: str):
+        """Remove a chave se nenhum arquivo registrado tiver mais esse conteúdo."""
+        for caminho, (_, outra) in self._arquivos.items():
+            if outra == chave:
+                self._origens[chave] = caminho
+                return
+        self._origens.pop(chave, None)
+        dados = self._memoria.pop(chave, None)
+        if dados is not None:
+            self._bytes_em_memoria -= len(dados)
+
+    def publicar_pagina(self, nome: str, html: str) -> str:
+        """Publica um documento HTML em abnf://preview/<nome> (substitui o anterior de mesmo nome)."""
+        with self._trava:
+            self._paginas[nome] = (tipo_mime(nome), html.encode('utf-8'))
+        return f"{ESQUEMA}://{HOST_PAGINAS}/{nome}"
+
+    def _guardar(self, chave: str, dados: bytes):
+        anterior = self._memoria.pop(chave, None)
+        if anterior is not None:
+            self._bytes_em_memoria -= len(anterior)
+        self._memoria[chave] = dados
+        self._bytes_em_memoria += len(dados)
+        while self._bytes_em_memoria > self.limite_bytes and len(self._memoria) > 1:
+            _, descartado = self._memoria.popitem(last=False)
+            self._bytes_em_memoria -= len(descartado)
+
+    def obter_recurso(self, chave: str) -> tuple | None:
+        """(tipo, bytes) de uma imagem registrada, ou None se ela não existir mais."""
+        with self._trava:
+            dados = self._memoria.get(chave)
+            if dados is not None:
+                self._memoria.move_to_end(chave)
+                return tipo_mime(chave), dados
+            caminho = self._origens.get(chave)
+        if caminho is None:
+            return None
+        try:
+            with open(caminho, 'rb') as f:
+                dados = f.read()
+        except OSError:
+            return None
+        if hashlib.sha1(dados).hexdigest() + os.path.splitext(caminho)[1].lower() != chave:
+            return None  # O arquivo mudou desde o registro; a URL nova virá na próxima atualização.
+        with self._trava:
+            self._guardar(chave, dados)
+        return tipo_mime(chave), dados
+
+    def obter_pagina(self, nome: str) -> tuple | None:
+        with self._trava:
+            return self._paginas.get(nome)
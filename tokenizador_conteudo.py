@@ -0,0 +1,47 @@
+# tokenizador_conteudo.py
+# Descrição: Converte o conteúdo de um capítulo em uma sequência de tokens (parágrafos de texto e
+# referências {{Tabela:...}}, {{Figura:...}}, {{Formula:...}}) compartilhada pelo gerador DOCX,
+# pela pré-visualização e pelo filtro dos bancos. O resultado é memorizado pelo conteúdo, de modo
+# que capítulos não editados não são analisados novamente.
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import FrozenSet, Tuple, Union
+
+PADRAO_MARCADOR = re.compile(r"\{\{(Tabela|Figura|Formula):([^}]+)\}\}")
+TAMANHO_CACHE = 4096
+
+@dataclass(frozen=True)
+class TokenParagrafo:
+    texto: str
+
+@dataclass(frozen=True)
+class TokenElemento:
+    tipo: str
+    titulo: str
+
+Token = Union[TokenParagrafo, TokenElemento]
+
+@lru_cache(maxsize=TAMANHO_CACHE)
+def tokenizar(conteudo: str) -> Tuple[Token, ...]:
+    """
+    Retorna os tokens do conteúdo na ordem em que aparecem. Cada linha não vazia de um trecho de
+    texto vira um TokenParagrafo (com o texto original da linha); cada marcador vira um TokenElemento.
+    """
+    tokens = []
+    partes = PADRAO_MARCADOR.split(conteudo)
+    for k in range(0, len(partes), 3):
+        bloco_de_texto = partes[k].strip()
+        if bloco_de_texto:
+            for texto_paragrafo in bloco_de_texto.split('\n'):
+                if texto_paragrafo.strip():
+                    tokens.append(TokenParagrafo(texto_paragrafo))
+        if k + 2 < len(partes):
+            tokens.append(TokenElemento(tipo=partes[k + 1], titulo=partes[k + 2]))
+    return tuple(tokens)
+
+@lru_cache(maxsize=TAMANHO_CACHE)
+def titulos_referenciados(conteudo: str, tipo: str) -> FrozenSet[str]:
+    """Retorna os títulos (ou legendas) dos elementos do tipo informado usados no conteúdo."""
+    return frozenset(t.titulo for t in tokenizar(conteudo) if isinstance(t, TokenElemento) and t.tipo == tipo)
@@ -0,0 +1,188 @@
+# transporte_preview.py
+# Descrição: Atualização da pré-visualização sem recarregar a página. A página base (estilos e um
+# contêiner vazio) é carregada uma única vez no QWebEngineView; a cada atualização, somente os
+# <div> de página que mudaram são trocados via runJavaScript, identificados pela posição da página.
+# Assim a rolagem não salta, as imagens das páginas inalteradas não são recarregadas e o limite de
+# tamanho do setHtml (cerca de 2 MB) deixa de valer para documentos grandes.
+# Com a virtualização (padrão), o navegador guarda o conteúdo de todas as páginas como texto, mas só
+# monta no DOM (e só carrega as imagens de) as páginas próximas da área visível; as distantes viram
+# quadros vazios do mesmo tamanho. Memória e tempo de layout ficam limitados mesmo em teses longas.
+
+import os
+import re
+import json
+from PySide6 import QtCore
+
+from gerador_preview import ESTILO_PREVIEW
+
+# Páginas a partir de quantas alturas de tela, acima e abaixo da área visível, são materializadas.
+JANELA_VIRTUALIZACAO = 2
+
+SCRIPT_ATUALIZACAO = """
+<script>
+// Conteúdo de todas as páginas (como texto). No DOM, só as páginas próximas da área visível têm
+// conteúdo; as demais são quadros vazios do mesmo tamanho, com a mesma classe e numeração.
+var abntConteudos = [];
+var abntAncoras = {};
+var abntModelo = document.createElement('template');
+var abntObservador = abntVirtualizado ? new IntersectionObserver(function (entradas) {
+    for (var k = 0; k < entradas.length; k++) {
+        var quadro = entradas[k].target;
+        var vazio = quadro.hasAttribute('data-vazia');
+        if (entradas[k].isIntersecting && vazio) {
+            abntTrocar(Number(quadro.dataset.indice), false);
+        } else if (!entradas[k].isIntersecting && !vazio) {
+            abntTrocar(Number(quadro.dataset.indice), true);
+        }
+    }
+}, {rootMargin: (abntJanela * 100) + '% 0px'}) : null;
+
+function abntElemento(indice, vazio) {
+    var html = abntConteudos[indice];
+    if (vazio) {
+        html = html.match(/^<div[^>]*>/)[0] + '</div>';
+    }
+    abntModelo.innerHTML = html;
+    var elemento = abntModelo.content.firstElementChild;
+    elemento.id = 'pagina-' + indice;
+    elemento.dataset.indice = indice;
+    if (vazio) {
+        elemento.setAttribute('data-vazia', '');
+    }
+    return elemento;
+}
+
+function abntTrocar(indice, vazio) {
+    var paginas = document.getElementById('paginas');
+    var nova = abntElemento(indice, vazio);
+    if (indice < paginas.children.length) {
+        var antiga = paginas.children[indice];
+        if (abntObservador) abntObservador.unobserve(antiga);
+        paginas.replaceChild(nova, antiga);
+    } else {
+        paginas.appendChild(nova);
+    }
+    if (abntObservador) abntObservador.observe(nova);
+}
+
+function abntAtualizarPaginas(alteracoes, total, ancoras) {
+    var paginas = document.getElementById('paginas');
+    while (paginas.children.length > total) {
+        if (abntObservador) abntObservador.unobserve(paginas.lastElementChild);
+        paginas.removeChild(paginas.lastElementChild);
+    }
+    abntConteudos.length = total;
+    if (ancoras !== null) {
+        abntAncoras = ancoras;
+    }
+    for (var k = 0; k < alteracoes.length; k++) {
+        var indice = alteracoes[k][0];
+        abntConteudos[indice] = alteracoes[k][1];
+        // Página já exibida mantém o estado; página nova entra vazia e o observador decide.
+        var vazio = abntVirtualizado && (indice >= paginas.children.length ||
+                                         paginas.children[indice].hasAttribute('data-vazia'));
+        abntTrocar(indice, vazio);
+    }
+}
+
+// Links do sumário: o destino pode estar em uma página ainda vazia.
+document.addEventListener('click', function (evento) {
+    var link = evento.target.closest('a[href^="#"]');
+    if (!link) return;
+    var id = decodeURIComponent(link.getAttribute('href').slice(1));
+    var indice = abntAncoras[id];
+    if (indice === undefined) return;
+    evento.preventDefault();
+    var quadro = document.getElementById('pagina-' + indice);
+    if (quadro && quadro.hasAttribute('data-vazia')) {
+        abntTrocar(indice, false);
+    }
+    var destino = document.getElementById(id);
+    if (destino) destino.scrollIntoView();
+});
+</script>
+"""
+
+_ID_ANCORA = re.compile(r"""\sid=['"]([^'"]+)['"]""")
+
+def pagina_base(virtualizar: bool = True) -> str:
+    configuracao = (f"<script>var abntVirtualizado = {'true' if virtualizar else 'false'}; "
+                    f"var abntJanela = {JANELA_VIRTUALIZACAO};</script>")
+    return (f"<!DOCTYPE html><html><head><meta charset='UTF-8'>{ESTILO_PREVIEW}{configuracao}{SCRIPT_ATUALIZACAO}"
+            f"</head><body><div id='paginas'></div></body></html>")
+
+class TransportePreview(QtCore.QObject):
+    def __init__(self, view, parent=None, virtualizar: bool = True, recursos=None):
+        super().__init__(parent)
+        self.view = view
+        self.virtualizar = virtualizar
+        # Com um RepositorioRecursos (e o esquema abnf:// instalado), a página base é servida por ele.
+        self.recursos = recursos
+        self._paginas_exibidas = []
+        self._ancoras_paginas = []
+        self._ancoras_enviadas = None
+        self._pendentes = None
+        self._carregando = False
+        self._pagina_base_pronta = False
+        self.view.loadFinished.connect(self._pagina_base_carregada)
+        # Se o processo de renderização morrer, a página base é recarregada na próxima atualização.
+        self.view.page().renderProcessTerminated.connect(self._descartar_pagina_base)
+
+    def carregar_pagina_base(self):
+        """(Re)carrega a página base; as páginas são reenviadas quando ela terminar de carregar."""
+        if self._pendentes is None:
+            self._pendentes = self._paginas_exibidas
+        self._paginas_exibidas = []
+        self._ancoras_paginas = []
+        self._ancoras_enviadas = None
+        self._pagina_base_pronta = False
+        self._carregando = True
+        if self.recursos is not None:
+            self.view.load(QtCore.QUrl(self.recursos.publicar_pagina("base.html", pagina_base(self.virtualizar))))
+            return
+        base_url = QtCore.QUrl.fromLocalFile(os.path.abspath(os.path.dirname(__file__)) + os.sep)
+        self.view.setHtml(pagina_base(self.virtualizar), baseUrl=base_url)
+
+    @QtCore.Slot(bool)
+    def _pagina_base_carregada(self, ok):
+        # Navegações dentro da página (links do sumário) também emitem loadFinished.
+        if not self._carregando:
+            return
+        self._carregando = False
+        if not ok:
+            return
+        self._pagina_base_pronta = True
+        if self._pendentes is not None:
+            paginas, self._pendentes = self._pendentes, None
+            self.atualizar(paginas)
+
+    def _descartar_pagina_base(self, *args):
+        self._pagina_base_pronta = False
+        self._carregando = False
+
+    def atualizar(self, paginas: list):
+        """Exibe as páginas informadas, enviando ao navegador apenas as que mudaram."""
+        if not self._pagina_base_pronta:
+            self._pendentes = paginas
+            if not self._carregando:
+                self.carregar_pagina_base()
+            return
+        alteracoes = [[i, html] for i, html in enumerate(paginas)
+                      if i >= len(self._paginas_exibidas) or self._paginas_exibidas[i] != html]
+        if not alteracoes and len(paginas) == len(self._paginas_exibidas):
+            return
+        # Âncoras (id -> índice da página), recalculadas só para as páginas que mudaram.
+        del self._ancoras_paginas[len(paginas):]
+        for i, html in alteracoes:
+            ids = _ID_ANCORA.findall(html)
+            if i < len(self._ancoras_paginas):
+                self._ancoras_paginas[i] = ids
+            else:
+                self._ancoras_paginas.append(ids)
+        ancoras = {id_ancora: i for i, ids in enumerate(self._ancoras_paginas) for id_ancora in ids}
+        ancoras_js = None if ancoras == self._ancoras_enviadas else ancoras
+        self._ancoras_enviadas = ancoras
+        self._paginas_exibidas = list(paginas)
+        script = (f"abntAtualizarPaginas({json.dumps(alteracoes)}, {len(paginas)}, "
+                  f"{json.dumps(ancoras_js)});")
+        self.view.page().runJavaScript(script)